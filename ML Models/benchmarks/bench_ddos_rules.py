@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Measure the per-packet cost of the DDoS threshold rule engine
+
+Usage: python bench_ddos_rules.py [packet_count]
+"""
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+
+# Make the scripts importable
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ML_DIR, 'scripts'))
+
+from packet_record import PacketRecord, FLAG_SYN, FLAG_ACK, FLAG_PSH
+from ddos_rules import RuleEngine, default_rules
+
+def mixed_traffic(count, sources):
+    """Normal traffic from many sources with one source SYN flooding"""
+    rng = random.Random(42)
+    start = time.time_ns()
+    step = 1_000_000_000 // 20000  # 20k packets per second
+    records = []
+    for i in range(count):
+        if i % 4 == 0:
+            record = PacketRecord(start + i * step, 0x0A000001, 0xC0A80001, 6, 64, 64, rng.randint(1024, 65535), 80, FLAG_SYN)
+        else:
+            protocol = rng.choice([6, 17])
+            flags = (FLAG_ACK | FLAG_PSH) if protocol == 6 else 0
+            record = PacketRecord(start + i * step, rng.randrange(sources), 0xC0A80001, protocol, 512, 64, rng.randint(1024, 65535), rng.choice([80, 443, 53]), flags)
+        records.append(record)
+    return records
+
+def run(count, sources=10000):
+    records = mixed_traffic(count, sources)
+    # Point the engine at a config file that doesn't exist so only defaults apply
+    engine = RuleEngine(default_rules(1000, 100, 50, 200), config_file=os.path.join(tempfile.gettempdir(), 'no_rules.json'))
+
+    alerts = 0
+    start = time.perf_counter()
+    for record in records:
+        raised = engine.evaluate(record)
+        if raised:
+            alerts += len(raised)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "packets": count,
+        "sources": sources,
+        "rules": len(engine.rules),
+        "alerts": alerts,
+        "ns_per_packet": round(elapsed / count * 1e9),
+        "packets_per_sec": round(count / elapsed)
+    }
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    print(json.dumps(run(count), indent=2))
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Compare sklearn predict_proba with the compiled forest engine
+
+Checks that both give bit-identical probabilities on random inputs and
+reports per-row latency at batch size 1 and throughput on a large batch
+for the DDoS and XSS forests.
+
+Usage: python bench_forest_inference.py [rows]
+"""
+import os
+import sys
+import json
+import time
+import warnings
+import numpy as np
+
+# Make the scripts importable
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ML_DIR, 'scripts'))
+
+from model_artifacts import load_artifact
+from forest_inference import CompiledForest
+
+warnings.filterwarnings("ignore")
+
+def random_rows(name, count, n_features):
+    rng = np.random.default_rng(42)
+    if name == "xss_model":
+        # Sentence embeddings are small dense values
+        return rng.normal(0, 0.05, (count, n_features))
+    # Traffic features are heavy tailed and often zero
+    return rng.lognormal(2, 3, (count, n_features)) * (rng.random((count, n_features)) < 0.7)
+
+def per_call(function, rows, repeat):
+    """Mean seconds per call of function on single rows"""
+    start = time.perf_counter()
+    for i in range(repeat):
+        function(rows[i % len(rows)][np.newaxis])
+    return (time.perf_counter() - start) / repeat
+
+def bench_model(name, rows):
+    model = load_artifact(name).model
+
+    start = time.perf_counter()
+    compiled = CompiledForest.from_sklearn(model)
+    compile_time = time.perf_counter() - start
+
+    X = random_rows(name, rows, compiled.n_features)
+    expected = model.predict_proba(X)
+    actual = compiled.predict_proba(X)
+
+    sklearn_single = per_call(model.predict_proba, X, 200)
+    compiled_single = per_call(compiled.predict_proba, X, 2000)
+
+    start = time.perf_counter()
+    model.predict_proba(X)
+    sklearn_batch = time.perf_counter() - start
+    start = time.perf_counter()
+    compiled.predict_proba(X)
+    compiled_batch = time.perf_counter() - start
+
+    return {
+        "trees": compiled.n_trees,
+        "nodes": len(compiled.feature),
+        "max_depth": compiled.max_depth,
+        "compile_ms": round(compile_time * 1e3, 1),
+        "bit_identical": bool(np.array_equal(expected, actual)),
+        "single_row_us": {
+            "sklearn": round(sklearn_single * 1e6, 1),
+            "compiled": round(compiled_single * 1e6, 1),
+            "speedup": round(sklearn_single / compiled_single, 1)
+        },
+        "batch_rows_per_sec": {
+            "rows": rows,
+            "sklearn": round(rows / sklearn_batch),
+            "compiled": round(rows / compiled_batch)
+        }
+    }
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    results = {name: bench_model(name, rows) for name in ("ddos_model", "xss_model")}
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Load test a protected endpoint with and without the mitigation table
+
+A flood from one source plus a trickle of legitimate traffic is sent to
+an endpoint that does a fixed amount of CPU work per request. With
+mitigation on, the endpoint consults the mitigation server first and the
+flooding source is blocked after its detection, so the endpoint's CPU
+time should drop to roughly the legitimate share of the work.
+
+Usage: python bench_mitigation.py [request_count]
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import resource
+import tempfile
+import threading
+import http.client
+import http.server
+import multiprocessing
+
+# Make the scripts importable
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ML_DIR, 'scripts'))
+
+from mitigation import MitigationTable, MitigationServer, MitigationClient, apply_detection, ALLOW
+
+ATTACKER_IP = "203.0.113.7"
+CLIENTS = 8
+
+# PBKDF2 rounds per request, standing in for the endpoint's real work
+WORK_ROUNDS = 2000
+
+def serve_endpoint(port_queue, mitigation_socket):
+    """Run the protected endpoint until terminated"""
+    local = threading.local()
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            source = self.headers.get('X-Forwarded-For', self.client_address[0])
+            if mitigation_socket:
+                if not hasattr(local, 'client'):
+                    local.client = MitigationClient(mitigation_socket)
+                verdict, _ = local.client.check(source)
+                if verdict != ALLOW:
+                    return self.reply(429, b'{"error": "Too many requests"}')
+            hashlib.pbkdf2_hmac('sha256', self.path.encode(), b'salt', WORK_ROUNDS)
+            self.reply(200, b'{"status": "ok"}')
+
+        def reply(self, status, body):
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+def send_requests(port, count, legit_every, results):
+    """Send count keep-alive requests, one in legit_every from a legitimate source"""
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    statuses = {"attacker": {}, "legit": {}}
+    for i in range(count):
+        legit = i % legit_every == 0
+        source = f"198.51.100.{i % 200 + 1}" if legit else ATTACKER_IP
+        connection.request("GET", f"/records/{i}", headers={"X-Forwarded-For": source})
+        response = connection.getresponse()
+        response.read()
+        group = statuses["legit" if legit else "attacker"]
+        group[response.status] = group.get(response.status, 0) + 1
+    connection.close()
+    results.append(statuses)
+
+def run_phase(count, mitigation_socket):
+    """Flood the endpoint and return the CPU time it used"""
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    ports = multiprocessing.Queue()
+    endpoint = multiprocessing.Process(target=serve_endpoint, args=(ports, mitigation_socket))
+    endpoint.start()
+    port = ports.get()
+
+    results = []
+    start = time.perf_counter()
+    threads = [
+        threading.Thread(target=send_requests, args=(port, count // CLIENTS, 10, results))
+        for _ in range(CLIENTS)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    endpoint.terminate()
+    endpoint.join()
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+
+    totals = {"attacker": {}, "legit": {}}
+    for statuses in results:
+        for group, counts in statuses.items():
+            for status, n in counts.items():
+                totals[group][status] = totals[group].get(status, 0) + n
+    return {
+        "requests": count // CLIENTS * CLIENTS,
+        "seconds": round(elapsed, 2),
+        "endpoint_cpu_seconds": round(cpu, 3),
+        "responses": totals
+    }
+
+def run(count):
+    unprotected = run_phase(count, None)
+
+    # Serve a table that already holds the detection for the flooding source
+    table = MitigationTable()
+    apply_detection({"kind": "ddos", "attack_type": "syn_flood", "source_ip": ATTACKER_IP, "observed": True}, table)
+    socket_path = os.path.join(tempfile.mkdtemp(), 'mitigation.sock')
+    server = MitigationServer(socket_path, table)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        protected = run_phase(count, socket_path)
+    finally:
+        server.shutdown()
+        server.server_close()
+        os.remove(socket_path)
+
+    return {
+        "work_rounds": WORK_ROUNDS,
+        "without_mitigation": unprotected,
+        "with_mitigation": protected,
+        "cpu_reduction": round(1 - protected["endpoint_cpu_seconds"] / unprotected["endpoint_cpu_seconds"], 3)
+    }
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+    print(json.dumps(run(count), indent=2))
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Compare memory and build cost of dict packets against PacketRecord
+
+Usage: python bench_packet_record.py [packet_count]
+"""
+import os
+import sys
+import json
+import time
+import random
+import datetime
+import tracemalloc
+
+# Make the scripts importable
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ML_DIR, 'scripts'))
+
+from packet_record import PacketRecord, PROTOCOL_NAMES, mask_to_flags, int_to_ip
+from packet_ring import RECORD_DTYPE
+
+def random_fields(count):
+    """Pre-generate raw packet fields so both forms pay the same RNG cost"""
+    rng = random.Random(42)
+    fields = []
+    for _ in range(count):
+        protocol = rng.choice([1, 6, 17])
+        fields.append((
+            time.time_ns(),
+            rng.getrandbits(32),
+            rng.getrandbits(32),
+            protocol,
+            rng.randint(64, 1500),
+            rng.randint(32, 128),
+            rng.randint(1024, 65535) if protocol != 1 else 0,
+            rng.choice([80, 443, 22, 53]) if protocol != 1 else 0,
+            rng.getrandbits(6) if protocol == 6 else 0
+        ))
+    return fields
+
+def build_dicts(fields):
+    """Build packets the way the logger did before PacketRecord"""
+    packets = []
+    for ts_ns, src_ip, dst_ip, protocol, size, ttl, src_port, dst_port, flags in fields:
+        packet = {
+            "timestamp": datetime.datetime.fromtimestamp(ts_ns / 1e9).isoformat(),
+            "protocol": PROTOCOL_NAMES[protocol],
+            "src_ip": int_to_ip(src_ip),
+            "dst_ip": int_to_ip(dst_ip),
+            "size": size,
+            "ttl": ttl
+        }
+        if protocol in (6, 17):
+            packet["src_port"] = src_port
+            packet["dst_port"] = dst_port
+        if protocol == 6:
+            packet["flags"] = mask_to_flags(flags)
+        packets.append(packet)
+    return packets
+
+def build_records(fields):
+    return [PacketRecord(*f) for f in fields]
+
+def measure(builder, fields):
+    """Return (seconds, retained bytes) for building every packet"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    packets = builder(fields)
+    elapsed = time.perf_counter() - start
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Time again without tracemalloc, which slows allocation down
+    del packets
+    start = time.perf_counter()
+    packets = builder(fields)
+    elapsed = time.perf_counter() - start
+    return elapsed, retained, packets
+
+def run(count):
+    fields = random_fields(count)
+
+    dict_time, dict_bytes, dicts = measure(build_dicts, fields)
+    record_time, record_bytes, records = measure(build_records, fields)
+
+    # Lazy conversion cost, paid only when packets are served by the API
+    start = time.perf_counter()
+    for record in records[:10000]:
+        json.dumps(record.to_dict())
+    record_serialize = (time.perf_counter() - start) / min(count, 10000)
+
+    start = time.perf_counter()
+    for packet in dicts[:10000]:
+        json.dumps(packet)
+    dict_serialize = (time.perf_counter() - start) / min(count, 10000)
+
+    return {
+        "packets": count,
+        "dict": {
+            "build_packets_per_sec": round(count / dict_time),
+            "bytes_per_packet": round(dict_bytes / count, 1),
+            "serialize_us": round(dict_serialize * 1e6, 2)
+        },
+        "record": {
+            "build_packets_per_sec": round(count / record_time),
+            "bytes_per_packet": round(record_bytes / count, 1),
+            "serialize_us": round(record_serialize * 1e6, 2)
+        },
+        "structured_array": {
+            "bytes_per_packet": RECORD_DTYPE.itemsize
+        },
+        "memory_ratio": round(dict_bytes / record_bytes, 2),
+        "build_speedup": round(dict_time / record_time, 2)
+    }
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    print(json.dumps(run(count), indent=2))
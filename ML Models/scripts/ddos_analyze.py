@@ -2,55 +2,76 @@
 import os
 import json
 import sys
-import pickle
+import time
 import numpy as np
-import traceback
+import atexit
+from event_stream import publish_event
+from metrics import push_metrics, ANALYSES, INFERENCE_SECONDS
+from profiling import install, span
+from model_artifacts import load_artifact, save_artifact, read_manifest, ModelArtifact, MissingArtifactError
+from shadow_scoring import log_inputs
+from log_config import get_logger
+
+log = get_logger("ddos_analyze")
 
 # Path to the ML Models directory
 ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 ARTIFACTS_DIR = os.path.join(ML_DIR, 'artifacts')
 
-def load_model():
-    """Load the trained DDOS detection model"""
-    model_path = os.path.join(ARTIFACTS_DIR, 'ddos_model.pickle')
+# Features in the order prepare_features produces them
+DDOS_FEATURES = [
+    "Protocol", "pktcount", "bytecount", "dur", "flows", "packetins", "port_no",
+    "pktrate", "pktperflow", "byteperflow", "tx_bytes", "rx_bytes", "syn_flag",
+    "ack_flag", "psh_flag", "rst_flag", "fin_flag", "window_size", "urgent_ptr", "header_len"
+]
+
+# Representative normal and flood rows; the fallback model trains on them and
+# reloaded models must score them sensibly before they are swapped in
+CANARY_FEATURES = [
+    [0, 10, 1000, 30, 1, 10, 80, 0.3, 10, 1000, 1000, 1000, 0, 0, 0, 0, 0, 65535, 0, 20],
+    [1, 100, 10000, 30, 20, 100, 80, 3.3, 5, 500, 10000, 10000, 0.9, 0.9, 0.1, 0, 0.1, 65535, 0, 20],
+    [0, 10, 1000, 30, 1, 10, 80, 0.3, 10, 1000, 1000, 1000, 0, 0, 0, 0, 0, 65535, 0, 20],
+    [1, 100, 10000, 30, 20, 100, 80, 3.3, 5, 500, 10000, 10000, 0.9, 0.9, 0.1, 0, 0.1, 65535, 0, 20]
+]
+
+def load_artifact_or_fallback():
+    """Load the DDoS model artifact, creating a fallback model if there is none
+
+    Only a missing artifact gets the fallback. Any other ArtifactError (a
+    checksum or schema mismatch, a missing scaler, a newer manifest format,
+    a model mid-write) is raised, so a broken deploy is never overwritten.
+    """
     try:
-        sys.stderr.write(f"Looking for model at path: {model_path}\n")
-        if not os.path.exists(model_path):
-            sys.stderr.write(f"Model file not found at {model_path}\n")
-            
-            # Create a simple RandomForestClassifier as a fallback
-            sys.stderr.write("Creating fallback RandomForestClassifier model\n")
-            from sklearn.ensemble import RandomForestClassifier
-            model = RandomForestClassifier(n_estimators=10, random_state=42)
-            
-            # Train with some simple data to initialize
-            X = np.array([[0, 10, 1000, 30, 1, 10, 80, 0.3, 10, 1000, 1000, 1000, 0, 0, 0, 0, 0, 65535, 0, 20],
-                           [1, 100, 10000, 30, 20, 100, 80, 3.3, 5, 500, 10000, 10000, 0.9, 0.9, 0.1, 0, 0.1, 65535, 0, 20],
-                           [0, 10, 1000, 30, 1, 10, 80, 0.3, 10, 1000, 1000, 1000, 0, 0, 0, 0, 0, 65535, 0, 20],
-                           [1, 100, 10000, 30, 20, 100, 80, 3.3, 5, 500, 10000, 10000, 0.9, 0.9, 0.1, 0, 0.1, 65535, 0, 20]])
-            y = np.array([0, 1, 0, 1])  # 0 = normal, 1 = attack
-            model.fit(X, y)
-            
-            # Save the model for future use
-            try:
-                if not os.path.exists(ARTIFACTS_DIR):
-                    os.makedirs(ARTIFACTS_DIR)
-                with open(model_path, 'wb') as f:
-                    pickle.dump(model, f)
-                sys.stderr.write(f"Saved fallback model to {model_path}\n")
-            except Exception as e:
-                sys.stderr.write(f"Failed to save fallback model: {e}\n")
-                
-            return model
-        else:
-            with open(model_path, 'rb') as f:
-                model = pickle.load(f)
-            sys.stderr.write("Successfully loaded model from file\n")
-            return model
+        artifact = load_artifact('ddos_model')
+        artifact.check_schema(DDOS_FEATURES)
+        return artifact
+    except MissingArtifactError as e:
+        log.warning("%s", e)
+    
+    # Create a simple RandomForestClassifier as a fallback
+    log.info("Creating fallback RandomForestClassifier model")
+    from sklearn.ensemble import RandomForestClassifier
+    model = RandomForestClassifier(n_estimators=10, random_state=42)
+    
+    # Train with some simple data to initialize
+    X = np.array(CANARY_FEATURES)
+    y = np.array([0, 1, 0, 1])  # 0 = normal, 1 = attack
+    model.fit(X, y)
+    
+    # Save the model for future use, unless a real one was saved meanwhile
+    if read_manifest('ddos_model') is not None:
+        return load_artifact_or_fallback()
+    try:
+        manifest = save_artifact(model, 'ddos_model', DDOS_FEATURES, metadata={"fallback": True})
+        log.info("Saved fallback model to %s", manifest['file'])
+        return load_artifact('ddos_model')
     except Exception as e:
-        sys.stderr.write(f"Error loading model: {e}\n")
-        traceback.print_exc(file=sys.stderr)
-        return None
+        log.error("Failed to save fallback model: %s", e)
+    return ModelArtifact(model, {"name": "ddos_model", "model_type": "sklearn_forest", "feature_schema": DDOS_FEATURES})
+
+def encode_protocol(protocol):
+    """Protocol feature: 1 for TCP, 0 for anything else; training and serving both use this"""
+    return 1 if protocol == 'TCP' else 0
 
 def prepare_features(data):
     """Convert input data to model features"""
@@ -58,7 +79,7 @@ def prepare_features(data):
         # Create 2D array for RandomForestClassifier with all 20 features
         features = np.array([
             [
-                1 if data.get('Protocol') == 'TCP' else 0,  # Protocol (TCP=0, UDP=1)
+                encode_protocol(data.get('Protocol')),  # Protocol (TCP=1, other=0)
                 float(data.get('pktcount', 0)),  # Packet count
                 float(data.get('bytecount', 0)),  # Byte count
                 float(data.get('dur', 0)),  # Duration
@@ -81,55 +102,70 @@ def prepare_features(data):
             ]
         ])
         
-        sys.stderr.write(f"Feature shape before: {features.shape}\n")
+        log.debug("Feature shape before: %s", features.shape)
         return features
     except Exception as e:
-        sys.stderr.write(f"Error preparing features: {e}\n")
-        sys.stderr.write(traceback.format_exc())
+        log.exception("Error preparing features: %s", e)
         raise
 
+def describe_prediction(row, probability):
+    """Format the verdict for one feature row as the JSON result"""
+    prediction = int(probability > 0.5)
+    
+    # Determine attack type based on features
+    attack_type = "Unknown"
+    if prediction == 1:
+        if row[0] == 0:  # UDP
+            attack_type = "UDP Flood"
+        elif row[6] == 80:  # TCP to port 80
+            attack_type = "HTTP Flood"
+        else:
+            attack_type = "TCP Flood"
+    
+    return {
+        "is_attack": bool(prediction),
+        "prediction": prediction,
+        "confidence": float(probability),
+        "attack_type": attack_type
+    }
+
 def analyze_traffic(data):
     """Analyze traffic data for DDoS attacks"""
     try:
         # Load the model if not already loaded
-        model = load_model()
+        with span("load_model"):
+            artifact = load_artifact_or_fallback()
+            model = artifact.predictor()
         
         # Prepare features
-        features = prepare_features(data)
-        sys.stderr.write(f"Feature shape: {features.shape}\n")
+        with span("prepare_features"):
+            features = prepare_features(data)
+        log.debug("Feature shape: %s", features.shape)
         
         # Make prediction
         try:
             # Get probabilities
-            probability = model.predict_proba(features)[0][1]
-            prediction = int(probability > 0.5)
-            
-            # Determine attack type based on features
-            attack_type = "Unknown"
-            if prediction == 1:
-                if features[0][0] == 0:  # UDP
-                    attack_type = "UDP Flood"
-                elif features[0][6] == 80:  # TCP to port 80
-                    attack_type = "HTTP Flood"
-                else:
-                    attack_type = "TCP Flood"
-            
-            # Format result as JSON
-            result = {
-                "is_attack": bool(prediction),
-                "prediction": int(prediction),
-                "confidence": float(probability),
-                "attack_type": attack_type
-            }
+            start = time.perf_counter()
+            with span("predict"):
+                probability = model.predict_proba(features)[0][1]
+            elapsed = time.perf_counter() - start
+            INFERENCE_SECONDS.labels("ddos_model").observe(elapsed)
+            result = describe_prediction(features[0], probability)
+            ANALYSES.labels("ddos", "ml_model", "attack" if result["is_attack"] else "normal").inc()
             
             # Print result as JSON string
             print(json.dumps(result))
+            sys.stdout.flush()
+            publish_event("ddos_analysis", result)
+            
+            # Log a sample of inputs for shadow scoring against a candidate, offline
+            log_inputs('ddos_model', features, [probability], elapsed, artifact.version)
             return 0
             
         except Exception as e:
             # Handle error in prediction
             error_msg = str(e)
-            sys.stderr.write(f"Error in prediction: {error_msg}\n")
+            log.error("Error in prediction: %s", error_msg)
             result = {
                 "error": error_msg,
                 "is_attack": False,
@@ -142,8 +178,7 @@ def analyze_traffic(data):
     except Exception as e:
         # Handle any other errors
         error_msg = str(e)
-        sys.stderr.write(f"Error in analyze_traffic: {error_msg}\n")
-        traceback.print_exc(file=sys.stderr)
+        log.exception("Error in analyze_traffic: %s", error_msg)
         result = {
             "error": error_msg,
             "is_attack": False,
@@ -154,9 +189,13 @@ def analyze_traffic(data):
         return 1
 
 if __name__ == "__main__":
+    # This process is one request; hand its metrics to the broker on the way out
+    atexit.register(push_metrics)
+    install("ddos_analyze")
+    
     # Read input from command-line arguments
     if len(sys.argv) < 2:
-        sys.stderr.write("Error: No input data provided\n")
+        log.error("No input data provided")
         sys.exit(1)
         
     try:
@@ -168,7 +207,7 @@ if __name__ == "__main__":
         sys.exit(exit_code)
         
     except json.JSONDecodeError as e:
-        sys.stderr.write(f"Error parsing input JSON: {e}\n")
+        log.error("Error parsing input JSON: %s", e)
         result = {
             "error": f"JSON parse error: {str(e)}",
             "is_attack": False,
@@ -179,8 +218,7 @@ if __name__ == "__main__":
         sys.exit(1)
         
     except Exception as e:
-        sys.stderr.write(f"Unexpected error: {e}\n")
-        traceback.print_exc(file=sys.stderr)
+        log.exception("Unexpected error: %s", e)
         result = {
             "error": str(e),
             "is_attack": False,
@@ -5,18 +5,28 @@ import time
 import signal
 import random
 import datetime
-import pickle
 import numpy as np
 import warnings
-import sys
 from collections import Counter, deque
 import threading
 import socket
+from event_stream import publish_event
+from packet_record import PacketRecord, int_to_ip
+from traffic_window import TrafficWindow, model_features
+from keyed_windows import KeyedWindows, key_address, key_port
+from connection_tracker import ConnectionTracker, scapy_payload
+from ddos_analyze import prepare_features, DDOS_FEATURES, CANARY_FEATURES
+from model_watcher import ModelHandle
+from shadow_scoring import ShadowScorer
+from ddos_rules import RuleEngine, default_rules
+from traffic_baseline import TrafficBaseline
+from metrics import counter, gauge, histogram, serve_metrics, DETECTIONS, INFERENCE_SECONDS, SAVE_SECONDS
+from profiling import install, span
+from log_config import get_logger
 
-warnings.filterwarnings("ignore")
+log = get_logger("ddos_monitor")
 
-# In a real implementation, we would import scapy
-# from scapy.all import sniff, IP, TCP, UDP
+warnings.filterwarnings("ignore")
 
 # Path to the ML Models directory
 ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -39,15 +49,54 @@ DOS_SIMULATION_FLAG_FILE = os.path.join(ML_DIR, 'scripts', '.dos_simulation_in_p
 packet_counts = deque(maxlen=60)  # Store packet counts for the last 60 seconds
 ip_counter = Counter()  # Count packets by source IP
 port_counter = Counter()  # Count packets by destination port
-syn_flood_counter = Counter()  # Count SYN packets by source IP
-http_flood_counter = Counter()  # Count HTTP requests by source IP
 
-# Detection thresholds
+# Sliding window over captured packets and its latest aggregates
+traffic_window = TrafficWindow()
+latest_window_stats = None
+
+# The same traffic windowed per destination address and port, so a flood on one
+# service can't hide an attack on another
+keyed_windows = KeyedWindows()
+
+# Set DDOS_MONITOR_CAPTURE=1 to sniff real packets with Scapy instead of simulating
+CAPTURE_ENABLED = os.environ.get('DDOS_MONITOR_CAPTURE') == '1'
+
+# Dashboard names for common destination ports
+SERVICE_NAMES = {
+    80: "HTTP (80)",
+    443: "HTTPS (443)",
+    53: "DNS (53)",
+    22: "SSH (22)",
+    21: "FTP (21)",
+    25: "SMTP (25)"
+}
+
+# Detection thresholds (packets per second; override per rule in ddos_rules.json)
 PACKETS_PER_SECOND_THRESHOLD = 1000
 SYN_FLOOD_THRESHOLD = 100
 HTTP_FLOOD_THRESHOLD = 50
 UDP_FLOOD_THRESHOLD = 200
 
+# Rule engine evaluated on every captured packet, and the alerts it raised
+rule_engine = RuleEngine(default_rules(
+    PACKETS_PER_SECOND_THRESHOLD, SYN_FLOOD_THRESHOLD, HTTP_FLOOD_THRESHOLD, UDP_FLOOD_THRESHOLD
+))
+rule_alerts = deque(maxlen=1000)
+
+# Captured TCP connections, whose slow ones raise slowloris alerts alongside the rules
+connection_tracker = ConnectionTracker()
+
+# Most rule detections recorded per tick, so a flood can't stall the monitor
+MAX_RULE_DETECTIONS_PER_TICK = 10
+
+# Most keyed-window detections recorded per tick, highest probability first
+MAX_KEY_DETECTIONS_PER_TICK = 10
+
+# Adaptive per-target baselines, saved every BASELINE_SAVE_INTERVAL ticks
+traffic_baseline = TrafficBaseline()
+BASELINE_SAVE_INTERVAL = 60
+ticks = 0
+
 # Detection results
 detection_results = {
     "totalDetections": 0,
@@ -61,7 +110,8 @@ detection_results = {
     "topTargets": [],
     "recentTimestamps": [],
     "hourlyTrend": [],
-    "trafficData": []
+    "trafficData": [],
+    "anomalies": []
 }
 
 # Persistent detection data
@@ -83,23 +133,22 @@ persistent_data = {
 # Flag to control the monitoring loop
 running = True
 
-# Load the trained model
-def load_model():
-    model_path = os.path.join(ARTIFACTS_DIR, 'ddos_model.pickle')
-    if os.path.exists(model_path):
-        try:
-            with open(model_path, 'rb') as f:
-                model = pickle.load(f)
-            sys.stderr.write(f"Loaded ML model from {model_path}\n")
-            return model
-        except Exception as e:
-            sys.stderr.write(f"Error loading model: {e}\n")
-    else:
-        sys.stderr.write(f"Model file not found at {model_path}\n")
-    return None
+# Current DDoS model, reloaded in the background when the artifact changes
+ddos_model = ModelHandle('ddos_model', DDOS_FEATURES, CANARY_FEATURES)
 
-# Global variable for model
-MODEL = load_model()
+# Candidate model scored alongside it on a sample of ticks
+ddos_shadow = ShadowScorer('ddos_model', DDOS_FEATURES)
+
+# Instrumentation served on /metrics; packets per second is rate(ddos_monitor_packets_total)
+packets_ingested = counter("ddos_monitor_packets_total", "Captured packets added to the traffic window")
+rule_alert_count = counter("ddos_rule_alerts_total", "Alerts raised by the threshold rules")
+tick_seconds = histogram("ddos_monitor_tick_seconds", "Seconds per detection tick")
+gauge("ddos_rule_alert_queue", "Rule alerts waiting for the next tick").set_function(lambda: len(rule_alerts))
+gauge("ddos_tracked_connections", "TCP connections being tracked").set_function(lambda: len(connection_tracker))
+gauge("ddos_keyed_windows", "Destination keys with a traffic window").set_function(lambda: len(keyed_windows))
+gauge("ddos_traffic_packets_per_second", "Packets per second in the current traffic window").set_function(
+    lambda: packet_counts[-1] if packet_counts else 0
+)
 
 def save_pid():
     """Save the current process ID to a file"""
@@ -118,9 +167,9 @@ def load_persistent_data():
         try:
             with open(DDOS_PERSISTENT_FILE, 'r') as f:
                 persistent_data = json.load(f)
-            sys.stderr.write(f"Loaded persistent DDoS data from {DDOS_PERSISTENT_FILE}\n")
+            log.info("Loaded persistent DDoS data from %s", DDOS_PERSISTENT_FILE)
         except Exception as e:
-            sys.stderr.write(f"Error loading persistent DDoS data: {e}\n")
+            log.error("Error loading persistent DDoS data: %s", e)
             # Initialize with empty data if file exists but is corrupted
             initialize_persistent_data()
     else:
@@ -158,12 +207,13 @@ def initialize_persistent_data():
 
 def save_persistent_data():
     """Save persistent detection data to file"""
-    with open(DDOS_PERSISTENT_FILE, 'w') as f:
-        json.dump(persistent_data, f)
-    sys.stderr.write(f"Saved persistent DDoS data to {DDOS_PERSISTENT_FILE}\n")
+    with SAVE_SECONDS.labels("ddos").time():
+        with open(DDOS_PERSISTENT_FILE, 'w') as f:
+            json.dump(persistent_data, f)
+    log.debug("Saved persistent DDoS data to %s", DDOS_PERSISTENT_FILE)
 
-def add_detection_to_persistent_data(attack_type, source_ip, target, timestamp=None):
-    """Add a detection to the persistent data"""
+def add_detection_to_persistent_data(attack_type, source_ip, target, timestamp=None, observed=False):
+    """Add a detection to the persistent data; observed marks a source seen in captured traffic"""
     global persistent_data
     
     if timestamp is None:
@@ -240,21 +290,35 @@ def add_detection_to_persistent_data(attack_type, source_ip, target, timestamp=N
     
     # Save the updated data
     save_persistent_data()
+    
+    # Push the detection to dashboard subscribers
+    # Only observed sources are safe for mitigation to act on
+    publish_event("detection", {"kind": "ddos", **detection, "observed": observed})
 
 def update_traffic_data():
     """Update the traffic data with current packet count"""
+    global latest_window_stats
     now = datetime.datetime.now().strftime('%H:%M:%S')
     
-    # In a real implementation, this would be the actual packet count
-    # For simulation, we'll generate random data
-    base_traffic = random.randint(100, 500)
-    
-    # Simulate occasional traffic spikes
-    if random.random() < 0.1:  # 10% chance of a spike
-        traffic = base_traffic * random.randint(5, 20)
+    if CAPTURE_ENABLED:
+        # Aggregate the packets captured during the window, overall and per key
+        batch = traffic_window.flush()
+        if batch is not None:
+            keyed_windows.add_batch(batch)
+        keyed_windows.evict_idle()
+        # Already flushed above, so both windows see exactly the same packets
+        latest_window_stats = traffic_window.stats(flush=False)
+        traffic = round(latest_window_stats["packets_per_second"])
     else:
-        traffic = base_traffic + random.randint(-50, 50)
-        traffic = max(50, traffic)  # Ensure traffic doesn't go below 50
+        # For simulation, we'll generate random data
+        base_traffic = random.randint(100, 500)
+        
+        # Simulate occasional traffic spikes
+        if random.random() < 0.1:  # 10% chance of a spike
+            traffic = base_traffic * random.randint(5, 20)
+        else:
+            traffic = base_traffic + random.randint(-50, 50)
+            traffic = max(50, traffic)  # Ensure traffic doesn't go below 50
     
     packet_counts.append(traffic)
     
@@ -267,6 +331,115 @@ def update_traffic_data():
     # Keep only the last 60 data points
     if len(detection_results["trafficData"]) > 60:
         detection_results["trafficData"] = detection_results["trafficData"][-60:]
+    
+    publish_event("traffic", {"time": now, "packets": traffic})
+
+def update_baselines():
+    """Score the current traffic against the learned baselines and publish anomalies"""
+    # Simulated traffic would teach the baselines nothing real
+    if not CAPTURE_ENABLED:
+        return
+    now = datetime.datetime.now()
+    samples = {"all": {"packets_per_second": packet_counts[-1]}}
+    if latest_window_stats is not None:
+        packets = max(1, latest_window_stats["packets"])
+        samples["all"].update({
+            "syn_ratio": latest_window_stats["flag_counts"]["syn"] / packets,
+            "unique_sources": latest_window_stats["unique_sources"],
+            "bytes_per_flow": latest_window_stats["bytes_per_flow"]
+        })
+        for port, metrics in traffic_window.target_stats().items():
+            samples[service_name(port)] = metrics
+    
+    anomalies = []
+    for key, metrics in samples.items():
+        scores = traffic_baseline.observe(key, metrics, now)
+        anomalies.extend(traffic_baseline.anomalies(key, scores))
+    
+    for anomaly in anomalies:
+        publish_event("anomaly", anomaly)
+    if anomalies:
+        detection_results["anomalies"] = anomalies[:20]
+    
+    if ticks % BASELINE_SAVE_INTERVAL == 0:
+        traffic_baseline.save()
+
+def random_ip():
+    """Generate a random source IP for simulated detections"""
+    return f"{random.randint(1, 255)}.{random.randint(1, 255)}.{random.randint(1, 255)}.{random.randint(1, 255)}"
+
+def service_name(port):
+    """Describe a destination port the way the dashboard lists targets"""
+    return SERVICE_NAMES.get(port, f"Port {port}")
+
+def record_detection(attack_type, source_ip, target, source_weight=1, target_weight=1, observed=False):
+    """Update the live detection results and persistent data with a detection
+
+    observed is True only when source_ip was taken from captured traffic,
+    not made up by the simulation or fallback paths.
+    """
+    # Update detection counts
+    DETECTIONS.labels("ddos", attack_type).inc()
+    detection_results["totalDetections"] += 1
+    detection_results["byType"][attack_type] = detection_results["byType"].get(attack_type, 0) + 1
+    
+    # Update recent timestamps
+    now = datetime.datetime.now().isoformat()
+    detection_results["recentTimestamps"].append(now)
+    detection_results["recentTimestamps"] = sorted(detection_results["recentTimestamps"], reverse=True)[:100]
+    
+    # Update top sources
+    ip_counter[source_ip] += source_weight
+    detection_results["topSources"] = [
+        {"ip": ip, "count": count}
+        for ip, count in ip_counter.most_common(5)
+    ]
+    
+    # Update top targets
+    port_counter[target] += target_weight
+    detection_results["topTargets"] = [
+        {"service": service, "count": count}
+        for service, count in port_counter.most_common(5)
+    ]
+    
+    # Update hourly trend
+    hour = datetime.datetime.now().strftime('%Y-%m-%d %H:00')
+    hour_found = False
+    for trend in detection_results["hourlyTrend"]:
+        if trend["hour"] == hour:
+            trend["count"] += 1
+            hour_found = True
+            break
+    
+    if not hour_found:
+        detection_results["hourlyTrend"].append({
+            "hour": hour,
+            "count": 1
+        })
+        # Keep only the last 24 hours
+        if len(detection_results["hourlyTrend"]) > 24:
+            detection_results["hourlyTrend"] = detection_results["hourlyTrend"][-24:]
+    
+    # Add to persistent data
+    add_detection_to_persistent_data(attack_type, source_ip, target, now, observed)
+
+def classify_window(stats):
+    """Pick the attack type and main source for a flagged traffic window"""
+    flags = stats["flag_counts"]
+    packets = max(1, stats["packets"])
+    protocol, _ = stats["top_protocol"]
+    port, _ = stats["top_port"]
+    
+    if flags["syn"] / packets > 0.5:
+        attack_type, (source, _) = 'syn_flood', stats["top_syn_source"]
+    elif protocol == 17:
+        attack_type, (source, _) = 'udp_flood', stats["top_udp_source"]
+    elif port in (80, 443):
+        attack_type, (source, _) = 'http_flood', stats["top_http_source"]
+    else:
+        attack_type, source = 'slowloris', None
+    
+    return attack_type, int_to_ip(source) if source is not None else "unknown", service_name(port)
 
 def detect_ddos_attacks():
     """Detect DDoS attacks based on traffic patterns"""
@@ -283,70 +456,70 @@ def detect_ddos_attacks():
             attack_type = 'syn_flood'
             
             # Generate random source IPs for the attack
-            source_ips = [
-                f"{random.randint(1, 255)}.{random.randint(1, 255)}.{random.randint(1, 255)}.{random.randint(1, 255)}"
-                for _ in range(5)
-            ]
+            source_ips = [random_ip() for _ in range(5)]
             source_ip = random.choice(source_ips)
             
             # Determine the target service based on common ports
             target = "HTTP (80)"  # Default to HTTP
             
-            # Update detection counts
-            detection_results["totalDetections"] += 1
-            detection_results["byType"][attack_type] += 1
-            
-            # Update recent timestamps
-            now = datetime.datetime.now().isoformat()
-            detection_results["recentTimestamps"].append(now)
-            detection_results["recentTimestamps"] = sorted(detection_results["recentTimestamps"], reverse=True)[:100]
-            
-            # Update top sources
+            # Give every simulated source a significant count and make sure
+            # the simulated target is at the top
             for src_ip in source_ips:
-                ip_counter[src_ip] += random.randint(10, 50)  # Add significant counts
-            
-            detection_results["topSources"] = [
-                {"ip": ip, "count": count}
-                for ip, count in ip_counter.most_common(5)
-            ]
+                ip_counter[src_ip] += random.randint(10, 50)
+            record_detection(attack_type, source_ip, target, source_weight=0, target_weight=50)
             
-            # Update top targets - make sure the simulated target is at the top
-            port_counter[target] += 50  # Add a significant count
-            detection_results["topTargets"] = [
-                {"service": service, "count": count}
-                for service, count in port_counter.most_common(5)
-            ]
-            
-            # Update hourly trend
-            hour = datetime.datetime.now().strftime('%Y-%m-%d %H:00')
-            hour_found = False
-            for trend in detection_results["hourlyTrend"]:
-                if trend["hour"] == hour:
-                    trend["count"] += 1
-                    hour_found = True
-                    break
-            
-            if not hour_found:
-                detection_results["hourlyTrend"].append({
-                    "hour": hour,
-                    "count": 1
-                })
-                # Keep only the last 24 hours
-                if len(detection_results["hourlyTrend"]) > 24:
-                    detection_results["hourlyTrend"] = detection_results["hourlyTrend"][-24:]
-            
-            # Add to persistent data
-            add_detection_to_persistent_data(attack_type, source_ip, target, now)
-            
-            sys.stderr.write(f"DoS attack detected during simulation: {attack_type} targeting {target}\n")
+            log.info("DoS attack detected during simulation: %s targeting %s", attack_type, target)
             return
             
         except Exception as e:
-            sys.stderr.write(f"Error processing simulation flag: {e}\n")
+            log.error("Error processing simulation flag: %s", e)
             # Fall back to ML detection if there's an error
     
-    # Try to use the ML model if available
-    if MODEL is not None:
+    # Threshold rules are the cheap first line; the model only runs without an alert
+    if rule_alerts:
+        alerts = [rule_alerts.popleft() for _ in range(len(rule_alerts))]
+        for alert in alerts[:MAX_RULE_DETECTIONS_PER_TICK]:
+            # A target-scope rule fires on the total at a destination; its source_ip
+            # is only the packet that crossed the threshold, so mitigation must not act on it
+            record_detection(alert["attack_type"], alert["source_ip"], service_name(alert["target_port"]),
+                             observed=alert["scope"] == "source")
+        log.info("Rule-based detection: %s alerts, first %s at %s/s", len(alerts), alerts[0]['rule'], alerts[0]['rate'])
+        return
+    
+    # Take the model once, so a reload mid-tick can't mix two versions
+    artifact = ddos_model.get()
+    model_type = artifact.model_type if artifact else None
+    model = artifact.predictor() if artifact else None
+    
+    # Score captured traffic with the ML model: the whole window and every key, in one call
+    if model_type in ("sklearn_forest", "sklearn_linear", "sklearn") and latest_window_stats is not None and latest_window_stats["packets"]:
+        try:
+            keys, key_features, key_totals = keyed_windows.features()
+            features = np.vstack([prepare_features(model_features(latest_window_stats)), key_features])
+            start = time.perf_counter()
+            with span("predict"):
+                probabilities = model.predict_proba(features)[:, 1]
+            elapsed = time.perf_counter() - start
+            INFERENCE_SECONDS.labels("ddos_model").observe(elapsed)
+            ddos_shadow.score(features, probabilities, elapsed, artifact.version)
+            
+            flagged = [i for i in np.argsort(-probabilities[1:]) if probabilities[1 + i] > 0.5]
+            for i in flagged[:MAX_KEY_DETECTIONS_PER_TICK]:
+                attack_type, source_ip = keyed_windows.classify(keys[i], key_totals[i])
+                target = service_name(key_port(keys[i]))
+                record_detection(attack_type, source_ip, target, observed=True)
+                log.info("ML model detected DoS attack on %s: %s targeting %s", key_address(keys[i]), attack_type, target)
+            if not flagged and probabilities[0] > 0.5:
+                attack_type, source_ip, target = classify_window(latest_window_stats)
+                record_detection(attack_type, source_ip, target, observed=True)
+                log.info("ML model detected DoS attack in captured traffic: %s targeting %s", attack_type, target)
+            return
+        
+        except Exception as e:
+            log.error("Error using ML model on captured traffic: %s", e)
+    
+    # The sequence model from the notebook takes (samples, timesteps, features)
+    if model_type == "keras":
         try:
             # Generate features for the model
             # In a real implementation, these would be extracted from actual network traffic
@@ -383,7 +556,7 @@ def detect_ddos_attacks():
             features = features.reshape(features.shape[0], 1, features.shape[1])
             
             # Get prediction
-            prediction = MODEL.predict(features)
+            prediction = model.predict(features)
             is_attack = prediction[0][0] > 0.5
             
             if is_attack:
@@ -398,135 +571,90 @@ def detect_ddos_attacks():
                     attack_type = 'slowloris'
                 
                 # Generate source IP and target
-                source_ip = f"{random.randint(1, 255)}.{random.randint(1, 255)}.{random.randint(1, 255)}.{random.randint(1, 255)}"
+                source_ip = random_ip()
                 targets = ["HTTP (80)", "HTTPS (443)", "DNS (53)", "SSH (22)", "FTP (21)", "SMTP (25)"]
                 target = targets[int(features[0, 0, 6]) % len(targets)]
                 
-                # Update detection counts
-                detection_results["totalDetections"] += 1
-                detection_results["byType"][attack_type] += 1
+                record_detection(attack_type, source_ip, target)
                 
-                # Update recent timestamps
-                now = datetime.datetime.now().isoformat()
-                detection_results["recentTimestamps"].append(now)
-                detection_results["recentTimestamps"] = sorted(detection_results["recentTimestamps"], reverse=True)[:100]
-                
-                # Update top sources
-                ip_counter[source_ip] += 1
-                detection_results["topSources"] = [
-                    {"ip": ip, "count": count}
-                    for ip, count in ip_counter.most_common(5)
-                ]
-                
-                # Update top targets
-                port_counter[target] += 1
-                detection_results["topTargets"] = [
-                    {"service": service, "count": count}
-                    for service, count in port_counter.most_common(5)
-                ]
-                
-                # Update hourly trend
-                hour = datetime.datetime.now().strftime('%Y-%m-%d %H:00')
-                hour_found = False
-                for trend in detection_results["hourlyTrend"]:
-                    if trend["hour"] == hour:
-                        trend["count"] += 1
-                        hour_found = True
-                        break
-                
-                if not hour_found:
-                    detection_results["hourlyTrend"].append({
-                        "hour": hour,
-                        "count": 1
-                    })
-                    # Keep only the last 24 hours
-                    if len(detection_results["hourlyTrend"]) > 24:
-                        detection_results["hourlyTrend"] = detection_results["hourlyTrend"][-24:]
-                
-                # Add to persistent data
-                add_detection_to_persistent_data(attack_type, source_ip, target, now)
-                
-                sys.stderr.write(f"ML model detected DoS attack: {attack_type} targeting {target}\n")
+                log.info("ML model detected DoS attack: %s targeting %s", attack_type, target)
                 return
             
         except Exception as e:
-            sys.stderr.write(f"Error using ML model: {e}\n")
+            log.error("Error using ML model: %s", e)
             # Fall back to random detection if there's an error
     
     # Fallback: Random detection logic (for when ML model is not available or fails)
     if random.random() < 0.05:  # 5% chance of detecting an attack
         attack_type = random.choice(['syn_flood', 'udp_flood', 'http_flood', 'slowloris'])
-        source_ip = f"{random.randint(1, 255)}.{random.randint(1, 255)}.{random.randint(1, 255)}.{random.randint(1, 255)}"
+        source_ip = random_ip()
         target = random.choice([
             "HTTP (80)", "HTTPS (443)", "DNS (53)", "SSH (22)", 
             "FTP (21)", "SMTP (25)", "API Gateway", "Load Balancer"
         ])
         
-        # Update detection counts
-        detection_results["totalDetections"] += 1
-        detection_results["byType"][attack_type] += 1
-        
-        # Update recent timestamps
-        now = datetime.datetime.now().isoformat()
-        detection_results["recentTimestamps"].append(now)
-        detection_results["recentTimestamps"] = sorted(detection_results["recentTimestamps"], reverse=True)[:100]
-        
-        # Update top sources
-        ip_counter[source_ip] += 1
-        detection_results["topSources"] = [
-            {"ip": ip, "count": count}
-            for ip, count in ip_counter.most_common(5)
-        ]
-        
-        # Update top targets
-        port_counter[target] += 1
-        detection_results["topTargets"] = [
-            {"service": service, "count": count}
-            for service, count in port_counter.most_common(5)
-        ]
-        
-        # Update hourly trend
-        hour = datetime.datetime.now().strftime('%Y-%m-%d %H:00')
-        hour_found = False
-        for trend in detection_results["hourlyTrend"]:
-            if trend["hour"] == hour:
-                trend["count"] += 1
-                hour_found = True
-                break
+        record_detection(attack_type, source_ip, target)
         
-        if not hour_found:
-            detection_results["hourlyTrend"].append({
-                "hour": hour,
-                "count": 1
-            })
-            # Keep only the last 24 hours
-            if len(detection_results["hourlyTrend"]) > 24:
-                detection_results["hourlyTrend"] = detection_results["hourlyTrend"][-24:]
-        
-        # Add to persistent data
-        add_detection_to_persistent_data(attack_type, source_ip, target, now)
-        
-        sys.stderr.write(f"Random detection of DoS attack: {attack_type} targeting {target}\n")
+        log.info("Random detection of DoS attack: %s targeting %s", attack_type, target)
+
+def ingest_packet(packet):
+    """Queue a captured Scapy packet for the next window update"""
+    record = PacketRecord.from_scapy(packet, time.time_ns())
+    if record is not None:
+        packets_ingested.inc()
+        traffic_window.add_record(record)
+        if record.protocol == 6:
+            connection_tracker.observe(record, scapy_payload(packet))
+        alerts = rule_engine.evaluate(record)
+        if alerts:
+            rule_alert_count.inc(len(alerts))
+            rule_alerts.extend(alerts)
+
+def start_capture():
+    """Sniff packets with Scapy on a background thread"""
+    from scapy.all import sniff
+    
+    thread = threading.Thread(target=sniff, kwargs={"prn": ingest_packet, "store": 0})
+    thread.daemon = True
+    thread.start()
+    log.info("Capturing packets into the traffic window")
 
 def packet_callback(packet):
     """Process a network packet (simulation)"""
     # In a real implementation, this would process actual packets from Scapy
     # For simulation, we'll just call our detection function
-    update_traffic_data()
-    detect_ddos_attacks()
-    save_detection_results()
+    global ticks
+    ticks += 1
+    with tick_seconds.time(), span("tick"):
+        with span("rules"):
+            rule_engine.maybe_reload()
+            rule_engine.prune(time.time_ns())
+        with span("connections"):
+            alerts = connection_tracker.expire()
+            if alerts:
+                rule_alert_count.inc(len(alerts))
+                rule_alerts.extend(alerts)
+        with span("traffic"):
+            update_traffic_data()
+        with span("baselines"):
+            update_baselines()
+        with span("detect"):
+            detect_ddos_attacks()
+        with span("save"):
+            save_detection_results()
 
 def monitor_network():
     """Monitor network traffic for DDoS attacks"""
-    sys.stderr.write("Starting DDoS monitoring...\n")
+    log.info("Starting DDoS monitoring...")
     save_pid()
     
-    # Load persistent data
+    # Load persistent data and the learned traffic baselines
     load_persistent_data()
+    traffic_baseline.load()
     
     # Initialize traffic data with some values if empty
     if not detection_results["trafficData"]:
-        sys.stderr.write("Initializing traffic data with simulation values\n")
+        log.info("Initializing traffic data with simulation values")
         now = datetime.datetime.now()
         for second in range(60):
             time_str = (now - datetime.timedelta(seconds=60-second)).strftime('%H:%M:%S')
@@ -536,18 +664,26 @@ def monitor_network():
             })
         save_detection_results()
     
+    if CAPTURE_ENABLED:
+        start_capture()
+    
+    # Pick up retrained models without restarting
+    ddos_model.start()
+    
+    # Expose the counters above for scraping
+    serve_metrics()
+    
     try:
-        # In a real implementation, we would use Scapy to sniff packets
-        # sniff(prn=packet_callback, store=0)
-        
-        # For simulation, we'll just call our callback periodically
+        # Detection runs once a second over the captured (or simulated) traffic
         while running:
             packet_callback(None)
             time.sleep(1)
     except KeyboardInterrupt:
-        sys.stderr.write("Stopping DDoS monitoring...\n")
+        log.info("Stopping DDoS monitoring...")
     finally:
         # Clean up
+        if CAPTURE_ENABLED:
+            traffic_baseline.save()
         if os.path.exists(MONITOR_PID_FILE):
             os.remove(MONITOR_PID_FILE)
 
@@ -555,13 +691,16 @@ def signal_handler(sig, frame):
     """Handle termination signals"""
     global running
     running = False
-    sys.stderr.write("Received signal to stop monitoring\n")
+    log.info("Received signal to stop monitoring")
 
 if __name__ == "__main__":
     # Register signal handlers
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
     
+    # SIGUSR1/SIGUSR2 start and stop profiling; see profiling.py
+    install("ddos_monitor")
+    
     # Initialize hourly trend data
     now = datetime.datetime.now()
     for hour in range(24):
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+import os
+import json
+from packet_record import FLAG_SYN, FLAG_ACK, FLAG_PSH, int_to_ip
+from log_config import get_logger
+
+log = get_logger("ddos_rules")
+
+# Path to the ML Models directory
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Optional per-rule overrides, reloaded whenever the file changes
+RULES_CONFIG_FILE = os.path.join(ML_DIR, 'scripts', 'ddos_rules.json')
+
+# Ports whose TCP traffic counts as HTTP requests
+HTTP_PORTS = frozenset([80, 443, 3001, 8080])
+
+# Packet predicates a rule can count
+def is_syn(record):
+    return record.flags & FLAG_SYN and not record.flags & FLAG_ACK
+
+def is_udp(record):
+    return record.protocol == 17
+
+def is_http(record):
+    return record.protocol == 6 and record.flags & FLAG_PSH and record.dst_port in HTTP_PORTS
+
+def is_any(record):
+    return True
+
+MATCHERS = {
+    "syn": is_syn,
+    "udp": is_udp,
+    "http": is_http,
+    "any": is_any
+}
+
+def default_rules(packets_per_second, syn_flood, http_flood, udp_flood):
+    """Build the default rule set from the monitor's thresholds (packets per second)"""
+    return {
+        "syn_flood": {"match": "syn", "scope": "source", "threshold": syn_flood, "window": 1, "attack_type": "syn_flood"},
+        "udp_flood": {"match": "udp", "scope": "source", "threshold": udp_flood, "window": 1, "attack_type": "udp_flood"},
+        "http_flood": {"match": "http", "scope": "source", "threshold": http_flood, "window": 1, "attack_type": "http_flood"},
+        "distributed_syn_flood": {"match": "syn", "scope": "target", "threshold": syn_flood * 5, "window": 1, "attack_type": "syn_flood"},
+        "target_volume": {"match": "any", "scope": "target", "threshold": packets_per_second, "window": 1, "attack_type": "auto"}
+    }
+
+class Rule:
+    """Threshold on matching packets per source or target over a sliding window
+
+    Each key keeps the counts for the current and previous window; the
+    sliding count is estimated by weighting the previous window by how much
+    of it still overlaps. That is O(1) time and memory per key and packet.
+    """
+
+    __slots__ = ('name', 'matches', 'by_source', 'limit', 'window_ns', 'attack_type', 'state')
+
+    def __init__(self, name, config):
+        self.name = name
+        self.matches = MATCHERS[config.get("match", "any")]
+        self.by_source = config.get("scope", "source") == "source"
+        window = config.get("window", 1)
+        self.limit = config["threshold"] * window
+        self.window_ns = int(window * 1e9)
+        self.attack_type = config.get("attack_type", name)
+        # key -> [window index, previous count, current count, window last alerted]
+        self.state = {}
+
+    def hit(self, key, now_ns):
+        """Count a packet for key; return the sliding count if the rule fires"""
+        window = now_ns // self.window_ns
+        state = self.state.get(key)
+        if state is None:
+            state = self.state[key] = [window, 0, 0, -1]
+        elif state[0] != window:
+            state[1] = state[2] if state[0] == window - 1 else 0
+            state[2] = 0
+            state[0] = window
+        state[2] += 1
+
+        overlap = 1 - (now_ns % self.window_ns) / self.window_ns
+        count = state[1] * overlap + state[2]
+
+        # Alert at most once per key and window
+        if count >= self.limit and state[3] != window:
+            state[3] = window
+            return count
+        return None
+
+    def prune(self, now_ns):
+        """Forget keys that saw no traffic in the last two windows
+
+        Runs alongside hit() on the capture thread, so it iterates over a
+        snapshot and deletes in place rather than swapping in a new dict
+        that would lose keys added meanwhile.
+        """
+        oldest = now_ns // self.window_ns - 1
+        for key, state in list(self.state.items()):
+            if state[0] < oldest:
+                self.state.pop(key, None)
+
+class RuleEngine:
+    """Evaluates the flood threshold rules against every captured packet"""
+
+    def __init__(self, defaults, config_file=RULES_CONFIG_FILE):
+        self.defaults = defaults
+        self.config_file = config_file
+        self.config_mtime = None
+        self.rules = []
+        self.load()
+
+    def load(self):
+        """(Re)build the rules from the defaults plus any overrides in the config file"""
+        config = {name: dict(rule) for name, rule in self.defaults.items()}
+        if os.path.exists(self.config_file):
+            try:
+                with open(self.config_file, 'r') as f:
+                    overrides = json.load(f)
+                for name, override in overrides.items():
+                    config.setdefault(name, {}).update(override)
+                self.config_mtime = os.path.getmtime(self.config_file)
+            except Exception as e:
+                log.error("Error loading DDoS rule config: %s", e)
+        else:
+            self.config_mtime = None
+
+        # Keep the sliding-window state of rules whose settings did not change
+        previous = {rule.name: rule for rule in self.rules}
+        rules = []
+        for name, settings in config.items():
+            if not settings.get("enabled", True):
+                continue
+            try:
+                rule = Rule(name, settings)
+            except (KeyError, TypeError, ValueError) as e:
+                log.warning("Ignoring invalid DDoS rule %s: %s", name, e)
+                continue
+            old = previous.get(name)
+            if old is not None and (old.limit, old.window_ns, old.by_source, old.matches) == (rule.limit, rule.window_ns, rule.by_source, rule.matches):
+                rule.state = old.state
+            rules.append(rule)
+        self.rules = rules
+
+    def maybe_reload(self):
+        """Reload the rules if the config file changed since the last load"""
+        try:
+            mtime = os.path.getmtime(self.config_file)
+        except OSError:
+            mtime = None
+        if mtime != self.config_mtime:
+            self.load()
+            log.info("Reloaded DDoS rules: %s", ', '.join(rule.name for rule in self.rules))
+
+    def evaluate(self, record):
+        """Run every rule against a PacketRecord and return the alerts it raised"""
+        alerts = None
+        for rule in self.rules:
+            if not rule.matches(record):
+                continue
+            key = record.src_ip if rule.by_source else (record.dst_ip << 16) | record.dst_port
+            count = rule.hit(key, record.ts_ns)
+            if count is not None:
+                if alerts is None:
+                    alerts = []
+                alerts.append(self.alert(rule, record, count))
+        return alerts
+
+    def alert(self, rule, record, count):
+        attack_type = rule.attack_type
+        if attack_type == "auto":
+            # Name volume alerts after the packet that crossed the threshold
+            if is_syn(record):
+                attack_type = "syn_flood"
+            elif is_udp(record):
+                attack_type = "udp_flood"
+            else:
+                attack_type = "http_flood"
+        
+        return {
+            "rule": rule.name,
+            "attack_type": attack_type,
+            "scope": "source" if rule.by_source else "target",
+            "source_ip": int_to_ip(record.src_ip),
+            "target_ip": int_to_ip(record.dst_ip),
+            "target_port": record.dst_port,
+            "rate": round(count * 1e9 / rule.window_ns, 1)
+        }
+
+    def prune(self, now_ns):
+        for rule in self.rules:
+            rule.prune(now_ns)
@@ -2,9 +2,17 @@
 import json
 import sys
 import os
+import atexit
 from ddos_stats import save_ddos_detection
+from metrics import push_metrics
+from log_config import get_logger
+
+log = get_logger("ddos_save_detection")
 
 if __name__ == "__main__":
+    # This process is one request; hand its metrics to the broker on the way out
+    atexit.register(push_metrics)
+    
     # Get detection data from command line argument
     detection_json = sys.argv[1] if len(sys.argv) > 1 else "{}"
     
@@ -19,6 +27,6 @@ if __name__ == "__main__":
         print(json.dumps({"success": True}))
     except Exception as e:
         # Log error to stderr
-        sys.stderr.write(f"Error saving DDoS detection: {str(e)}\n")
+        log.error("Error saving DDoS detection: %s", e)
         # Output error as JSON to stdout
         print(json.dumps({"success": False, "error": str(e)})) 
\ No newline at end of file
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+import os
+import sys
+import csv
+import json
+import numpy as np
+from ddos_analyze import DDOS_FEATURES, prepare_features
+from probe_engine import ProbeEngine
+from test_ddos_model import real_traffic_features, training_scale_features, known_attack_features
+
+# Score at which the verdict flips to attack
+THRESHOLD = 0.5
+
+# Points on each feature's sensitivity curve and partial dependence grid
+CURVE_POINTS = 60
+
+# Features that only take the values 0 and 1
+BINARY_FEATURES = {"Protocol", "syn_flag", "ack_flag", "psh_flag", "rst_flag", "fin_flag"}
+
+# Features that grow with traffic volume; scaled together to find the volume that flips the verdict
+VOLUME_FEATURES = ["pktcount", "bytecount", "packetins", "pktrate", "pktperflow", "byteperflow", "tx_bytes", "rx_bytes"]
+
+# Factors the volume features are scaled by
+VOLUME_FACTORS = np.geomspace(1e-3, 1e5, 161)
+
+# Rows of the SDN data used as the background for partial dependence
+REFERENCE_ROWS = 500
+
+def feature_grids(reference, points=CURVE_POINTS):
+    """Values each feature is swept over: 0 and 1 for flags, else 0 plus a log grid"""
+    grids = {}
+    for i, name in enumerate(DDOS_FEATURES):
+        if name in BINARY_FEATURES:
+            grids[name] = np.array([0.0, 1.0])
+        else:
+            high = max(float(np.abs(reference[:, i]).max()) * 10, 10.0)
+            grids[name] = np.concatenate([[0.0], np.geomspace(high * 1e-8, high, points - 1)])
+    return grids
+
+def sensitivity_curves(engine, row, grids, live=True):
+    """Score row with one feature at a time set to each of its grid values"""
+    blocks, owners = [], []
+    for i, name in enumerate(DDOS_FEATURES):
+        block = np.tile(row, (len(grids[name]), 1))
+        block[:, i] = grids[name]
+        blocks.append(block)
+        owners.append(name)
+    scores = engine.score(np.concatenate(blocks), live)
+
+    curves, offset = {}, 0
+    for name in owners:
+        count = len(grids[name])
+        curves[name] = scores[offset:offset + count]
+        offset += count
+    return curves
+
+def partial_dependence(engine, reference, grids):
+    """Mean score over the reference rows with each feature fixed at each grid value
+
+    The reference rows are at training scale, so they are scored without the live gain.
+    """
+    dependence = {}
+    for i, name in enumerate(DDOS_FEATURES):
+        values = grids[name]
+        X = np.repeat(reference[np.newaxis], len(values), axis=0)
+        X[:, :, i] = values[:, np.newaxis]
+        dependence[name] = engine.score(X.reshape(-1, len(DDOS_FEATURES)), live=False).reshape(len(values), -1).mean(axis=1)
+    return dependence
+
+def active_range(values, curve):
+    """Span of values over which the curve changes; outside it the model is flat"""
+    changes = np.flatnonzero(np.diff(curve) != 0)
+    if len(changes) == 0:
+        return None
+    return float(values[changes[0]]), float(values[changes[-1] + 1])
+
+def minimal_flips(row, base_score, grids, curves):
+    """For each feature, the value closest to the row's that flips the verdict"""
+    attack = base_score > THRESHOLD
+    flips = {}
+    for i, name in enumerate(DDOS_FEATURES):
+        values, curve = grids[name], curves[name]
+        flipped = (curve > THRESHOLD) != attack
+        if not flipped.any():
+            flips[name] = None
+            continue
+        candidates = values[flipped]
+        best = candidates[np.argmin(np.abs(candidates - row[i]))]
+        flips[name] = {
+            "from": float(row[i]),
+            "to": float(best),
+            "factor": float(best / row[i]) if row[i] else None,
+            "score": float(curve[flipped][np.argmin(np.abs(candidates - row[i]))])
+        }
+    return flips
+
+def volume_flip(engine, row, live=True):
+    """Smallest factor on all volume features together that flips the verdict"""
+    columns = [DDOS_FEATURES.index(name) for name in VOLUME_FEATURES]
+    X = np.tile(row, (len(VOLUME_FACTORS), 1))
+    X[:, columns] *= VOLUME_FACTORS[:, np.newaxis]
+    scores = engine.score(X, live)
+    base_attack = engine.score(row[np.newaxis], live)[0] > THRESHOLD
+    flipped = np.flatnonzero((scores > THRESHOLD) != base_attack)
+    if len(flipped) == 0:
+        return None
+    # Closest to a factor of 1 on a log scale
+    best = flipped[np.argmin(np.abs(np.log(VOLUME_FACTORS[flipped])))]
+    return {"factor": float(VOLUME_FACTORS[best]), "score": float(scores[best])}
+
+def load_reference(data_path=None):
+    """Background rows at training scale: a sample of the SDN data, or the known training-scale probe rows"""
+    if data_path:
+        from train_models import load_ddos_csv
+        X, _, _ = load_ddos_csv(data_path, DDOS_FEATURES)
+        rng = np.random.default_rng(42)
+        return X[rng.choice(len(X), min(REFERENCE_ROWS, len(X)), replace=False)].astype(np.float64)
+    rows = [training_scale_features, known_attack_features]
+    return np.concatenate([prepare_features(row) for row in rows])
+
+def analyze(engine, live, training, reference):
+    """Sensitivity of the live and training-scale rows and where the model is blind
+
+    The live row is scored as the service scores it, with the live gain;
+    the training-scale and reference rows without it.
+    """
+    grids = feature_grids(np.concatenate([reference, live[np.newaxis], training[np.newaxis]]))
+    live_curves = sensitivity_curves(engine, live, grids)
+    training_curves = sensitivity_curves(engine, training, grids, live=False)
+    dependence = partial_dependence(engine, reference, grids)
+    live_score = engine.score(live[np.newaxis])[0]
+    training_score = engine.score(training[np.newaxis], live=False)[0]
+
+    features = []
+    for i, name in enumerate(DDOS_FEATURES):
+        active = active_range(grids[name], dependence[name])
+        features.append({
+            "feature": name,
+            "live": float(live[i]),
+            "training": float(training[i]),
+            "training_to_live": float(training[i] / live[i]) if live[i] else None,
+            "sensitivity": float(np.ptp(dependence[name])),
+            "active_from": active[0] if active else None,
+            "active_to": active[1] if active else None,
+            # The model can't tell live values apart if they sit below everything it reacts to
+            "live_below_active_range": bool(active and live[i] < active[0] and name not in BINARY_FEATURES)
+        })
+    features.sort(key=lambda f: -f["sensitivity"])
+
+    return {
+        "grids": grids,
+        "curves": {"live": live_curves, "training": training_curves},
+        "dependence": dependence,
+        "report": {
+            "threshold": THRESHOLD,
+            "live_score": float(live_score),
+            "training_score": float(training_score),
+            "features": features,
+            "flips": {
+                "live": minimal_flips(live, live_score, grids, live_curves),
+                "training": minimal_flips(training, training_score, grids, training_curves)
+            },
+            "volume_flip": {"live": volume_flip(engine, live), "training": volume_flip(engine, training, live=False)},
+            "probes": engine.probes,
+            "seconds": round(engine.seconds, 3)
+        }
+    }
+
+def write_csv(path, header, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+def export(results, out_dir):
+    """Write curves, partial dependence, flips and the feature table as CSV, and the report as JSON"""
+    os.makedirs(out_dir, exist_ok=True)
+    grids = results["grids"]
+    write_csv(os.path.join(out_dir, 'sensitivity_curves.csv'), ["row", "feature", "value", "score"], [
+        (row, name, value, score)
+        for row, curves in results["curves"].items()
+        for name in DDOS_FEATURES
+        for value, score in zip(grids[name], curves[name])
+    ])
+    write_csv(os.path.join(out_dir, 'partial_dependence.csv'), ["feature", "value", "mean_score"], [
+        (name, value, score)
+        for name in DDOS_FEATURES
+        for value, score in zip(grids[name], results["dependence"][name])
+    ])
+    report = results["report"]
+    write_csv(os.path.join(out_dir, 'minimal_flips.csv'), ["row", "feature", "from", "to", "factor", "score"], [
+        (row, name, flip["from"], flip["to"], flip["factor"], flip["score"])
+        for row, flips in report["flips"].items()
+        for name, flip in flips.items() if flip
+    ])
+    features = report["features"]
+    write_csv(os.path.join(out_dir, 'features.csv'), list(features[0]), [list(f.values()) for f in features])
+    with open(os.path.join(out_dir, 'sensitivity.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    # Usage: python ddos_sensitivity.py [out_dir] [data.csv]
+    out_dir = sys.argv[1] if len(sys.argv) > 1 else None
+    data_path = sys.argv[2] if len(sys.argv) > 2 else None
+
+    engine = ProbeEngine()
+    results = analyze(
+        engine,
+        prepare_features(real_traffic_features)[0],
+        prepare_features(training_scale_features)[0],
+        load_reference(data_path)
+    )
+    if out_dir:
+        export(results, out_dir)
+    print(json.dumps(results["report"], indent=2))
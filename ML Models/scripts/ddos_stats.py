@@ -3,8 +3,13 @@ import json
 import os
 import random
 import datetime
-import sys
+import time
 from collections import Counter
+from event_stream import publish_event
+from metrics import DETECTIONS, SAVE_SECONDS
+from log_config import get_logger
+
+log = get_logger("ddos_stats")
 
 # Path to the ML Models directory
 ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -21,11 +26,11 @@ def generate_ddos_stats():
         try:
             with open(DDOS_PERSISTENT_FILE, 'r') as f:
                 data = json.load(f)
-                sys.stderr.write("Loaded real DDoS detection data\n")
+                log.debug("Loaded real DDoS detection data")
                 
                 # Check if traffic data is missing or empty
                 if "trafficData" not in data or not data["trafficData"]:
-                    sys.stderr.write("Traffic data missing or empty, generating simulated traffic data\n")
+                    log.debug("Traffic data missing or empty, generating simulated traffic data")
                     # Generate simulated traffic data
                     now = datetime.datetime.now()
                     traffic_data = []
@@ -39,11 +44,11 @@ def generate_ddos_stats():
                 
                 return data
         except Exception as e:
-            sys.stderr.write(f"Error loading DDoS detection data: {e}\n")
-            sys.stderr.write("Falling back to simulated data\n")
+            log.error("Error loading DDoS detection data: %s", e)
+            log.warning("Falling back to simulated data")
     else:
-        sys.stderr.write(f"No persistent DDoS data found at {DDOS_PERSISTENT_FILE}\n")
-        sys.stderr.write("Generating simulated DDoS statistics\n")
+        log.warning("No persistent DDoS data found at %s", DDOS_PERSISTENT_FILE)
+        log.warning("Generating simulated DDoS statistics")
     
     # If no real data is available, generate simulated data
     # Total detections (random number between 30-100)
@@ -134,6 +139,7 @@ def generate_ddos_stats():
 # Function to save a new DDoS detection
 def save_ddos_detection(detection):
     """Save a new DDoS detection to the persistent file"""
+    start = time.perf_counter()
     # Initialize with default structure
     data = {
         "totalDetections": 0,
@@ -156,7 +162,7 @@ def save_ddos_detection(detection):
             with open(DDOS_PERSISTENT_FILE, 'r') as f:
                 data = json.load(f)
         except Exception as e:
-            sys.stderr.write(f"Error loading existing DDoS data: {e}\n")
+            log.error("Error loading existing DDoS data: %s", e)
     
     # Add the new detection
     if "detections" not in data:
@@ -233,6 +239,11 @@ def save_ddos_detection(detection):
     # Save the updated data
     with open(DDOS_PERSISTENT_FILE, 'w') as f:
         json.dump(data, f)
+    DETECTIONS.labels("ddos", detection.get("attack_type")).inc()
+    SAVE_SECONDS.labels("ddos").observe(time.perf_counter() - start)
+    
+    # Push the detection to dashboard subscribers
+    publish_event("detection", {"kind": "ddos", **detection})
     
     return data
 
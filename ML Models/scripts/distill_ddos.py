@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import warnings
+import numpy as np
+from model_artifacts import ARTIFACTS_DIR, load_artifact, save_artifact
+from model_watcher import predict_scores
+from shadow_scoring import CANDIDATE_SUFFIX
+from linear_inference import CompiledLinear, signed_log1p
+from feature_scaler import ScaledModel
+from train_models import DDOS_DATA_PATH, RANDOM_STATE, TEST_SIZE, Stopwatch, load_ddos_csv
+from ddos_analyze import DDOS_FEATURES
+
+warnings.filterwarnings("ignore")
+
+# Largest drop in holdout accuracy, and smallest speedup, a student may be promoted with
+MAX_ACCURACY_DROP = 0.01
+MIN_SPEEDUP = 10.0
+
+# Single-row calls timed per model
+LATENCY_CALLS = 500
+
+def per_row_us(function, X, calls=LATENCY_CALLS):
+    """Median microseconds per call of function on one row"""
+    times = np.empty(calls)
+    for i in range(calls):
+        row = X[i % len(X)][np.newaxis]
+        start = time.perf_counter()
+        function(row)
+        times[i] = time.perf_counter() - start
+    return float(np.median(times) * 1e6)
+
+def fit_student(X, teacher_labels):
+    """Logistic regression on signed-log, standardized features"""
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import FunctionTransformer, StandardScaler
+    from sklearn.linear_model import LogisticRegression
+    student = make_pipeline(
+        FunctionTransformer(signed_log1p),
+        StandardScaler(),
+        LogisticRegression(max_iter=1000, random_state=RANDOM_STATE)
+    )
+    student.fit(X, teacher_labels)
+    return student
+
+def distill(data_path=DDOS_DATA_PATH, teacher_name="ddos_model", artifacts_dir=ARTIFACTS_DIR):
+    """Train a compiled logistic student on the teacher's decisions and compare them
+
+    Uses train_models' split, so the holdout is the rows the teacher was
+    evaluated on, not trained on. A teacher with a FeatureScaler passes it
+    on: the student learns on the same scaled features and is saved with
+    it. Returns (student, scaler, report).
+    """
+    from sklearn.model_selection import train_test_split
+    stopwatch = Stopwatch()
+    start = time.perf_counter()
+    teacher = load_artifact(teacher_name, artifacts_dir=artifacts_dir)
+    teacher.check_schema(DDOS_FEATURES)
+    X, y, missing = load_ddos_csv(data_path, DDOS_FEATURES)
+    X = X.astype(np.float64)
+    start = stopwatch.stage("load", start)
+
+    # The SDN rows are already at training scale, so no live gain
+    teacher_labels = (predict_scores(teacher, X, live=False) > 0.5).astype(np.int8)
+    start = stopwatch.stage("label", start)
+
+    X_train, X_test, y_train, y_test, t_train, t_test = train_test_split(
+        X, y, teacher_labels, test_size=TEST_SIZE, random_state=RANDOM_STATE, stratify=y
+    )
+    scaler = teacher.scaler
+    student = fit_student(scaler.transform(X_train) if scaler else X_train, t_train)
+    compiled = CompiledLinear.from_sklearn(student)
+    start = stopwatch.stage("fit", start)
+
+    # Served the way the saved artifact will be
+    served = ScaledModel(scaler, compiled) if scaler else compiled
+    offline = ScaledModel(scaler, compiled, live=False) if scaler else compiled
+    student_labels = (offline.predict_proba(X_test)[:, 1] > 0.5).astype(np.int8)
+    teacher_accuracy = float((t_test == y_test).mean())
+    student_accuracy = float((student_labels == y_test).mean())
+
+    latency = {
+        "teacher": per_row_us(lambda row: predict_scores(teacher, row), X_test),
+        "student": per_row_us(served.predict_proba, X_test)
+    }
+    if teacher.model_type.startswith("sklearn"):
+        sklearn_teacher = ScaledModel(scaler, teacher.model) if scaler else teacher.model
+        latency["teacher_sklearn"] = per_row_us(sklearn_teacher.predict_proba, X_test, LATENCY_CALLS // 10)
+    stopwatch.stage("evaluate", start)
+
+    speedup = latency["teacher"] / latency["student"]
+    report = {
+        "teacher": {"name": teacher_name, "version": teacher.version, "model_type": teacher.model_type},
+        "source": os.path.basename(data_path),
+        "missing_features": missing,
+        "scaler": scaler.version if scaler else None,
+        "transfer_rows": int(len(X_train)),
+        "holdout_rows": int(len(X_test)),
+        "agreement": round(float((student_labels == t_test).mean()), 4),
+        "accuracy": {
+            "teacher": round(teacher_accuracy, 4),
+            "student": round(student_accuracy, 4),
+            "drop": round(teacher_accuracy - student_accuracy, 4)
+        },
+        "latency_us": {key: round(value, 1) for key, value in latency.items()},
+        "speedup": round(speedup, 1),
+        "meets_target": bool(teacher_accuracy - student_accuracy <= MAX_ACCURACY_DROP and speedup >= MIN_SPEEDUP),
+        "stages": stopwatch.stages
+    }
+    return student, scaler, report
+
+def save_student(student, report, scaler=None, promote=False, artifacts_dir=ARTIFACTS_DIR):
+    """Save the student as ddos_model_candidate, or as ddos_model when promoted"""
+    name = report["teacher"]["name"] if promote else report["teacher"]["name"] + CANDIDATE_SUFFIX
+    manifest = save_artifact(student, name, DDOS_FEATURES, metadata={"distillation": report},
+                             artifacts_dir=artifacts_dir, scaler=scaler)
+    report["artifact"] = name
+    report["version"] = manifest["version"]
+    return manifest
+
+if __name__ == "__main__":
+    # Usage: python distill_ddos.py [data.csv] [--promote]
+    args = [arg for arg in sys.argv[1:] if arg != "--promote"]
+    promote = "--promote" in sys.argv
+    student, scaler, report = distill(args[0] if args else DDOS_DATA_PATH)
+    if promote and not report["meets_target"]:
+        sys.stderr.write(
+            f"Not promoting: accuracy drop {report['accuracy']['drop']} (max {MAX_ACCURACY_DROP}), "
+            f"speedup {report['speedup']}x (min {MIN_SPEEDUP}x)\n"
+        )
+        print(json.dumps(report, indent=2))
+        sys.exit(1)
+    save_student(student, report, scaler, promote)
+    print(json.dumps(report, indent=2))
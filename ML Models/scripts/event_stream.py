@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+import os
+import json
+import sys
+import signal
+import socket
+import datetime
+import threading
+import http.server
+import socketserver
+from collections import deque
+from urllib.parse import urlparse, parse_qs
+from metrics import REGISTRY, counter, gauge, send_metrics
+from log_config import get_logger
+
+log = get_logger("event_stream")
+
+# Path to the ML Models directory
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Unix datagram socket the monitor and analyzers publish events to
+EVENT_PUBLISH_SOCKET = os.path.join(ML_DIR, 'scripts', '.event_stream.sock')
+
+# Unix stream socket that fans events out as newline-delimited JSON
+EVENT_SUBSCRIBE_SOCKET = os.path.join(ML_DIR, 'scripts', '.event_stream_sub.sock')
+
+# Maximum number of pending events kept for each subscriber
+SUBSCRIBER_QUEUE_SIZE = 256
+
+# Largest event accepted from a publisher
+MAX_EVENT_SIZE = 65536
+
+# Seconds between SSE keep-alive comments when no events arrive
+KEEPALIVE_INTERVAL = 15
+
+# Publisher socket, created on first use
+_publish_socket = None
+
+def publish_event(event_type, data):
+    """Publish an event to the local broker without blocking
+
+    Events are dropped silently when no broker is running or its socket
+    buffer is full, so publishing never slows down detection.
+    """
+    global _publish_socket
+    if not hasattr(socket, 'AF_UNIX'):
+        return False
+
+    envelope = {
+        "type": event_type,
+        "timestamp": datetime.datetime.now().isoformat(),
+        "data": data
+    }
+
+    # The event type goes in front of the JSON body so the broker can route
+    # it without decoding the payload
+    message = event_type.encode() + b"\n" + json.dumps(envelope).encode()
+    if len(message) > MAX_EVENT_SIZE:
+        return False
+
+    try:
+        if _publish_socket is None:
+            _publish_socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            _publish_socket.setblocking(False)
+        _publish_socket.sendto(message, EVENT_PUBLISH_SOCKET)
+        return True
+    except OSError:
+        return False
+
+class Subscription:
+    """Bounded event queue for one subscriber that drops the oldest event when full"""
+
+    def __init__(self, types=None, maxlen=SUBSCRIBER_QUEUE_SIZE):
+        self.types = set(types) if types else None
+        self.events = deque(maxlen=maxlen)
+        self.dropped = 0
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def put(self, event_type, payload):
+        if self.types is not None and event_type not in self.types:
+            return
+        with self.cond:
+            if len(self.events) == self.events.maxlen:
+                self.dropped += 1
+            self.events.append((event_type, payload))
+            self.cond.notify()
+
+    def get(self, timeout=None):
+        """Return all pending events, waiting up to timeout for at least one"""
+        with self.cond:
+            if not self.events and not self.closed:
+                self.cond.wait(timeout)
+            events = list(self.events)
+            self.events.clear()
+            return events
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+class EventBroker:
+    """Fans published events out to every subscriber"""
+
+    def __init__(self, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self, types=None):
+        subscription = Subscription(types, self.queue_size)
+        with self.lock:
+            self.subscribers = self.subscribers + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.close()
+        with self.lock:
+            self.subscribers = [s for s in self.subscribers if s is not subscription]
+
+    def publish(self, event_type, payload):
+        """Queue an already-encoded event for every subscriber"""
+        self.published += 1
+        # The subscriber list is replaced rather than mutated, so iterating
+        # over the current snapshot needs no lock
+        for subscription in self.subscribers:
+            subscription.put(event_type, payload)
+
+    def stats(self):
+        subscribers = self.subscribers
+        return {
+            "published": self.published,
+            "subscribers": len(subscribers),
+            "dropped": sum(s.dropped for s in subscribers)
+        }
+
+# Global broker used by the servers in this process
+broker = EventBroker()
+
+def receive_events(sock):
+    """Read published datagrams and hand them to the broker"""
+    received = counter("events_received_total", "Events received from publishers", ["type"])
+    while True:
+        try:
+            message = sock.recv(MAX_EVENT_SIZE)
+        except OSError:
+            return
+        event_type, _, payload = message.partition(b"\n")
+        if not payload:
+            continue
+        event_type = event_type.decode(errors='replace')
+        received.labels(event_type).inc()
+        # Metrics pushed by short-lived processes are added to this process's, not fanned out
+        if event_type == "metrics":
+            try:
+                REGISTRY.merge(json.loads(payload)["data"])
+            except (ValueError, KeyError, TypeError) as e:
+                log.warning("Ignoring malformed metrics event: %s", e)
+            continue
+        broker.publish(event_type, payload)
+
+def parse_types(value):
+    """Parse a comma-separated list of event types"""
+    if not value:
+        return None
+    return [t for t in value.split(',') if t]
+
+# HTTP request handler that streams events as Server-Sent Events
+class EventStreamHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        parsed_path = urlparse(self.path)
+
+        if parsed_path.path == "/events":
+            query = parse_qs(parsed_path.query)
+            types = parse_types(query.get('types', [''])[0])
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Connection', 'keep-alive')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+
+            subscription = broker.subscribe(types)
+            try:
+                while True:
+                    events = subscription.get(KEEPALIVE_INTERVAL)
+                    if not events:
+                        self.wfile.write(b": keepalive\n\n")
+                    for event_type, payload in events:
+                        self.wfile.write(b"event: " + event_type.encode() + b"\ndata: " + payload + b"\n\n")
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                broker.unsubscribe(subscription)
+            return
+
+        elif parsed_path.path == "/metrics":
+            send_metrics(self)
+            return
+
+        elif parsed_path.path == "/api/stats":
+            body = json.dumps(broker.stats()).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.send_response(404)
+        self.send_header('Content-Length', '9')
+        self.end_headers()
+        self.wfile.write(b'Not Found')
+
+    def log_message(self, format, *args):
+        # Streaming connections would otherwise log one line per client
+        pass
+
+class ThreadingEventServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+# Stream handler that fans events out over a Unix socket as JSON lines
+class EventSocketHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        # The first line sent by the client optionally lists event types
+        self.request.settimeout(1)
+        try:
+            types = parse_types(self.request.recv(1024).decode(errors='replace').strip())
+        except socket.timeout:
+            types = None
+        self.request.settimeout(None)
+
+        subscription = broker.subscribe(types)
+        try:
+            while True:
+                events = subscription.get(KEEPALIVE_INTERVAL)
+                if events:
+                    self.request.sendall(b"".join(payload + b"\n" for _, payload in events))
+        except OSError:
+            pass
+        finally:
+            broker.unsubscribe(subscription)
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class ThreadingEventSocketServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+def iter_events(types=None, path=EVENT_SUBSCRIBE_SOCKET):
+    """Yield decoded events from a running broker's Unix socket fan-out"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall((",".join(types) if types else "").encode() + b"\n")
+        buffer = b""
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                return
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line:
+                    yield json.loads(line)
+
+def bind_unix_socket(path, kind):
+    """Bind a Unix socket at path, replacing a stale socket file"""
+    if os.path.exists(path):
+        os.remove(path)
+    sock = socket.socket(socket.AF_UNIX, kind)
+    sock.bind(path)
+    return sock
+
+def run_broker(port):
+    """Run the event broker until interrupted"""
+    gauge("event_subscribers", "Connected event subscribers").set_function(lambda: len(broker.subscribers))
+    gauge("events_dropped", "Events dropped from full subscriber queues").set_function(lambda: broker.stats()["dropped"])
+
+    publish_socket = bind_unix_socket(EVENT_PUBLISH_SOCKET, socket.SOCK_DGRAM)
+    threading.Thread(target=receive_events, args=(publish_socket,), daemon=True).start()
+
+    if os.path.exists(EVENT_SUBSCRIBE_SOCKET):
+        os.remove(EVENT_SUBSCRIBE_SOCKET)
+    socket_server = ThreadingEventSocketServer(EVENT_SUBSCRIBE_SOCKET, EventSocketHandler)
+    threading.Thread(target=socket_server.serve_forever, daemon=True).start()
+
+    try:
+        with ThreadingEventServer(("", port), EventStreamHandler) as httpd:
+            log.info("Event stream running at http://localhost:%s/events", port)
+            log.info("Unix socket subscribers: %s", EVENT_SUBSCRIBE_SOCKET)
+            log.info("Metrics, including pushes from the analyzers: http://localhost:%s/metrics", port)
+
+            # Print the port to stdout for the parent process to capture
+            print(port)
+            sys.stdout.flush()
+
+            httpd.serve_forever()
+    except KeyboardInterrupt:
+        log.info("Shutting down event stream")
+    finally:
+        socket_server.shutdown()
+        publish_socket.close()
+        for path in (EVENT_PUBLISH_SOCKET, EVENT_SUBSCRIBE_SOCKET):
+            if os.path.exists(path):
+                os.remove(path)
+
+if __name__ == "__main__":
+    from packet_logger import find_available_port
+
+    DEFAULT_PORT = 8100
+    PORT = find_available_port(DEFAULT_PORT, 20)
+
+    if PORT is None:
+        log.error("Could not find an available port after trying %s through %s", DEFAULT_PORT, DEFAULT_PORT + 19)
+        sys.exit(1)
+
+    # Exit through run_broker's cleanup on SIGTERM as well as Ctrl+C
+    signal.signal(signal.SIGTERM, lambda sig, frame: sys.exit(0))
+
+    run_broker(PORT)
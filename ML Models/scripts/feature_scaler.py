@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+import json
+import hashlib
+import numpy as np
+from linear_inference import signed_log1p
+
+# Version of the scaler file layout
+SCALER_FORMAT = 1
+
+# Features whose 99th percentile is this many times their median get a log transform
+LOG_SPREAD = 100.0
+
+# Live gains are clipped to this range, so one odd live sample can't blow up a feature
+MAX_LIVE_GAIN = 1e6
+
+class FeatureScaler:
+    """Fitted transform from raw model features to the space the model trains on
+
+    transform() applies live_gain (live inputs only), a signed log1p on
+    heavy-tailed features, and robust standardization by median and IQR,
+    each as one operation over the whole matrix. live_gain maps live window
+    features onto the scale of the training rows: it is the ratio of the
+    training median to the live median of each feature, or 1 without a
+    live sample. Saved next to the model and pinned in its manifest.
+    """
+
+    def __init__(self, feature_schema, log_mask, center, scale, live_gain):
+        self.feature_schema = list(feature_schema)
+        self.log_mask = np.asarray(log_mask, dtype=bool)
+        self.center = np.asarray(center, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.live_gain = np.asarray(live_gain, dtype=np.float64)
+        self.log_columns = np.flatnonzero(self.log_mask)
+
+    @classmethod
+    def fit(cls, X, feature_schema, live=None):
+        """Fit on training rows X and, optionally, a sample of live rows"""
+        X = np.asarray(X, dtype=np.float64)
+        median = np.median(X, axis=0)
+        p99 = np.percentile(np.abs(X), 99, axis=0)
+        log_mask = p99 > LOG_SPREAD * np.maximum(np.abs(median), 1.0)
+
+        live_gain = np.ones(X.shape[1])
+        if live is not None and len(live):
+            live_median = np.median(np.asarray(live, dtype=np.float64), axis=0)
+            usable = (live_median > 0) & (median > 0)
+            live_gain[usable] = np.clip(median[usable] / live_median[usable], 1 / MAX_LIVE_GAIN, MAX_LIVE_GAIN)
+
+        Z = X.copy()
+        Z[:, log_mask] = signed_log1p(Z[:, log_mask])
+        center = np.median(Z, axis=0)
+        q1, q3 = np.percentile(Z, [25, 75], axis=0)
+        scale = q3 - q1
+        # Constant or mostly constant features fall back to their standard deviation, then to 1
+        scale[scale == 0] = Z.std(axis=0)[scale == 0]
+        scale[scale == 0] = 1.0
+        return cls(feature_schema, log_mask, center, scale, live_gain)
+
+    def transform(self, X, live=False):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        Z = X * self.live_gain if live else X.copy()
+        # Skipped when no feature is log-scaled; indexing costs more than the math on one row
+        if self.log_columns.size:
+            Z[:, self.log_columns] = signed_log1p(Z[:, self.log_columns])
+        Z -= self.center
+        Z /= self.scale
+        return Z
+
+    @property
+    def version(self):
+        """Content hash; a model and its scaler must agree on it"""
+        digest = hashlib.sha256(json.dumps(self.feature_schema).encode())
+        for array in (self.log_mask, self.center, self.scale, self.live_gain):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()[:12]
+
+    def save(self, path):
+        np.savez(
+            path,
+            format=np.array([SCALER_FORMAT]),
+            feature_schema=np.array(self.feature_schema),
+            log_mask=self.log_mask,
+            center=self.center,
+            scale=self.scale,
+            live_gain=self.live_gain
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["format"][0]) > SCALER_FORMAT:
+                raise ValueError(f"Scaler {path} uses format {int(data['format'][0])}, newer than this loader")
+            return cls(
+                data["feature_schema"].tolist(), data["log_mask"], data["center"],
+                data["scale"], data["live_gain"]
+            )
+
+    def describe(self):
+        return {
+            name: {
+                "log": bool(log),
+                "center": round(float(center), 4),
+                "scale": round(float(scale), 4),
+                "live_gain": round(float(gain), 4)
+            }
+            for name, log, center, scale, gain in zip(
+                self.feature_schema, self.log_mask, self.center, self.scale, self.live_gain
+            )
+        }
+
+class ScaledModel:
+    """A model whose inputs pass through a FeatureScaler first"""
+
+    def __init__(self, scaler, model, live=True):
+        self.scaler = scaler
+        self.model = model
+        self.live = live
+
+    @property
+    def classes(self):
+        return getattr(self.model, "classes", getattr(self.model, "classes_", None))
+
+    def predict_proba(self, X):
+        return self.model.predict_proba(self.scaler.transform(X, self.live))
+
+    def predict(self, X):
+        return self.model.predict(self.scaler.transform(X, self.live))
@@ -1,40 +1,23 @@
 #!/usr/bin/env python3
-import os
-import sys
 import json
-import subprocess
-import time
-import itertools
-import numpy as np
-from tqdm import tqdm
+from ddos_analyze import DDOS_FEATURES
+from probe_engine import ProbeEngine, BASE_FEATURES, ranked, format_table, summary
 
-# Path to the ML Models directory
-ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-SCRIPTS_DIR = os.path.join(ML_DIR, 'scripts')
-DDOS_SCRIPT = os.path.join(SCRIPTS_DIR, 'ddos_analyze.py')
+# Scores every probe in this process, loading the model once
+engine = None
+
+def get_engine():
+    global engine
+    if engine is None:
+        engine = ProbeEngine()
+    return engine
 
 def run_ml_model(features):
-    """Send features to the ML model and return the response"""
+    """Score features with the ML model and return ddos_analyze.py's response"""
     try:
-        # Convert features to JSON string
-        features_json = json.dumps(features)
-        
-        # Path to Python interpreter (assuming it's in a virtual environment)
-        python_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(ML_DIR))), 'venv/bin/python')
-        if not os.path.exists(python_path):
-            python_path = 'python'  # Fall back to system Python
-        
-        # Call the ML model script with the features
-        cmd = [python_path, DDOS_SCRIPT, features_json]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        
-        # Parse the JSON response
-        response = json.loads(result.stdout.strip())
-        return response
+        return get_engine().probe(features)
     except Exception as e:
         print(f"Error running ML model: {e}")
-        print(f"Stdout: {result.stdout if 'result' in locals() else 'N/A'}")
-        print(f"Stderr: {result.stderr if 'result' in locals() else 'N/A'}")
         return {"error": str(e), "is_attack": False, "confidence": 0}
 
 def print_header(title):
@@ -44,33 +27,12 @@ def print_header(title):
     print("=" * 60)
 
 # Base feature set - we'll modify this to find a combination that triggers an attack
-base_features = {
-    "dt": 11425,
-    "pktcount": 45304,
-    "bytecount": 48294064,
-    "dur": 100,
-    "flows": 3,
-    "packetins": 1943,
-    "pktperflow": 13535,
-    "byteperflow": 14428310,
-    "pktrate": 451,
-    "Protocol": "UDP",
-    "port_no": 3,
-    "tx_bytes": 143928631,
-    "rx_bytes": 3917,
-    "syn_flag": 0,
-    "ack_flag": 0,
-    "psh_flag": 0,
-    "rst_flag": 0,
-    "fin_flag": 0,
-    "window_size": 65535,
-    "urgent_ptr": 0,
-    "header_len": 20
-}
+base_features = dict(BASE_FEATURES)
 
 def find_attack_trigger():
     """Try various parameter combinations to find what triggers an attack detection"""
     print_header("SEARCHING FOR ATTACK TRIGGER COMBINATIONS")
+    engine = get_engine()
     
     # Key features to manipulate based on domain knowledge
     key_features = {
@@ -87,130 +49,66 @@ def find_attack_trigger():
     max_confidence = 0
     best_features = None
     
-    # We'll use a recursive approach to avoid testing all combinations
-    def search_combinations(current_features, remaining_features, depth=0):
+    def record(features, confidence):
         nonlocal max_confidence, best_features
-        
-        # Test current combination
-        response = run_ml_model(current_features)
-        confidence = response.get("confidence", 0)
-        is_attack = response.get("is_attack", False)
-        
-        if is_attack:
-            print(f"\n🚨 FOUND ATTACK TRIGGER! Confidence: {confidence * 100:.1f}%")
-            print(json.dumps(current_features, indent=2))
-            print("\nML Model Response:")
-            print(json.dumps(response, indent=2))
-            if best_features is None or confidence > max_confidence:
-                max_confidence = confidence
-                best_features = current_features.copy()
-            return True
-            
-        # Update max confidence
         if confidence > max_confidence:
             max_confidence = confidence
-            best_features = current_features.copy()
-            print(f"\nNew highest confidence: {confidence * 100:.1f}%")
-            print(f"Features: {json.dumps(current_features, indent=2)}")
-        
-        # Stop recursion if we've reached max depth
-        if depth >= len(remaining_features):
-            return False
-            
-        # Continue recursion with the next feature
-        feature = list(remaining_features.keys())[depth]
-        values = remaining_features[feature]
-        
-        found = False
-        for value in values:
-            current_features[feature] = value
-            found = search_combinations(current_features, remaining_features, depth + 1)
-            if found:
-                return True
-                
-        return False
+            best_features = features
     
-    # Start with an exhaustive search of more promising combinations
-    print("Testing protocol vs port combinations (most likely to affect detection)...")
-    protocols = key_features["Protocol"]
-    ports = key_features["port_no"]
-    syn_flags = key_features["syn_flag"]
+    def row_features(row, names):
+        features = base_features.copy()
+        features.update({name: row[name] for name in names})
+        return features
     
-    for protocol, port, syn in itertools.product(protocols, ports, syn_flags):
-        test_features = base_features.copy()
-        test_features["Protocol"] = protocol
-        test_features["port_no"] = port
-        test_features["syn_flag"] = syn
-        
-        # Modify packet count based on protocol (HTTP attacks typically have lower counts)
-        if protocol == "TCP" and port == 80:
-            # For HTTP, try a more realistic attack pattern
-            test_features["pktcount"] = 10000
-            test_features["pktrate"] = 100
-            test_features["bytecount"] = 20000000  # More bytes per packet for HTTP
-        
-        response = run_ml_model(test_features)
-        confidence = response.get("confidence", 0)
-        is_attack = response.get("is_attack", False)
-        
-        print(f"Protocol: {protocol}, Port: {port}, SYN: {syn} -> ", end="")
-        if is_attack:
-            print(f"ATTACK DETECTED! Confidence: {confidence * 100:.1f}%")
-            max_confidence = confidence
-            best_features = test_features.copy()
-            break
-        else:
-            print(f"Not detected ({confidence * 100:.1f}%)")
-    
-    # Try extreme values approach if the above didn't work
-    if not best_features or not best_features.get("is_attack", False):
-        print("\nTrying extreme values approach...")
-        
-        # Test with extremely large values
-        extreme_features = base_features.copy()
-        # Use values 10-100x higher than the training data
-        extreme_features["pktcount"] = 10000000  # 10 million packets
-        extreme_features["bytecount"] = 10000000000  # 10 billion bytes
-        extreme_features["pktrate"] = 50000  # 50,000 packets per second
-        extreme_features["syn_flag"] = 1  # SYN flood
-        
-        response = run_ml_model(extreme_features)
-        confidence = response.get("confidence", 0)
-        is_attack = response.get("is_attack", False)
-        
-        print(f"Extreme values -> ", end="")
-        if is_attack:
-            print(f"ATTACK DETECTED! Confidence: {confidence * 100:.1f}%")
-            max_confidence = confidence
-            best_features = extreme_features.copy()
-        else:
-            print(f"Not detected ({confidence * 100:.1f}%)")
-    
-    # Try manipulating the model's decision boundary
-    if not best_features or not best_features.get("is_attack", False):
-        print("\nTrying to exploit the model's decision boundary...")
-        
-        # Try negative values (which might confuse the model)
-        negative_features = base_features.copy()
-        negative_features["pktcount"] = -100000
-        negative_features["pktrate"] = -1000
-        
-        response = run_ml_model(negative_features)
-        confidence = response.get("confidence", 0)
-        is_attack = response.get("is_attack", False)
-        
-        print(f"Negative values -> ", end="")
-        if is_attack:
-            print(f"ATTACK DETECTED! Confidence: {confidence * 100:.1f}%")
-            max_confidence = confidence
-            best_features = negative_features.copy()
-        else:
-            print(f"Not detected ({confidence * 100:.1f}%)")
-    
-    # Last resort: try a more systematic recursive search with a deeper approach
-    if not best_features or not best_features.get("is_attack", False):
-        print("\nTrying recursive feature search...")
-        search_combinations(base_features.copy(), key_features)
+    # Start with every protocol, port and SYN combination (most likely to affect detection)
+    print("Testing protocol vs port combinations (most likely to affect detection)...")
+    axes = {name: key_features[name] for name in ("Protocol", "port_no", "syn_flag")}
+    X = engine.grid(base_features, axes)
+    
+    # For HTTP, try a more realistic attack pattern (lower counts, more bytes per packet)
+    column = DDOS_FEATURES.index
+    http = (X[:, column("Protocol")] == 1) & (X[:, column("port_no")] == 80)
+    X[http, column("pktcount")] = 10000
+    X[http, column("pktrate")] = 100
+    X[http, column("bytecount")] = 20000000
+    
+    scores = engine.score(X)
+    table = ranked(X, scores, list(axes) + ["pktcount", "pktrate", "bytecount"], top=len(X))
+    print(format_table(table))
+    record(row_features(table[0], table[0].keys() - {"confidence"}), table[0]["confidence"])
+    
+    # Try extreme values, 10-100x higher than the training data
+    print("\nTrying extreme values approach...")
+    extreme_features = base_features.copy()
+    extreme_features["pktcount"] = 10000000  # 10 million packets
+    extreme_features["bytecount"] = 10000000000  # 10 billion bytes
+    extreme_features["pktrate"] = 50000  # 50,000 packets per second
+    extreme_features["syn_flag"] = 1  # SYN flood
+    
+    response = run_ml_model(extreme_features)
+    confidence = response.get("confidence", 0)
+    print(f"Extreme values -> {'ATTACK DETECTED!' if response.get('is_attack') else 'Not detected'} ({confidence * 100:.1f}%)")
+    record(extreme_features, confidence)
+    
+    # Try negative values (which might confuse the model's decision boundary)
+    print("\nTrying to exploit the model's decision boundary...")
+    negative_features = base_features.copy()
+    negative_features["pktcount"] = -100000
+    negative_features["pktrate"] = -1000
+    
+    response = run_ml_model(negative_features)
+    confidence = response.get("confidence", 0)
+    print(f"Negative values -> {'ATTACK DETECTED!' if response.get('is_attack') else 'Not detected'} ({confidence * 100:.1f}%)")
+    record(negative_features, confidence)
+    
+    # Sweep every combination of the key features in one batch, then search around the best
+    print("\nSweeping all key feature combinations...")
+    X, scores = engine.sweep(base_features, key_features)
+    X, scores = engine.refine(X, scores, key_features)
+    table = ranked(X, scores, list(key_features))
+    print(format_table(table))
+    print(json.dumps(summary(engine, scores)))
+    record(row_features(table[0], key_features), table[0]["confidence"])
     
     # Report findings
     print_header("SEARCH RESULTS")
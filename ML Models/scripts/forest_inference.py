@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+import numpy as np
+
+# Rows traversed together; bounds the (rows x trees) working arrays
+BATCH_ROWS = 4096
+
+def sklearn_normalizes_leaves():
+    """Whether this sklearn divides leaf values by their sum in predict_proba
+
+    Since sklearn 1.4 tree_.value already holds class fractions and
+    predict_proba returns them as they are; before that it held weighted
+    counts and predict_proba normalized them.
+    """
+    import sklearn
+    major, minor = (int(part) for part in sklearn.__version__.split('.')[:2])
+    return (major, minor) < (1, 4)
+
+class CompiledForest:
+    """Tree ensemble flattened into contiguous arrays for fast predict_proba
+
+    Every node of every tree lives in one set of arrays, and all (row, tree)
+    pairs descend one level per vectorized step until they reach a leaf.
+    Results match sklearn's predict_proba bit for bit: inputs are cast to
+    float32 like sklearn does, and per-tree probabilities are summed in
+    tree order before dividing by the tree count.
+    """
+
+    def __init__(self, feature, threshold, children, roots, leaf_proba, classes, n_features, max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.roots = roots
+        self.leaf_proba = leaf_proba
+        self.classes = classes
+        self.n_features = int(n_features)
+        self.max_depth = int(max_depth)
+        self.is_leaf = children[0::2] == np.arange(len(feature))
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        """Flatten a fitted RandomForestClassifier or ExtraTreesClassifier"""
+        if getattr(forest, "n_outputs_", 1) != 1:
+            raise ValueError("Only single-output forests can be compiled")
+        normalize = sklearn_normalizes_leaves()
+
+        features, thresholds, children, roots, probas = [], [], [], [], []
+        offset = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            count = tree.node_count
+            is_leaf = tree.children_left == -1
+            nodes = np.arange(offset, offset + count)
+
+            left = np.where(is_leaf, nodes, tree.children_left + offset)
+            right = np.where(is_leaf, nodes, tree.children_right + offset)
+            # Interleaved so a node's child is children[2 * node + went_right]
+            children.append(np.stack([left, right], axis=1).ravel())
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+
+            proba = tree.value[:, 0, :forest.n_classes_].astype(np.float64)
+            if normalize:
+                normalizer = proba.sum(axis=1)[:, np.newaxis]
+                normalizer[normalizer == 0.0] = 1.0
+                proba /= normalizer
+            probas.append(proba)
+            roots.append(offset)
+            offset += count
+
+        return cls(
+            np.concatenate(features).astype(np.int64),
+            np.concatenate(thresholds).astype(np.float64),
+            np.concatenate(children).astype(np.int64),
+            np.array(roots, dtype=np.int64),
+            np.concatenate(probas),
+            np.asarray(forest.classes_),
+            forest.n_features_in_,
+            max(estimator.tree_.max_depth for estimator in forest.estimators_)
+        )
+
+    def save(self, path):
+        """Write the arrays to an uncompressed .npz file"""
+        np.savez(
+            path,
+            feature=self.feature,
+            threshold=self.threshold,
+            children=self.children,
+            roots=self.roots,
+            leaf_proba=self.leaf_proba,
+            classes=self.classes,
+            shape=np.array([self.n_features, self.max_depth])
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            n_features, max_depth = data["shape"]
+            return cls(
+                data["feature"], data["threshold"], data["children"], data["roots"],
+                data["leaf_proba"], data["classes"], n_features, max_depth
+            )
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def validate(self, X):
+        """Convert X the way sklearn does before predicting"""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"X has {X.shape[-1]} features, but the forest expects {self.n_features}")
+        if not np.isfinite(X).all():
+            raise ValueError("Input contains NaN, infinity or a value too large for dtype('float32').")
+        return X
+
+    def apply(self, X):
+        """Return the leaf reached in every tree, shape (rows, trees)"""
+        rows = len(X)
+        values = X.ravel()
+        nodes = np.tile(self.roots, rows)
+        # Offset of each (row, tree) pair's features in the flattened input
+        base = np.repeat(np.arange(rows, dtype=np.int64) * self.n_features, self.n_trees)
+
+        # Step every pair still inside its tree; pairs drop out at their leaf
+        active = np.arange(len(nodes))
+        while active.size:
+            current = nodes[active]
+            # Compare in float64, as sklearn compares float32 inputs to float64 thresholds
+            went_right = values[base[active] + self.feature[current]] > self.threshold[current]
+            current = self.children[2 * current + went_right]
+            nodes[active] = current
+            active = active[~self.is_leaf[current]]
+        return nodes.reshape(rows, self.n_trees)
+
+    def predict_proba(self, X):
+        X = self.validate(X)
+        result = np.empty((len(X), len(self.classes)), dtype=np.float64)
+        for start in range(0, len(X), BATCH_ROWS):
+            batch = X[start:start + BATCH_ROWS]
+            proba = self.leaf_proba[self.apply(batch)]
+            # accumulate adds tree by tree in order, matching sklearn's loop;
+            # a plain sum would use pairwise summation and differ in the last bit
+            total = np.add.accumulate(proba, axis=1)[:, -1]
+            total /= self.n_trees
+            result[start:start + len(batch)] = total
+        return result
+
+    def predict(self, X):
+        return self.classes.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+from packet_record import FLAG_SYN, FLAG_ACK, FLAG_PSH, FLAG_RST, FLAG_FIN, int_to_ip
+from traffic_window import WINDOW_SECONDS
+
+# Most keys tracked at once; beyond this the least recently seen key is dropped
+MAX_KEYS = 1024
+
+# Keys with no packets for this many seconds are dropped
+IDLE_SECONDS = 60
+
+# Counters kept per key and second
+COLUMNS = ["packets", "bytes", "flows", "syn", "ack", "psh", "rst", "fin", "udp"]
+PACKETS, BYTES, FLOWS, SYN, ACK, PSH, RST, FIN, UDP = range(len(COLUMNS))
+
+def packet_keys(batch):
+    """Key each packet on its destination address (the tenant) and port (the service)"""
+    return (batch['dst_ip'].astype(np.uint64) << np.uint64(16)) | batch['dst_port']
+
+def flow_hashes(batch):
+    """A 64-bit hash of each packet's 5-tuple, stable across batches"""
+    endpoints = (batch['src_ip'].astype(np.uint64) << np.uint64(32)) | batch['dst_ip']
+    ports = (
+        (batch['src_port'].astype(np.uint64) << np.uint64(24))
+        | (batch['dst_port'].astype(np.uint64) << np.uint64(8))
+        | batch['protocol']
+    )
+    return endpoints * np.uint64(0x9E3779B97F4A7C15) ^ ports * np.uint64(0xC2B2AE3D27D4EB4F)
+
+def key_address(key):
+    return int_to_ip(int(key) >> 16)
+
+def key_port(key):
+    return int(key) & 0xFFFF
+
+class KeyedWindows:
+    """Sliding windows of per-second counters, one per target key
+
+    Every key owns a row of a preallocated (MAX_KEYS, window, COLUMNS)
+    array; a batch of packets is added to all its keys with one bincount
+    per column, and features() builds the model rows of every key in one
+    pass, so all keys are scored in a single predict_proba call. A flood
+    on one key only ever fills that key's row. Rows of idle keys, and of
+    the least recently seen key when the table is full, are reused.
+    """
+
+    def __init__(self, window_seconds=WINDOW_SECONDS, max_keys=MAX_KEYS, idle_seconds=IDLE_SECONDS):
+        self.window = int(window_seconds)
+        self.max_keys = max_keys
+        self.idle_seconds = idle_seconds
+        self.counts = np.zeros((max_keys, self.window, len(COLUMNS)))
+        # Source with the most packets to each key in its latest batch, for attribution
+        self.top_source = np.zeros(max_keys, dtype=np.uint32)
+        self.last_seen = np.zeros(max_keys, dtype=np.int64)
+        self.rows = OrderedDict()
+        # Flows counted in the window: sorted flow hashes and the second each was counted in
+        self.flow_hashes = np.zeros(0, dtype=np.uint64)
+        self.flow_seconds = np.zeros(0, dtype=np.int64)
+        self.free = list(range(max_keys - 1, -1, -1))
+        self.second = None
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def advance(self, second):
+        """Clear the buckets of the seconds that have passed since the last call"""
+        if self.second is None:
+            self.second = second
+            return
+        for passed in range(self.second + 1, min(second, self.second + self.window) + 1):
+            self.counts[:, passed % self.window, :] = 0
+        self.second = max(self.second, second)
+
+    def row_for(self, key, second):
+        row = self.rows.get(key)
+        if row is not None:
+            self.rows.move_to_end(key)
+        else:
+            if not self.free:
+                _, evicted = self.rows.popitem(last=False)
+                self.clear_row(evicted)
+                self.evictions += 1
+            row = self.rows[key] = self.free.pop()
+        self.last_seen[row] = second
+        return row
+
+    def clear_row(self, row):
+        self.counts[row] = 0
+        self.top_source[row] = 0
+        self.free.append(row)
+
+    def add_batch(self, batch, keys=None, now_ns=None):
+        """Add a packet batch (traffic_window.PACKET_DTYPE), keyed by packet_keys() unless keys are given"""
+        if len(batch) == 0:
+            return
+        now = (now_ns if now_ns is not None else time.time_ns()) // 1_000_000_000
+        keys = packet_keys(batch) if keys is None else keys
+        with self.lock:
+            self.advance(now)
+            # Packets older than the window are dropped, and clock skew can't reach the future
+            seconds = np.minimum(batch['ts_ns'] // 1_000_000_000, now)
+            current = seconds > now - self.window
+            if not current.all():
+                batch, keys, seconds = batch[current], keys[current], seconds[current]
+                if len(batch) == 0:
+                    return
+
+            unique, inverse = np.unique(keys, return_inverse=True)
+            rows = np.array([self.row_for(int(key), now) for key in unique], dtype=np.int64)
+            packet_rows = rows[inverse]
+
+            flags = batch['flags']
+            values = np.zeros((len(batch), len(COLUMNS)))
+            values[:, PACKETS] = 1
+            values[:, BYTES] = batch['size']
+            values[self.new_flows(batch, seconds, now), FLOWS] = 1
+            values[:, SYN] = ((flags & FLAG_SYN) != 0) & ((flags & FLAG_ACK) == 0)
+            values[:, ACK] = (flags & FLAG_ACK) != 0
+            values[:, PSH] = (flags & FLAG_PSH) != 0
+            values[:, RST] = (flags & FLAG_RST) != 0
+            values[:, FIN] = (flags & FLAG_FIN) != 0
+            values[:, UDP] = batch['protocol'] == 17
+
+            cells, cell_index = np.unique(packet_rows * self.window + seconds % self.window, return_inverse=True)
+            flat = self.counts.reshape(-1, len(COLUMNS))
+            for column in range(len(COLUMNS)):
+                flat[cells, column] += np.bincount(cell_index, weights=values[:, column], minlength=cells.size)
+
+            # Top source per key: count (row, source) pairs, then keep each row's largest
+            pairs, pair_counts = np.unique(
+                (packet_rows.astype(np.uint64) << np.uint64(32)) | batch['src_ip'], return_counts=True
+            )
+            pair_rows = (pairs >> np.uint64(32)).astype(np.int64)
+            order = np.lexsort((pair_counts, pair_rows))
+            last = np.ones(order.size, dtype=bool)
+            last[:-1] = pair_rows[order][1:] != pair_rows[order][:-1]
+            best = order[last]
+            self.top_source[pair_rows[best]] = (pairs[best] & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+    def new_flows(self, batch, seconds, now):
+        """Indexes of the packets that start a flow not yet counted in the window
+
+        A flow counts once, in the bucket of its first packet, and again
+        only after that bucket has left the window, so a connection that
+        spans many ticks adds one to the window's flows, not one a tick.
+        """
+        hashes, first_packet = np.unique(flow_hashes(batch), return_index=True)
+        first_seconds = seconds[first_packet]
+        at = np.minimum(np.searchsorted(self.flow_hashes, hashes), max(0, len(self.flow_hashes) - 1))
+        known = self.flow_hashes[at] == hashes if len(self.flow_hashes) else np.zeros(len(hashes), dtype=bool)
+        recount = known.copy()
+        recount[known] = self.flow_seconds[at[known]] <= first_seconds[known] - self.window
+        self.flow_seconds[at[recount]] = first_seconds[recount]
+
+        # Add the new flows and forget those whose bucket has left the window
+        merged_hashes = np.concatenate([self.flow_hashes, hashes[~known]])
+        merged_seconds = np.concatenate([self.flow_seconds, first_seconds[~known]])
+        current = merged_seconds > now - self.window
+        merged_hashes, merged_seconds = merged_hashes[current], merged_seconds[current]
+        order = np.argsort(merged_hashes, kind='stable')
+        self.flow_hashes, self.flow_seconds = merged_hashes[order], merged_seconds[order]
+        return first_packet[~known | recount]
+
+    def evict_idle(self, now_ns=None):
+        """Drop keys that have been idle for idle_seconds; returns how many"""
+        now = (now_ns if now_ns is not None else time.time_ns()) // 1_000_000_000
+        with self.lock:
+            idle = [key for key, row in self.rows.items() if now - self.last_seen[row] > self.idle_seconds]
+            for key in idle:
+                self.clear_row(self.rows.pop(key))
+            return len(idle)
+
+    def features(self, now_ns=None):
+        """(keys, model rows in DDOS_FEATURES order, per-key totals) for every key with traffic in the window"""
+        now = (now_ns if now_ns is not None else time.time_ns()) // 1_000_000_000
+        with self.lock:
+            self.advance(now)
+            keys = list(self.rows)
+            rows = np.fromiter(self.rows.values(), dtype=np.int64, count=len(keys))
+            totals = self.counts[rows].sum(axis=1)
+        active = totals[:, PACKETS] > 0
+        keys = [key for key, keep in zip(keys, active) if keep]
+        totals = totals[active]
+
+        packets = totals[:, PACKETS]
+        flows = np.maximum(1, totals[:, FLOWS])
+        X = np.empty((len(keys), 20))
+        # Same encoding as prepare_features: Protocol is 1 for TCP, 0 otherwise
+        X[:, 0] = totals[:, UDP] * 2 <= packets
+        X[:, 1] = packets
+        X[:, 2] = totals[:, BYTES]
+        X[:, 3] = self.window
+        X[:, 4] = totals[:, FLOWS]
+        X[:, 5] = packets
+        X[:, 6] = [key_port(key) for key in keys]
+        X[:, 7] = packets / self.window
+        X[:, 8] = packets / flows
+        X[:, 9] = totals[:, BYTES] / flows
+        X[:, 10] = totals[:, BYTES]
+        X[:, 11] = 0
+        for i, column in enumerate((SYN, ACK, PSH, RST, FIN)):
+            X[:, 12 + i] = totals[:, column] / packets
+        X[:, 17] = 65535
+        X[:, 18] = 0
+        X[:, 19] = 20
+        return keys, X, totals
+
+    def classify(self, key, totals):
+        """Attack type and main source for a flagged key, as classify_window does for the whole window"""
+        with self.lock:
+            row = self.rows.get(key)
+            source = int_to_ip(self.top_source[row]) if row is not None else "unknown"
+        packets = max(1, totals[PACKETS])
+        if totals[SYN] / packets > 0.5:
+            attack_type = 'syn_flood'
+        elif totals[UDP] / packets > 0.5:
+            attack_type = 'udp_flood'
+        elif key_port(key) in (80, 443):
+            attack_type = 'http_flood'
+        else:
+            # Slowloris is told apart by the connection tracker, not by volume
+            attack_type = 'unknown'
+        return attack_type, source
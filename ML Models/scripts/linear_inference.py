@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+import numpy as np
+
+def signed_log1p(X):
+    """log1p that keeps the sign, so negative or probe inputs stay finite"""
+    return np.sign(X) * np.log1p(np.abs(X))
+
+class CompiledLinear:
+    """Binary logistic model, optionally after signed_log1p and standard scaling
+
+    Serves sklearn pipelines of [FunctionTransformer(signed_log1p)],
+    [StandardScaler] and LogisticRegression as a few numpy operations,
+    without sklearn's per-call input validation.
+    """
+
+    def __init__(self, coef, intercept, mean, scale, log, classes):
+        self.coef = coef
+        self.intercept = float(intercept)
+        self.mean = mean
+        self.scale = scale
+        self.log = bool(log)
+        self.classes = classes
+        self.n_features = len(coef)
+
+    @staticmethod
+    def steps(model):
+        return [step for _, step in model.steps] if hasattr(model, "steps") else [model]
+
+    @classmethod
+    def supports(cls, model):
+        """Whether model is a pipeline from_sklearn can compile"""
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.preprocessing import FunctionTransformer, StandardScaler
+        *transforms, final = cls.steps(model)
+        if not isinstance(final, LogisticRegression):
+            return False
+        for step in transforms:
+            if isinstance(step, FunctionTransformer):
+                if step.func is not signed_log1p or step.kw_args:
+                    return False
+            elif not isinstance(step, StandardScaler):
+                return False
+        return True
+
+    @classmethod
+    def from_sklearn(cls, model):
+        from sklearn.preprocessing import FunctionTransformer
+        if not cls.supports(model):
+            raise ValueError(f"Can't compile {type(model).__name__}")
+        *transforms, final = cls.steps(model)
+        if len(final.classes_) != 2:
+            raise ValueError("Only binary logistic models can be compiled")
+
+        n_features = final.coef_.shape[1]
+        log = False
+        mean, scale = np.zeros(n_features), np.ones(n_features)
+        for step in transforms:
+            if isinstance(step, FunctionTransformer):
+                log = True
+            else:
+                mean = step.mean_ if step.with_mean else mean
+                scale = step.scale_ if step.with_std else scale
+        return cls(
+            final.coef_[0].astype(np.float64), final.intercept_[0],
+            np.asarray(mean, dtype=np.float64), np.asarray(scale, dtype=np.float64),
+            log, np.asarray(final.classes_)
+        )
+
+    def save(self, path):
+        """Write the arrays to an uncompressed .npz file"""
+        np.savez(
+            path,
+            coef=self.coef,
+            intercept=np.array([self.intercept]),
+            mean=self.mean,
+            scale=self.scale,
+            log=np.array([self.log]),
+            classes=self.classes
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data["coef"], data["intercept"][0], data["mean"], data["scale"],
+                data["log"][0], data["classes"]
+            )
+
+    def validate(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"X has {X.shape[-1]} features, but the model expects {self.n_features}")
+        if not np.isfinite(X).all():
+            raise ValueError("Input contains NaN or infinity.")
+        return X
+
+    def predict_proba(self, X):
+        X = self.validate(X)
+        if self.log:
+            X = signed_log1p(X)
+        X = (X - self.mean) / self.scale
+        # Same expit as sklearn, without importing scipy on the hot path
+        p = 1.0 / (1.0 + np.exp(-(X @ self.coef + self.intercept)))
+        return np.stack([1 - p, p], axis=1)
+
+    def predict(self, X):
+        return self.classes.take((self.predict_proba(X)[:, 1] > 0.5).astype(np.intp), axis=0)
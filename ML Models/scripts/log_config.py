@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import datetime
+import threading
+import logging.handlers
+
+# Lowest level written; DEBUG turns on the per-packet and per-call hot-path output
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+
+# "json" for one JSON object per line, "text" for plain lines
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+
+# Records a second allowed through per message, with bursts up to LOG_BURST
+LOG_RATE = float(os.environ.get('LOG_RATE', '10'))
+LOG_BURST = int(os.environ.get('LOG_BURST', '50'))
+
+# Records waiting for the writer thread; beyond this, new records are dropped
+LOG_QUEUE_SIZE = 10000
+
+# Attributes every LogRecord has; anything else was passed in extra=
+STANDARD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with any extra= fields alongside the message"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in STANDARD_ATTRIBUTES and key not in ("sample", "rate_key"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class SampleFilter(logging.Filter):
+    """Keep a record passed with extra={"sample": p} with probability p"""
+
+    def filter(self, record):
+        rate = getattr(record, "sample", None)
+        return rate is None or random.random() < rate
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per message, so a flood of one message can't flood the log
+
+    Messages are keyed on their unformatted text (or extra={"rate_key": ...}),
+    so lazy %-style arguments share one bucket. When a record gets through
+    after others were dropped, it says how many.
+    """
+
+    def __init__(self, rate=LOG_RATE, burst=LOG_BURST):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.ERROR and getattr(record, "rate_key", None) is None:
+            return True
+        key = (record.name, getattr(record, "rate_key", None) or record.msg)
+        now = time.monotonic()
+        with self.lock:
+            tokens, last, suppressed = self.buckets.get(key, (self.burst, now, 0))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self.buckets[key] = (tokens, now, suppressed + 1)
+                return False
+            self.buckets[key] = (tokens - 1, now, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records when the writer falls behind instead of blocking"""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # Format now, while the record's arguments are still current, but leave
+        # JSON encoding and the write to the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+_listener = None
+_setup_lock = threading.Lock()
+
+def setup_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, stream=None):
+    """Route every logger through a queue to one stderr writer thread; safe to call repeatedly"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+        handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        # Filters run on the calling thread, so dropped records never reach the queue
+        handler.addFilter(SampleFilter())
+        handler.addFilter(RateLimitFilter())
+
+        root = logging.getLogger()
+        root.handlers = [handler]
+        root.setLevel(level)
+        # Library warnings (sklearn version mismatches and the like) become records too
+        logging.captureWarnings(True)
+
+        _listener = logging.handlers.QueueListener(handler.queue, output)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+def shutdown_logging():
+    """Write out queued records; called at exit"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+def get_logger(name):
+    """Logger for a script, with logging set up on first use"""
+    setup_logging()
+    return logging.getLogger(name)
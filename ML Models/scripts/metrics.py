@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+import os
+import time
+import bisect
+import threading
+import http.server
+from log_config import get_logger
+
+log = get_logger("metrics")
+
+# Port the DDoS monitor serves /metrics on (the next free port above it if taken)
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '9108'))
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def format_labels(names, values, extra=""):
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+class Metric:
+    """A named metric and its children, one per combination of label values
+
+    Metrics without labels are their own only child, so hot paths call
+    inc()/observe() on the metric directly. With labels, callers should
+    keep the child returned by labels() rather than look it up per event.
+    """
+
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.lock = threading.Lock()
+        if not self.labelnames:
+            self.children[()] = self
+            self.reset()
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.get(values)
+                if child is None:
+                    child = self.new_child()
+                    self.children[values] = child
+        return child
+
+    def new_child(self):
+        child = self.__class__.__new__(self.__class__)
+        child.lock = threading.Lock()
+        child.reset()
+        return child
+
+    def samples(self):
+        """(suffix, label values, extra label, value) for every exposed sample"""
+        for values, child in list(self.children.items()):
+            for suffix, extra, value in child.child_samples():
+                yield suffix, values, extra, value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {escape(self.help)}", f"# TYPE {self.name} {self.type}"]
+        for suffix, values, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{format_labels(self.labelnames, values, extra)} {format_value(value)}")
+        return "\n".join(lines)
+
+class Sharded(Metric):
+    """A metric that each thread updates in its own cell, summed when read
+
+    A lock per update costs several times the update itself; a cell only
+    its own thread writes needs none. Cells of finished threads are kept,
+    so totals never go down.
+    """
+
+    def reset(self):
+        self.local = threading.local()
+        self.cells = []
+
+    def cell(self):
+        cell = self.local.cell = self.empty_cell()
+        with self.lock:
+            self.cells.append(cell)
+        return cell
+
+    def total(self):
+        cells = list(self.cells)
+        return [sum(values) for values in zip(*cells)] if cells else self.empty_cell()
+
+class Counter(Sharded):
+    type = "counter"
+
+    def empty_cell(self):
+        return [0]
+
+    def inc(self, amount=1):
+        try:
+            self.local.cell[0] += amount
+        except AttributeError:
+            self.cell()[0] += amount
+
+    @property
+    def value(self):
+        return self.total()[0]
+
+    def child_samples(self):
+        yield "", "", self.value
+
+    def snapshot(self):
+        return self.value
+
+    def merge(self, value):
+        self.inc(value)
+
+class Gauge(Metric):
+    """A value that goes up and down, or a function read at scrape time
+
+    set_function() costs nothing on the hot path, so queue depths and
+    cache sizes should be exposed that way instead of set() per event.
+    """
+
+    type = "gauge"
+
+    def reset(self):
+        self.value = 0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        self.function = function
+
+    def child_samples(self):
+        if self.function is not None:
+            try:
+                yield "", "", self.function()
+            except Exception:
+                return
+        else:
+            yield "", "", self.value
+
+class Histogram(Sharded):
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def new_child(self):
+        child = self.__class__.__new__(self.__class__)
+        child.lock = threading.Lock()
+        child.buckets = self.buckets
+        child.reset()
+        return child
+
+    def empty_cell(self):
+        # One count per bucket plus +Inf, kept non-cumulative so observe() touches
+        # one slot, then the sum of observed values
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        try:
+            cell = self.local.cell
+        except AttributeError:
+            cell = self.cell()
+        cell[index] += 1
+        cell[-1] += value
+
+    def time(self):
+        """Context manager that observes the seconds spent in its block"""
+        return Timer(self)
+
+    def child_samples(self):
+        *counts, total = self.total()
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            yield "_bucket", f'le="{format_value(float(bound))}"', cumulative
+        yield "_sum", "", total
+        yield "_count", "", cumulative
+
+    def snapshot(self):
+        *counts, total = self.total()
+        return {"counts": counts, "sum": total}
+
+    def merge(self, value):
+        if len(value["counts"]) != len(self.buckets) + 1:
+            return
+        try:
+            cell = self.local.cell
+        except AttributeError:
+            cell = self.cell()
+        for i, count in enumerate(value["counts"]):
+            cell[i] += count
+        cell[-1] += value["sum"]
+
+class Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+class Registry:
+    """All metrics of a process, rendered together for /metrics"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, cls, name, help, labelnames=(), **kwargs):
+        """Get the metric called name, creating it on first use"""
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = cls(name, help, labelnames, **kwargs)
+                self.metrics[name] = metric
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered as a different {metric.type}")
+            return metric
+
+    def render(self):
+        return "\n".join(metric.render() for metric in list(self.metrics.values())) + "\n"
+
+    def snapshot(self):
+        """Counter and histogram values, for a short-lived process to hand to the broker
+
+        Gauges describe this process only, so they are left out.
+        """
+        snapshot = []
+        for metric in list(self.metrics.values()):
+            if isinstance(metric, Gauge):
+                continue
+            values = [[list(labels), child.snapshot()] for labels, child in list(metric.children.items())]
+            entry = {"name": metric.name, "type": metric.type, "help": metric.help,
+                     "labels": list(metric.labelnames), "values": values}
+            if isinstance(metric, Histogram):
+                entry["buckets"] = list(metric.buckets)
+            snapshot.append(entry)
+        return snapshot
+
+    def merge(self, snapshot):
+        """Add another process's snapshot to the metrics of this one"""
+        for entry in snapshot:
+            if entry["type"] == "histogram":
+                metric = self.register(Histogram, entry["name"], entry["help"], entry["labels"], buckets=entry["buckets"])
+            else:
+                metric = self.register(Counter, entry["name"], entry["help"], entry["labels"])
+            for labels, value in entry["values"]:
+                child = metric.labels(*labels) if labels else metric
+                child.merge(value)
+
+# Metrics of this process
+REGISTRY = Registry()
+
+def counter(name, help, labelnames=()):
+    return REGISTRY.register(Counter, name, help, labelnames)
+
+def gauge(name, help, labelnames=()):
+    return REGISTRY.register(Gauge, name, help, labelnames)
+
+def histogram(name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+    return REGISTRY.register(Histogram, name, help, labelnames, buckets=buckets)
+
+# Metrics shared by the analyzers, the monitor and the savers
+DETECTIONS = counter("detections_total", "Detections recorded", ["kind", "attack_type"])
+ANALYSES = counter("analyses_total", "Payloads and traffic samples analyzed", ["kind", "method", "verdict"])
+INFERENCE_SECONDS = histogram("model_inference_seconds", "Seconds per predict_proba call", ["model"])
+SAVE_SECONDS = histogram("detection_save_seconds", "Seconds to save a detection to its results file", ["kind"])
+
+def push_metrics():
+    """Send this process's counters and histograms to the event broker
+
+    For the analyzers and savers, which run once per request: the broker
+    adds them to its own /metrics. Like publish_event, this never blocks
+    and is dropped when no broker is running.
+    """
+    from event_stream import publish_event
+    snapshot = REGISTRY.snapshot()
+    if snapshot:
+        return publish_event("metrics", snapshot)
+    return False
+
+def send_metrics(handler):
+    """Answer a GET /metrics on any BaseHTTPRequestHandler"""
+    body = REGISTRY.render().encode()
+    handler.send_response(200)
+    handler.send_header('Content-Type', CONTENT_TYPE)
+    handler.send_header('Content-Length', str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path.split('?')[0] == "/metrics":
+            send_metrics(self)
+            return
+        self.send_response(404)
+        self.send_header('Content-Length', '9')
+        self.end_headers()
+        self.wfile.write(b'Not Found')
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would otherwise flood stderr
+        pass
+
+def serve_metrics(port=METRICS_PORT, host="127.0.0.1"):
+    """Serve /metrics from a background thread; returns the server, or None if no port is free"""
+    from packet_logger import find_available_port
+    port = find_available_port(port, 20)
+    if port is None:
+        log.error("No free port for metrics near %s", METRICS_PORT)
+        return None
+    server = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    log.info("Metrics at http://%s:%s/metrics", host, port)
+    return server
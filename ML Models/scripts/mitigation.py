@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import threading
+import socketserver
+from event_stream import iter_events
+from packet_record import ip_to_int, int_to_ip
+from log_config import get_logger
+
+log = get_logger("mitigation")
+
+# Path to the ML Models directory
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Unix stream socket the backend queries before serving a request
+MITIGATION_SOCKET = os.path.join(ML_DIR, 'scripts', '.mitigation.sock')
+
+# Seconds a detection keeps its source blocked or rate limited
+BLOCK_TTL = int(os.environ.get('MITIGATION_BLOCK_TTL', '300'))
+LIMIT_TTL = int(os.environ.get('MITIGATION_LIMIT_TTL', '600'))
+
+# Requests per second (and burst) allowed to a rate-limited source
+LIMIT_RATE = 5.0
+LIMIT_BURST = 10.0
+
+# Attack types whose sources are rate limited instead of blocked, since
+# legitimate users behind the same address may still need the service
+LIMITED_ATTACK_TYPES = {"http_flood", "slowloris", "unknown"}
+
+# Networks detections never block, so a detection forwarded from the local
+# host can't lock the backend out of itself
+EXEMPT_NETWORKS = ["127.0.0.0/8", "0.0.0.0/32"]
+
+# Largest number of entries in the table
+MAX_ENTRIES = 100000
+
+# Seconds between sweeps for expired entries
+EXPIRE_INTERVAL = 10
+
+# Verdicts returned by check()
+ALLOW = "allow"
+LIMIT = "limit"
+BLOCK = "block"
+
+def parse_network(cidr):
+    """Parse '1.2.3.4' or '1.2.3.0/24' into (network, prefix length)"""
+    address, _, prefix = cidr.partition('/')
+    prefix_len = int(prefix) if prefix else 32
+    network = ip_to_int(address)
+    if not 0 <= prefix_len <= 32 or (network == 0 and address != "0.0.0.0"):
+        raise ValueError(f"Invalid network: {cidr}")
+    return network & prefix_mask(prefix_len), prefix_len
+
+def prefix_mask(prefix_len):
+    return (0xFFFFFFFF << (32 - prefix_len)) & 0xFFFFFFFF
+
+class MitigationEntry:
+    """Block or token bucket for one address or network"""
+
+    __slots__ = ('action', 'expires', 'rate', 'burst', 'tokens', 'updated', 'reason', 'hits')
+
+    def __init__(self, action, expires, reason, rate=0.0, burst=0.0, now=0.0):
+        self.action = action
+        self.expires = expires
+        self.reason = reason
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+        self.hits = 0
+
+class MitigationTable:
+    """Blocklist and rate-limit table keyed by network
+
+    Networks are grouped by prefix length, so a lookup is one dict probe
+    per prefix length in use (at most 33) regardless of the table size.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        # prefix length -> {network: MitigationEntry}
+        self.networks = {}
+        # (prefix length, mask) pairs, longest prefix first
+        self.prefixes = []
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def add(self, cidr, action, ttl, reason="", rate=LIMIT_RATE, burst=LIMIT_BURST):
+        """Block or rate limit a network for ttl seconds, replacing any existing entry"""
+        network, prefix_len = parse_network(cidr)
+        now = time.monotonic()
+        entry = MitigationEntry(action, now + ttl, reason, rate, burst, now)
+        with self.lock:
+            networks = self.networks.get(prefix_len)
+            if networks is None:
+                networks = self.networks[prefix_len] = {}
+                self.update_prefixes()
+            if network not in networks:
+                if self.size >= self.max_entries:
+                    self.expire_locked(now)
+                if self.size >= self.max_entries:
+                    self.evict_locked()
+                self.size += 1
+            else:
+                # Keep the hit count and don't shorten an existing block
+                old = networks[network]
+                entry.hits = old.hits
+                if old.action == BLOCK and action == LIMIT and old.expires > now:
+                    return old
+                if old.action == LIMIT and action == LIMIT:
+                    # A repeat detection must not refill the bucket
+                    entry.tokens = min(old.tokens, burst)
+                    entry.updated = old.updated
+            networks[network] = entry
+        return entry
+
+    def block(self, cidr, ttl=BLOCK_TTL, reason=""):
+        return self.add(cidr, BLOCK, ttl, reason)
+
+    def limit(self, cidr, rate=LIMIT_RATE, burst=LIMIT_BURST, ttl=LIMIT_TTL, reason=""):
+        # A bucket needs a positive refill rate and room for at least one request
+        if not rate > 0:
+            raise ValueError(f"Invalid rate: {rate}")
+        if not burst >= 1:
+            raise ValueError(f"Invalid burst: {burst}")
+        return self.add(cidr, LIMIT, ttl, reason, rate, burst)
+
+    def remove(self, cidr):
+        network, prefix_len = parse_network(cidr)
+        with self.lock:
+            networks = self.networks.get(prefix_len, {})
+            if networks.pop(network, None) is None:
+                return False
+            self.size -= 1
+            return True
+
+    def update_prefixes(self):
+        self.prefixes = sorted(
+            ((prefix_len, prefix_mask(prefix_len)) for prefix_len in self.networks),
+            reverse=True
+        )
+
+    def check(self, ip, now=None):
+        """Return (verdict, seconds until retry) for a request from ip"""
+        address = ip_to_int(ip) if isinstance(ip, str) else ip
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            for prefix_len, mask in self.prefixes:
+                entry = self.networks[prefix_len].get(address & mask)
+                if entry is None:
+                    continue
+                if entry.expires <= now:
+                    del self.networks[prefix_len][address & mask]
+                    self.size -= 1
+                    continue
+                entry.hits += 1
+                if entry.action == BLOCK:
+                    return BLOCK, entry.expires - now
+
+                # Refill the bucket for the time since the last request
+                entry.tokens = min(entry.burst, entry.tokens + (now - entry.updated) * entry.rate)
+                entry.updated = now
+                if entry.tokens >= 1:
+                    entry.tokens -= 1
+                    return ALLOW, 0.0
+                return LIMIT, (1 - entry.tokens) / entry.rate
+        return ALLOW, 0.0
+
+    def expire(self, now=None):
+        with self.lock:
+            return self.expire_locked(time.monotonic() if now is None else now)
+
+    def expire_locked(self, now):
+        removed = 0
+        for networks in self.networks.values():
+            expired = [network for network, entry in networks.items() if entry.expires <= now]
+            for network in expired:
+                del networks[network]
+            removed += len(expired)
+        self.size -= removed
+        return removed
+
+    def evict_locked(self):
+        """Drop the entry closest to expiry to make room"""
+        candidates = (
+            (entry.expires, networks, network)
+            for networks in self.networks.values()
+            for network, entry in networks.items()
+        )
+        _, networks, network = min(candidates, key=lambda c: c[0])
+        del networks[network]
+        self.size -= 1
+
+    def entries(self):
+        """List the active entries with their remaining time"""
+        now = time.monotonic()
+        with self.lock:
+            return [
+                {
+                    "network": f"{int_to_ip(network)}/{prefix_len}",
+                    "action": entry.action,
+                    "ttl": round(entry.expires - now, 1),
+                    "reason": entry.reason,
+                    "hits": entry.hits
+                }
+                for prefix_len, networks in self.networks.items()
+                for network, entry in networks.items()
+                if entry.expires > now
+            ]
+
+# Global table served by this process
+table = MitigationTable()
+
+def is_exempt(ip):
+    address = ip_to_int(ip)
+    return any(address & prefix_mask(prefix_len) == network for network, prefix_len in map(parse_network, EXEMPT_NETWORKS))
+
+def apply_detection(detection, table=table):
+    """Turn a detection event into a block or rate limit on its source
+
+    Only detections marked observed are acted on; the others carry source
+    addresses that the simulation and fallback paths made up.
+    """
+    if not detection.get("observed"):
+        return None
+    source_ip = detection.get("source_ip")
+    if not source_ip or not ip_to_int(source_ip) or is_exempt(source_ip):
+        return None
+    attack_type = detection.get("attack_type", "unknown")
+    reason = f"{detection.get('kind', 'ddos')}:{attack_type}"
+
+    if detection.get("kind") == "ddos" and attack_type in LIMITED_ATTACK_TYPES:
+        entry = table.limit(source_ip, reason=reason)
+    else:
+        entry = table.block(source_ip, reason=reason)
+    log.info("Mitigation: %s %s (%s)", entry.action, source_ip, reason)
+    return entry
+
+def follow_detections(table=table):
+    """Apply detections from the event stream, reconnecting when the broker restarts"""
+    while True:
+        try:
+            for event in iter_events(["detection"]):
+                apply_detection(event.get("data", {}), table)
+        except (OSError, ValueError) as e:
+            log.warning("Mitigation: event stream unavailable (%s), retrying", e)
+        time.sleep(5)
+
+def expire_entries(table=table):
+    while True:
+        time.sleep(EXPIRE_INTERVAL)
+        table.expire()
+
+# Line protocol handler; one connection can pipeline any number of commands:
+#   CHECK <ip>                      -> "allow 0" | "limit <retry secs>" | "block <secs left>"
+#   BLOCK <cidr> [ttl]              -> "ok"
+#   LIMIT <cidr> [rate] [burst] [ttl] -> "ok"
+#   UNBLOCK <cidr>                  -> "ok" | "missing"
+#   LIST                            -> JSON list of entries
+class MitigationHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        table = self.server.table
+        for line in self.rfile:
+            command, _, args = line.decode(errors='replace').strip().partition(' ')
+            args = args.split()
+            try:
+                if command == "CHECK":
+                    verdict, seconds = table.check(args[0])
+                    reply = f"{verdict} {seconds:.2f}" if seconds else f"{verdict} 0"
+                elif command == "BLOCK":
+                    table.block(args[0], float(args[1]) if len(args) > 1 else BLOCK_TTL, "manual")
+                    reply = "ok"
+                elif command == "LIMIT":
+                    numbers = [float(a) for a in args[1:4]]
+                    defaults = [LIMIT_RATE, LIMIT_BURST, LIMIT_TTL]
+                    rate, burst, ttl = numbers + defaults[len(numbers):]
+                    table.limit(args[0], rate, burst, ttl, "manual")
+                    reply = "ok"
+                elif command == "UNBLOCK":
+                    reply = "ok" if table.remove(args[0]) else "missing"
+                elif command == "LIST":
+                    reply = json.dumps(table.entries())
+                else:
+                    reply = f"error unknown command {command}"
+            except (IndexError, ValueError) as e:
+                reply = f"error {e}"
+            try:
+                self.wfile.write(reply.encode() + b"\n")
+            except OSError:
+                return
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class MitigationServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+        def __init__(self, path=MITIGATION_SOCKET, table=table):
+            if os.path.exists(path):
+                os.remove(path)
+            self.table = table
+            super().__init__(path, MitigationHandler)
+
+class MitigationClient:
+    """Blocking client for the mitigation socket"""
+
+    def __init__(self, path=MITIGATION_SOCKET):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.reader = self.sock.makefile('rb')
+
+    def command(self, line):
+        self.sock.sendall(line.encode() + b"\n")
+        return self.reader.readline().decode().strip()
+
+    def check(self, ip):
+        """Return (verdict, seconds) for a request from ip"""
+        verdict, _, seconds = self.command(f"CHECK {ip}").partition(' ')
+        return verdict, float(seconds or 0)
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+def run_server(path=MITIGATION_SOCKET):
+    """Serve the mitigation table, fed by the detection event stream"""
+    threading.Thread(target=follow_detections, daemon=True).start()
+    threading.Thread(target=expire_entries, daemon=True).start()
+
+    server = MitigationServer(path)
+    log.info("Mitigation table listening on %s", path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        log.info("Shutting down mitigation server")
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.remove(path)
+
+if __name__ == "__main__":
+    # Exit through run_server's cleanup on SIGTERM as well as Ctrl+C
+    signal.signal(signal.SIGTERM, lambda sig, frame: sys.exit(0))
+    run_server()
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import pickle
+import hashlib
+import datetime
+import threading
+from metrics import counter
+from log_config import get_logger
+
+log = get_logger("model_artifacts")
+
+# Path to the ML Models directory
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ARTIFACTS_DIR = os.path.join(ML_DIR, 'artifacts')
+
+# Version of the manifest layout written by save_artifact
+MANIFEST_FORMAT = 1
+
+# Model types and the file each is stored in
+MODEL_FILES = {
+    "sklearn_forest": "{name}.joblib",
+    "sklearn_linear": "{name}.joblib",
+    "sklearn": "{name}.joblib",
+    "keras": "{name}.keras",
+    "pickle": "{name}.pickle"
+}
+
+# Model types with a compiled copy served instead of the sklearn estimator
+COMPILED_FILES = {
+    "sklearn_forest": "{name}.forest.npz",
+    "sklearn_linear": "{name}.linear.npz"
+}
+
+class ArtifactError(Exception):
+    """Raised when an artifact is missing, corrupt or doesn't match its manifest"""
+
+class MissingArtifactError(ArtifactError):
+    """Raised when there is neither a manifest nor a legacy pickle for an artifact"""
+
+class ModelArtifact:
+    """A loaded model together with its manifest
+
+    Forests and linear models saved with a compiled copy are served from the
+    compiled arrays; the full model is only deserialized if something asks for .model.
+    A model trained on scaled features carries its FeatureScaler, and
+    predictor() applies it to every input.
+    """
+
+    def __init__(self, model, manifest, path=None, compiled=None, verify=True, scaler=None):
+        self._model = model
+        self.manifest = manifest
+        self.path = path
+        self.compiled = compiled
+        self.verify = verify
+        self.scaler = scaler
+        self.lock = threading.Lock()
+
+    @property
+    def model(self):
+        with self.lock:
+            if self._model is None:
+                if self.verify:
+                    verify_checksum(self.path, self.manifest["sha256"])
+                self._model = load_model_file(self.path, self.model_type)
+            return self._model
+
+    def predictor(self, live=True):
+        """Return the fastest object with the model's predict_proba
+
+        Inputs are raw features; live=False skips the scaler's live gain,
+        for rows already at the training data's scale.
+        """
+        if self.compiled is None and self.model_type in COMPILED_FILES:
+            compiled = compiled_engine(self.model_type).from_sklearn(self.model)
+            with self.lock:
+                self.compiled = compiled
+        model = self.compiled if self.compiled is not None else self.model
+        if self.scaler is not None:
+            from feature_scaler import ScaledModel
+            return ScaledModel(self.scaler, model, live)
+        return model
+
+    @property
+    def model_type(self):
+        return self.manifest["model_type"]
+
+    @property
+    def version(self):
+        return self.manifest.get("version", 0)
+
+    @property
+    def feature_schema(self):
+        return self.manifest.get("feature_schema")
+
+    def check_schema(self, feature_schema):
+        """Raise ArtifactError unless the artifact was trained on feature_schema"""
+        if self.feature_schema is not None and list(self.feature_schema) != list(feature_schema):
+            raise ArtifactError(
+                f"Feature schema mismatch: model expects {len(self.feature_schema)} features "
+                f"({', '.join(self.feature_schema[:3])}, ...)"
+            )
+
+def manifest_path(name, artifacts_dir=ARTIFACTS_DIR):
+    return os.path.join(artifacts_dir, f"{name}.manifest.json")
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def verify_checksum(path, sha256):
+    # Never unpickle a file that isn't the one the manifest describes
+    if file_sha256(path) != sha256:
+        raise ArtifactError(f"Checksum mismatch for {path}")
+
+def compiled_engine(model_type):
+    """The class that serves a compiled copy of model_type"""
+    if model_type == "sklearn_forest":
+        from forest_inference import CompiledForest
+        return CompiledForest
+    from linear_inference import CompiledLinear
+    return CompiledLinear
+
+def infer_model_type(model):
+    """Work out how a model object should be stored"""
+    module = type(model).__module__
+    if module.startswith(("keras", "tensorflow")):
+        return "keras"
+    if module.startswith("sklearn"):
+        # Fitted tree ensembles expose their trees as estimators_
+        if hasattr(model, "estimators_") and hasattr(getattr(model, "estimators_")[0], "tree_"):
+            return "sklearn_forest"
+        from linear_inference import CompiledLinear
+        if CompiledLinear.supports(model):
+            return "sklearn_linear"
+        return "sklearn"
+    return "pickle"
+
+def write_json_atomic(path, data):
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(temp_path, path)
+
+def read_manifest(name, artifacts_dir=ARTIFACTS_DIR):
+    path = manifest_path(name, artifacts_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_artifact(model, name, feature_schema, version=None, metadata=None, artifacts_dir=ARTIFACTS_DIR,
+                  scaler=None):
+    """Store a model with a manifest describing its type, features and checksum
+
+    A model trained on scaler.transform() output is saved with that scaler;
+    the manifest pins its version so the two are always loaded together.
+    """
+    model_type = infer_model_type(model)
+    filename = MODEL_FILES[model_type].format(name=name)
+    path = os.path.join(artifacts_dir, filename)
+    os.makedirs(artifacts_dir, exist_ok=True)
+
+    compiled = None
+    if model_type == "keras":
+        model.save(path)
+    elif model_type.startswith("sklearn"):
+        import joblib
+        # Uncompressed so the arrays can be memory-mapped on load
+        joblib.dump(model, path)
+        if model_type in COMPILED_FILES:
+            # Flattened copy served without unpickling the estimator
+            compiled = COMPILED_FILES[model_type].format(name=name)
+            compiled_engine(model_type).from_sklearn(model).save(os.path.join(artifacts_dir, compiled))
+    else:
+        with open(path, 'wb') as f:
+            pickle.dump(model, f)
+
+    if version is None:
+        previous = read_manifest(name, artifacts_dir)
+        version = previous["version"] + 1 if previous else 1
+
+    manifest = {
+        "format": MANIFEST_FORMAT,
+        "name": name,
+        "version": version,
+        "model_type": model_type,
+        "file": filename,
+        "sha256": file_sha256(path),
+        "feature_schema": list(feature_schema) if feature_schema is not None else None,
+        "created": datetime.datetime.now().isoformat()
+    }
+    if compiled:
+        manifest["compiled"] = {
+            "file": compiled,
+            "sha256": file_sha256(os.path.join(artifacts_dir, compiled))
+        }
+    if scaler is not None:
+        if feature_schema is not None and scaler.feature_schema != list(feature_schema):
+            raise ArtifactError("Scaler was fitted on a different feature schema than the model")
+        scaler_file = f"{name}.scaler.npz"
+        scaler.save(os.path.join(artifacts_dir, scaler_file))
+        manifest["scaler"] = {
+            "file": scaler_file,
+            "sha256": file_sha256(os.path.join(artifacts_dir, scaler_file)),
+            "version": scaler.version
+        }
+    if model_type.startswith("sklearn"):
+        import sklearn
+        manifest["sklearn_version"] = sklearn.__version__
+        if hasattr(model, "classes_"):
+            manifest["classes"] = [c.item() if hasattr(c, "item") else c for c in model.classes_]
+    if metadata:
+        manifest.update(metadata)
+
+    # The manifest goes last, so readers never see it before its model file
+    write_json_atomic(manifest_path(name, artifacts_dir), manifest)
+    return manifest
+
+def load_model_file(path, model_type):
+    if model_type == "keras":
+        from tensorflow import keras
+        return keras.models.load_model(path)
+    if model_type.startswith("sklearn"):
+        import joblib
+        # Tree ensembles keep their node arrays memory-mapped from the file
+        return joblib.load(path, mmap_mode='r' if model_type == "sklearn_forest" else None)
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+def load_legacy(name, artifacts_dir):
+    """Load a bare <name>.pickle written before manifests existed"""
+    path = os.path.join(artifacts_dir, f"{name}.pickle")
+    if not os.path.exists(path):
+        raise MissingArtifactError(f"No artifact named {name} in {artifacts_dir}")
+    log.warning("Loading legacy artifact %s; run 'python model_artifacts.py migrate %s' to add a manifest", path, name)
+    with open(path, 'rb') as f:
+        model = pickle.load(f)
+    return ModelArtifact(model, {
+        "name": name,
+        "version": 0,
+        "model_type": infer_model_type(model),
+        "file": os.path.basename(path),
+        "feature_schema": None
+    }, path)
+
+def load_scaler(manifest, verify, artifacts_dir):
+    """Load the scaler pinned by a manifest, or None if the model takes raw features"""
+    pinned = manifest.get("scaler")
+    if not pinned:
+        return None
+    from feature_scaler import FeatureScaler
+    path = os.path.join(artifacts_dir, pinned["file"])
+    if not os.path.exists(path):
+        raise ArtifactError(f"Scaler {path} listed in the manifest is missing")
+    if verify:
+        verify_checksum(path, pinned["sha256"])
+    scaler = FeatureScaler.load(path)
+    if scaler.version != pinned["version"]:
+        raise ArtifactError(f"Scaler {path} is version {scaler.version}, the manifest pins {pinned['version']}")
+    if manifest.get("feature_schema") is not None and scaler.feature_schema != manifest["feature_schema"]:
+        raise ArtifactError(f"Scaler {path} doesn't match the model's feature schema")
+    return scaler
+
+def load_artifact_uncached(name, verify=True, artifacts_dir=ARTIFACTS_DIR):
+    manifest = read_manifest(name, artifacts_dir)
+    if manifest is None:
+        return load_legacy(name, artifacts_dir)
+    if manifest.get("format", 0) > MANIFEST_FORMAT:
+        raise ArtifactError(f"Artifact {name} uses manifest format {manifest['format']}, newer than this loader")
+
+    path = os.path.join(artifacts_dir, manifest["file"])
+    if not os.path.exists(path):
+        raise ArtifactError(f"Model file {path} listed in the manifest is missing")
+
+    scaler = load_scaler(manifest, verify, artifacts_dir)
+    compiled = manifest.get("compiled")
+    if compiled:
+        # Plain arrays, no unpickling; the full model loads lazily if needed
+        compiled_path = os.path.join(artifacts_dir, compiled["file"])
+        if verify:
+            verify_checksum(compiled_path, compiled["sha256"])
+        engine = compiled_engine(manifest["model_type"])
+        artifact = ModelArtifact(None, manifest, path, engine.load(compiled_path), verify, scaler)
+    else:
+        if verify:
+            verify_checksum(path, manifest["sha256"])
+        artifact = ModelArtifact(load_model_file(path, manifest["model_type"]), manifest, path, scaler=scaler)
+    log.info("Loaded %s v%s (%s)", name, manifest['version'], manifest['model_type'])
+    return artifact
+
+# Artifacts already loaded by this process: name -> (manifest mtime, artifact)
+_cache = {}
+_cache_lock = threading.Lock()
+
+# Lookups in that cache, by artifact and hit or miss
+cache_lookups = counter("artifact_cache_lookups_total", "Artifact cache lookups", ["name", "result"])
+
+def load_artifact(name, verify=True, artifacts_dir=ARTIFACTS_DIR):
+    """Load an artifact once per process, reloading if its manifest (or legacy pickle) changes"""
+    try:
+        mtime = os.path.getmtime(manifest_path(name, artifacts_dir))
+    except OSError:
+        # Without a manifest, a legacy pickle is loaded; track its time instead
+        try:
+            mtime = ("legacy", os.path.getmtime(os.path.join(artifacts_dir, f"{name}.pickle")))
+        except OSError:
+            mtime = None
+
+    key = (artifacts_dir, name)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == mtime:
+            cache_lookups.labels(name, "hit").inc()
+            return cached[1]
+        cache_lookups.labels(name, "miss").inc()
+        artifact = load_artifact_uncached(name, verify, artifacts_dir)
+        _cache[key] = (mtime, artifact)
+        return artifact
+
+def migrate(name, feature_schema=None, artifacts_dir=ARTIFACTS_DIR):
+    """Convert a legacy pickle into a manifest-described artifact"""
+    artifact = load_legacy(name, artifacts_dir)
+    return save_artifact(artifact.model, name, feature_schema, artifacts_dir=artifacts_dir)
+
+if __name__ == "__main__":
+    # Usage: python model_artifacts.py migrate <name> | show <name>
+    if len(sys.argv) < 3 or sys.argv[1] not in ("migrate", "show"):
+        sys.stderr.write("Usage: python model_artifacts.py migrate|show <name>\n")
+        sys.exit(1)
+
+    command, name = sys.argv[1], sys.argv[2]
+    if command == "migrate":
+        # Known schemas for the bundled models
+        schema = None
+        if name == "ddos_model":
+            from ddos_analyze import DDOS_FEATURES
+            schema = DDOS_FEATURES
+        elif name == "xss_model":
+            from xss_dataset import XSS_FEATURES
+            schema = XSS_FEATURES
+        manifest = migrate(name, schema)
+    else:
+        manifest = load_artifact(name).manifest
+    print(json.dumps(manifest, indent=2))
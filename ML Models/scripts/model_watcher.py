@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+import os
+import json
+import threading
+import numpy as np
+from event_stream import publish_event
+from model_artifacts import ARTIFACTS_DIR, load_artifact, manifest_path, ArtifactError
+from log_config import get_logger
+
+log = get_logger("model_watcher")
+
+# Seconds between checks of the artifacts directory
+POLL_INTERVAL = float(os.environ.get('MODEL_POLL_INTERVAL', '5'))
+
+class CanaryError(Exception):
+    """Raised when a new model fails validation and is not swapped in"""
+
+def artifact_signature(name, artifacts_dir=ARTIFACTS_DIR):
+    """Modification times of the files that define an artifact"""
+    signature = []
+    for path in (manifest_path(name, artifacts_dir), os.path.join(artifacts_dir, f"{name}.pickle")):
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+def load_canary(name, artifacts_dir=ARTIFACTS_DIR):
+    """Load the optional labeled canary set <name>.canary.json"""
+    path = os.path.join(artifacts_dir, f"{name}.canary.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def predict_scores(artifact, X, live=True):
+    """Attack probability for each row of raw features, whatever the model type"""
+    if artifact.model_type == "keras":
+        if artifact.scaler is not None:
+            X = artifact.scaler.transform(X, live)
+        # The sequence model takes (samples, timesteps, features)
+        return np.asarray(artifact.model.predict(X.reshape(X.shape[0], 1, X.shape[1]), verbose=0)).reshape(-1)
+    return artifact.predictor(live).predict_proba(X)[:, 1]
+
+def validate(artifact, feature_schema, canary_rows, labeled=None):
+    """Check a freshly loaded artifact before it serves any request
+
+    Running the canary rows also warms the model (compiling forests), so
+    the first real request after the swap doesn't pay for it.
+    """
+    if feature_schema is not None:
+        artifact.check_schema(feature_schema)
+
+    X = np.asarray(canary_rows, dtype=np.float64)
+    scores = predict_scores(artifact, X)
+    if scores.shape != (len(X),) or not np.isfinite(scores).all():
+        raise CanaryError(f"Canary produced invalid output of shape {scores.shape}")
+    if scores.min() < 0 or scores.max() > 1:
+        raise CanaryError("Canary probabilities outside [0, 1]")
+
+    if labeled:
+        X = np.asarray(labeled["X"], dtype=np.float64)
+        y = np.asarray(labeled["y"])
+        accuracy = float(((predict_scores(artifact, X) > 0.5) == y).mean())
+        if accuracy < labeled.get("min_accuracy", 0.9):
+            raise CanaryError(f"Canary accuracy {accuracy:.2f} below {labeled.get('min_accuracy', 0.9)}")
+
+class ModelHandle:
+    """The current version of a model, swapped atomically when the artifact changes
+
+    Callers take artifact = handle.get() once per request and use that
+    object throughout, so a reload mid-request never mixes two models.
+    New versions are loaded and validated on a background thread; until
+    the swap, every request keeps getting the old version.
+    """
+
+    def __init__(self, name, feature_schema=None, canary_rows=None, artifacts_dir=ARTIFACTS_DIR):
+        self.name = name
+        self.feature_schema = feature_schema
+        self.canary_rows = canary_rows
+        self.artifacts_dir = artifacts_dir
+        self.artifact = None
+        self.signature = None
+        self.thread = None
+        self.stopped = threading.Event()
+        self.reload()
+
+    def get(self):
+        return self.artifact
+
+    def reload(self):
+        """Load, validate and swap in the artifact if it changed; return True on swap"""
+        signature = artifact_signature(self.name, self.artifacts_dir)
+        if signature == self.signature:
+            return False
+        # Remember the signature even on failure so a bad artifact isn't retried every poll
+        self.signature = signature
+
+        try:
+            artifact = load_artifact(self.name, artifacts_dir=self.artifacts_dir)
+            if artifact is self.artifact:
+                return False
+            if self.canary_rows is not None:
+                validate(artifact, self.feature_schema, self.canary_rows, load_canary(self.name, self.artifacts_dir))
+            else:
+                artifact.predictor()
+        except (ArtifactError, CanaryError) as e:
+            log.warning("Keeping current %s: %s", self.name, e)
+            return False
+        except Exception as e:
+            log.error("Keeping current %s, new version failed to load: %s", self.name, e)
+            return False
+
+        previous = self.artifact
+        self.artifact = artifact
+        log.info("Serving %s v%s", self.name, artifact.version)
+        if previous is not None:
+            publish_event("model_reload", {
+                "name": self.name,
+                "previous_version": previous.version,
+                "version": artifact.version,
+                "model_type": artifact.model_type
+            })
+        return True
+
+    def watch(self, interval=POLL_INTERVAL):
+        while not self.stopped.wait(interval):
+            self.reload()
+
+    def start(self, interval=POLL_INTERVAL):
+        """Watch the artifacts directory on a daemon thread"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.watch, args=(interval,), daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
@@ -4,6 +4,9 @@ import json
 import signal
 from scapy.all import *
 from collections import defaultdict
+from log_config import get_logger
+
+log = get_logger("packet_capture")
 
 # Global stats
 stats = {
@@ -45,20 +48,18 @@ def packet_callback(packet):
             stats['packet_count'] += 1
             stats['byte_count'] += len(packet)
             
-            # Print current stats
-            sys.stderr.write(f"Current stats: {json.dumps(stats)}\n")
-            sys.stderr.flush()
+            # Per-packet stats are debug output, off unless LOG_LEVEL=DEBUG
+            log.debug("Current stats: %s", stats)
             
             # Print stats as JSON to stdout
             print(json.dumps(stats))
             sys.stdout.flush()
     except Exception as e:
-        sys.stderr.write(f"Error processing packet: {e}\n")
-        sys.stderr.flush()
+        log.error("Error processing packet: %s", e)
 
 def signal_handler(sig, frame):
     """Handle Ctrl+C gracefully"""
-    sys.stderr.write("\nStopping packet capture...\n")
+    log.info("Stopping packet capture...")
     sys.exit(0)
 
 if __name__ == "__main__":
@@ -67,8 +68,8 @@ if __name__ == "__main__":
     
     try:
         # Start packet capture
-        sys.stderr.write("Starting packet capture on port 3001...\n")
+        log.info("Starting packet capture on port 3001...")
         sniff(filter="tcp port 3001", prn=packet_callback, store=0)
     except Exception as e:
-        sys.stderr.write(f"Error in packet capture: {e}\n")
+        log.error("Error in packet capture: %s", e)
         sys.exit(1) 
\ No newline at end of file
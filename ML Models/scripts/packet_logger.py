@@ -3,14 +3,18 @@ import os
 import json
 import time
 import random
-import datetime
 import sys
-from collections import deque
 import threading
 import socket
+import gzip
 import http.server
-import socketserver
 from urllib.parse import urlparse, parse_qs
+from packet_ring import PacketRing
+from packet_record import PacketRecord, PROTOCOL_NAMES, TCP_FLAGS, FLAG_SYN, ip_to_int
+from metrics import counter, gauge, send_metrics
+from log_config import get_logger
+
+log = get_logger("packet_logger")
 
 # In a real implementation, we would import scapy
 # from scapy.all import sniff, IP, TCP, UDP
@@ -21,66 +25,120 @@ ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 # File to indicate a DoS simulation is in progress
 DOS_SIMULATION_FLAG_FILE = os.path.join(ML_DIR, 'scripts', '.dos_simulation_in_progress')
 
-# Store the last 100 packets
-packet_logs = deque(maxlen=100)
+# Number of recent packets kept pre-encoded for /api/packets
+PACKET_LOG_SIZE = int(os.environ.get('PACKET_LOG_SIZE', '100'))
+
+# Responses smaller than this are not worth compressing
+GZIP_MIN_SIZE = 1024
+
+class PacketLog:
+    """Fixed-size ring of packets, each JSON-encoded once when logged
+
+    Every packet gets a monotonic sequence number so clients can poll for
+    new packets with ?since=<seq>. Reads only copy references to the
+    encoded packets, so serving a request never re-encodes anything.
+    """
+
+    def __init__(self, maxlen):
+        self.maxlen = maxlen
+        self.slots = [None] * maxlen
+        self.first_seq = None
+        self.next_seq = 0
+        self.lock = threading.Lock()
+
+    def append(self, record, seq=None):
+        """Log a PacketRecord, using seq when the history ring already assigned one"""
+        # Encode outside the lock and splice the sequence number in after
+        encoded = json.dumps(record.to_dict()).encode()
+        with self.lock:
+            if seq is None:
+                seq = self.next_seq
+            if self.first_seq is None:
+                self.first_seq = seq
+            self.slots[seq % self.maxlen] = b'{"seq": %d, ' % seq + encoded[1:]
+            self.next_seq = seq + 1
+        return seq
+
+    def __len__(self):
+        if self.first_seq is None:
+            return 0
+        return min(self.next_seq - self.first_seq, self.maxlen)
+
+    def snapshot(self, limit, since=None):
+        """Return (encoded packets, last sequence number) for a request
+
+        Without since, the newest limit packets are returned. With since,
+        the oldest limit packets after that sequence number are returned.
+        """
+        with self.lock:
+            end = self.next_seq
+            oldest = max(self.first_seq or 0, end - self.maxlen)
+            if since is None:
+                start = max(oldest, end - limit)
+            else:
+                start = max(oldest, since + 1)
+                end = min(end, start + limit)
+            packets = [self.slots[seq % self.maxlen] for seq in range(start, end)]
+        return packets, end - 1
+
+# Store the most recent packets
+packet_logs = PacketLog(PACKET_LOG_SIZE)
+
+# Long-term packet history, opened when the logger starts
+packet_ring = None
+
+# Keeps the history ring and the recent log in the same order
+log_lock = threading.Lock()
+
+# Instrumentation served on /metrics; packets per second is rate(packet_logger_packets_total)
+packets_logged = counter("packet_logger_packets_total", "Packets logged")
+gauge("packet_logger_recent_packets", "Packets held in the recent packet log").set_function(lambda: len(packet_logs))
+
+def log_packet(record):
+    """Record a packet in the history ring and the recent packet log"""
+    packets_logged.inc()
+    with log_lock:
+        seq = packet_ring.append(record) if packet_ring is not None else None
+        return packet_logs.append(record, seq)
 
 # Flag to control the monitoring loop
 running = True
 
-# Protocol mapping
-PROTOCOLS = {
-    1: "ICMP",
-    6: "TCP",
-    17: "UDP",
-    # Add more as needed
-}
+# Protocols and TCP flags used by the simulated traffic
+MOCK_PROTOCOLS = list(PROTOCOL_NAMES.keys())
+FLAG_BITS = list(TCP_FLAGS.values())
+
+# Function to generate a random IPv4 address as an integer
+def random_ip():
+    """Generate a random address with every octet in 1-255"""
+    return (random.randint(1, 255) << 24) | (random.randint(1, 255) << 16) | (random.randint(1, 255) << 8) | random.randint(1, 255)
 
 # Function to generate a mock packet (for simulation)
 def generate_mock_packet():
     """Generate a mock packet for simulation purposes"""
-    src_ip = f"{random.randint(1, 255)}.{random.randint(1, 255)}.{random.randint(1, 255)}.{random.randint(1, 255)}"
-    dst_ip = f"{random.randint(1, 255)}.{random.randint(1, 255)}.{random.randint(1, 255)}.{random.randint(1, 255)}"
-    
     # Randomly choose protocol
-    protocol = random.choice(list(PROTOCOLS.keys()))
-    protocol_name = PROTOCOLS[protocol]
-    
-    # Generate ports for TCP/UDP
-    src_port = random.randint(1024, 65535) if protocol in [6, 17] else None
-    dst_port = random.choice([80, 443, 22, 21, 25, 53, 3306, 5432]) if protocol in [6, 17] else None
-    
-    # Generate packet size
-    size = random.randint(64, 1500)
-    
-    # Generate TCP flags (if TCP)
-    flags = ""
-    if protocol == 6:  # TCP
-        flag_options = ["S", "A", "F", "R", "P", "U"]
-        num_flags = random.randint(1, 3)
-        flags = "".join(random.sample(flag_options, num_flags))
+    protocol = random.choice(MOCK_PROTOCOLS)
     
-    # Generate timestamp
-    timestamp = datetime.datetime.now().isoformat()
+    record = PacketRecord(
+        time.time_ns(),
+        random_ip(),
+        random_ip(),
+        protocol,
+        random.randint(64, 1500),
+        random.randint(32, 128)
+    )
     
-    # Create packet object
-    packet = {
-        "timestamp": timestamp,
-        "protocol": protocol_name,
-        "src_ip": src_ip,
-        "dst_ip": dst_ip,
-        "size": size,
-        "ttl": random.randint(32, 128)
-    }
-    
-    # Add protocol-specific fields
-    if protocol in [6, 17]:  # TCP or UDP
-        packet["src_port"] = src_port
-        packet["dst_port"] = dst_port
+    # Generate ports for TCP/UDP
+    if protocol in (6, 17):
+        record.src_port = random.randint(1024, 65535)
+        record.dst_port = random.choice([80, 443, 22, 21, 25, 53, 3306, 5432])
     
-    if protocol == 6:  # TCP
-        packet["flags"] = flags
+    # Generate 1-3 TCP flags (if TCP)
+    if protocol == 6:
+        for bit in random.sample(FLAG_BITS, random.randint(1, 3)):
+            record.flags |= bit
     
-    return packet
+    return record
 
 def capture_packets():
     """Capture network packets (simulation)"""
@@ -88,40 +146,94 @@ def capture_packets():
         # In a real implementation, this would capture actual packets
         # For simulation, we'll generate random packets
         packet = generate_mock_packet()
-        packet_logs.append(packet)
+        log_packet(packet)
         
         # Sleep for a random time to simulate varying packet rates
         time.sleep(random.uniform(0.1, 0.5))
 
 # HTTP request handler for the packet log API
-class PacketLogHandler(http.server.SimpleHTTPRequestHandler):
+class PacketLogHandler(http.server.BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections alive between polls
+    protocol_version = "HTTP/1.1"
+    
+    def send_body(self, status, body, content_type='application/json', headers=None):
+        """Send a complete response, gzip-compressed when the client accepts it"""
+        if len(body) >= GZIP_MIN_SIZE and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body, compresslevel=5)
+            headers = dict(headers or {}, **{'Content-Encoding': 'gzip'})
+        
+        self.send_response(status)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
     def do_GET(self):
         parsed_path = urlparse(self.path)
         
         # Handle API endpoints
         if parsed_path.path == "/api/packets":
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            
             # Get query parameters
             query = parse_qs(parsed_path.query)
-            limit = int(query.get('limit', ['100'])[0])
+            try:
+                limit = max(0, int(query.get('limit', ['100'])[0]))
+                since = int(query['since'][0]) if 'since' in query else None
+            except ValueError:
+                self.send_body(400, json.dumps({"error": "limit and since must be integers"}).encode())
+                return
+            
+            # Get the packets (limited by the query parameters)
+            packets, last_seq = packet_logs.snapshot(limit, since)
+            
+            self.send_body(200, b"[" + b", ".join(packets) + b"]", headers={
+                'X-Last-Seq': str(last_seq),
+                'Access-Control-Expose-Headers': 'X-Last-Seq'
+            })
+            return
+        
+        # Page through the full packet history
+        elif parsed_path.path == "/api/packets/page":
+            if packet_ring is None:
+                self.send_body(503, json.dumps({"error": "Packet history is not available"}).encode())
+                return
+            
+            query = parse_qs(parsed_path.query)
+            params = {key: values[0] for key, values in query.items()}
+            try:
+                limit = min(max(0, int(params.get('limit', '100'))), 1000)
+                cursor = int(params['cursor']) if 'cursor' in params else None
+                dst_port = int(params['dst_port']) if 'dst_port' in params else None
+            except ValueError:
+                self.send_body(400, json.dumps({"error": "limit, cursor and dst_port must be integers"}).encode())
+                return
             
-            # Get the packets (limited by the query parameter)
-            packets = list(packet_logs)[-limit:]
+            packets, next_cursor = packet_ring.query(
+                cursor=cursor,
+                limit=limit,
+                protocol=params.get('protocol'),
+                src_ip=params.get('src_ip'),
+                dst_port=dst_port,
+                flags=params.get('flags')
+            )
             
-            self.wfile.write(json.dumps(packets).encode())
+            response = {
+                "packets": packets,
+                "next_cursor": next_cursor,
+                "oldest_seq": packet_ring.oldest_seq(),
+                "newest_seq": packet_ring.next_seq - 1
+            }
+            self.send_body(200, json.dumps(response).encode())
+            return
+        
+        elif parsed_path.path == "/metrics":
+            send_metrics(self)
             return
         
         # Handle simulated DoS attack
         elif parsed_path.path == "/api/simulate-dos":
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            
             # Get query parameters
             query = parse_qs(parsed_path.query)
             target_ip = query.get('target', ['192.168.1.1'])[0]
@@ -135,63 +247,62 @@ class PacketLogHandler(http.server.SimpleHTTPRequestHandler):
                 "message": f"Simulating DoS attack on {target_ip} for {duration} seconds"
             }
             
-            self.wfile.write(json.dumps(response).encode())
+            self.send_body(200, json.dumps(response).encode())
             return
         
         # Default: return 404
-        self.send_response(404)
-        self.end_headers()
-        self.wfile.write(b'Not Found')
+        self.send_body(404, b'Not Found', content_type='text/plain')
 
 # Function to set the DoS simulation flag
 def set_dos_simulation_flag(target_ip):
     """Create a flag file to indicate a DoS simulation is in progress"""
     with open(DOS_SIMULATION_FLAG_FILE, 'w') as f:
         f.write(target_ip)
-    sys.stderr.write(f"DoS simulation flag set for target: {target_ip}\n")
+    log.info("DoS simulation flag set for target: %s", target_ip)
 
 # Function to clear the DoS simulation flag
 def clear_dos_simulation_flag():
     """Remove the flag file when simulation is complete"""
     if os.path.exists(DOS_SIMULATION_FLAG_FILE):
         os.remove(DOS_SIMULATION_FLAG_FILE)
-        sys.stderr.write("DoS simulation flag cleared\n")
+        log.info("DoS simulation flag cleared")
 
 # Function to simulate a DoS attack
 def simulate_dos_attack(target_ip, duration):
     """Simulate a DoS attack by generating a high volume of packets to the target"""
-    sys.stderr.write(f"Simulating DoS attack on {target_ip} for {duration} seconds\n")
+    log.info("Simulating DoS attack on %s for %s seconds", target_ip, duration)
     
     # Set the simulation flag
     set_dos_simulation_flag(target_ip)
     
     end_time = time.time() + duration
+    target = ip_to_int(target_ip)
     
     try:
         while time.time() < end_time:
             # Generate 10-20 packets per iteration
             for _ in range(random.randint(10, 20)):
                 # Create a SYN flood packet (TCP with SYN flag)
-                packet = {
-                    "timestamp": datetime.datetime.now().isoformat(),
-                    "src_ip": f"{random.randint(1, 255)}.{random.randint(1, 255)}.{random.randint(1, 255)}.{random.randint(1, 255)}",
-                    "dst_ip": target_ip,
-                    "protocol": "TCP",
-                    "src_port": random.randint(1024, 65535),
-                    "dst_port": random.choice([80, 443, 22]),
-                    "flags": "S",  # SYN flag
-                    "size": random.randint(64, 128),
-                    "ttl": random.randint(32, 128)
-                }
+                packet = PacketRecord(
+                    time.time_ns(),
+                    random_ip(),
+                    target,
+                    6,
+                    random.randint(64, 128),
+                    random.randint(32, 128),
+                    random.randint(1024, 65535),
+                    random.choice([80, 443, 22]),
+                    FLAG_SYN
+                )
                 
-                packet_logs.append(packet)
+                log_packet(packet)
             
             # Sleep for a short time to avoid overwhelming the CPU
             time.sleep(0.05)
     finally:
         # Always clear the flag when done, even if there's an error
         clear_dos_simulation_flag()
-        sys.stderr.write(f"DoS attack simulation completed\n")
+        log.info("DoS attack simulation completed")
 
 # Function to check if a port is available
 def is_port_available(port):
@@ -212,6 +323,9 @@ def find_available_port(start_port, max_attempts=10):
     return None
 
 if __name__ == "__main__":
+    # Open the packet history before capture starts
+    packet_ring = PacketRing()
+    
     # Start packet capture in a separate thread
     capture_thread = threading.Thread(target=capture_packets)
     capture_thread.daemon = True
@@ -224,14 +338,15 @@ if __name__ == "__main__":
     PORT = find_available_port(DEFAULT_PORT, 20)
     
     if PORT is None:
-        sys.stderr.write(f"Could not find an available port after trying {DEFAULT_PORT} through {DEFAULT_PORT + 19}\n")
+        log.error("Could not find an available port after trying %s through %s", DEFAULT_PORT, DEFAULT_PORT + 19)
         sys.exit(1)
     
     try:
-        with socketserver.TCPServer(("", PORT), PacketLogHandler) as httpd:
-            sys.stderr.write(f"Packet logger API running at http://localhost:{PORT}\n")
-            sys.stderr.write(f"View packets: http://localhost:{PORT}/api/packets\n")
-            sys.stderr.write(f"Simulate DoS: http://localhost:{PORT}/api/simulate-dos?target=192.168.1.1&duration=10\n")
+        # Serve each client on its own thread so a slow reader can't block the others
+        with http.server.ThreadingHTTPServer(("", PORT), PacketLogHandler) as httpd:
+            log.info("Packet logger API running at http://localhost:%s", PORT)
+            log.info("View packets: http://localhost:%s/api/packets", PORT)
+            log.info("Simulate DoS: http://localhost:%s/api/simulate-dos?target=192.168.1.1&duration=10", PORT)
             
             # Print the port to stdout for the parent process to capture
             print(PORT)
@@ -239,5 +354,5 @@ if __name__ == "__main__":
             
             httpd.serve_forever()
     except KeyboardInterrupt:
-        sys.stderr.write("Shutting down packet logger\n")
+        log.info("Shutting down packet logger")
         running = False 
\ No newline at end of file
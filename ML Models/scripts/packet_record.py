@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+import struct
+import socket
+import datetime
+
+# Protocol mapping
+PROTOCOL_NUMBERS = {"ICMP": 1, "TCP": 6, "UDP": 17}
+PROTOCOL_NAMES = {number: name for name, number in PROTOCOL_NUMBERS.items()}
+
+# TCP flag bits, matching the flags field of the TCP header
+TCP_FLAGS = {"F": 0x01, "S": 0x02, "R": 0x04, "P": 0x08, "A": 0x10, "U": 0x20}
+FLAG_FIN = TCP_FLAGS["F"]
+FLAG_SYN = TCP_FLAGS["S"]
+FLAG_RST = TCP_FLAGS["R"]
+FLAG_PSH = TCP_FLAGS["P"]
+FLAG_ACK = TCP_FLAGS["A"]
+FLAG_URG = TCP_FLAGS["U"]
+
+def ip_to_int(ip):
+    """Convert a dotted-quad IPv4 address to an integer (0 if it isn't one)"""
+    try:
+        return struct.unpack('!I', socket.inet_aton(ip))[0]
+    except (OSError, TypeError):
+        return 0
+
+def int_to_ip(value):
+    """Convert an integer to a dotted-quad IPv4 address"""
+    return socket.inet_ntoa(struct.pack('!I', int(value)))
+
+def flags_to_mask(flags):
+    """Convert a TCP flag string such as 'SA' to a bitmask"""
+    mask = 0
+    for flag in flags or "":
+        mask |= TCP_FLAGS.get(flag, 0)
+    return mask
+
+def mask_to_flags(mask):
+    """Convert a TCP flag bitmask back to a flag string"""
+    return "".join(flag for flag, bit in TCP_FLAGS.items() if mask & bit)
+
+def ns_to_timestamp(ts_ns):
+    """Convert epoch nanoseconds to an ISO timestamp"""
+    seconds, ns = divmod(int(ts_ns), 1_000_000_000)
+    return (datetime.datetime.fromtimestamp(seconds) + datetime.timedelta(microseconds=ns // 1000)).isoformat()
+
+class PacketRecord:
+    """Compact in-memory packet
+
+    Addresses are stored as integers, the timestamp as epoch nanoseconds
+    and TCP flags as a bitmask. The dict form used by the API is only built
+    by to_dict() when a packet is serialized.
+    """
+
+    __slots__ = ('ts_ns', 'src_ip', 'dst_ip', 'src_port', 'dst_port', 'size', 'ttl', 'protocol', 'flags')
+
+    def __init__(self, ts_ns, src_ip, dst_ip, protocol, size, ttl, src_port=0, dst_port=0, flags=0):
+        self.ts_ns = ts_ns
+        self.src_ip = src_ip
+        self.dst_ip = dst_ip
+        self.src_port = src_port
+        self.dst_port = dst_port
+        self.size = size
+        self.ttl = ttl
+        self.protocol = protocol
+        self.flags = flags
+
+    @classmethod
+    def from_scapy(cls, packet, ts_ns):
+        """Build a record from a captured Scapy packet (None if it isn't IPv4)"""
+        from scapy.all import IP, TCP, UDP
+
+        if IP not in packet:
+            return None
+        ip = packet[IP]
+        record = cls(ts_ns, ip_to_int(ip.src), ip_to_int(ip.dst), ip.proto, len(packet), ip.ttl)
+        if TCP in packet:
+            record.src_port = packet[TCP].sport
+            record.dst_port = packet[TCP].dport
+            record.flags = int(packet[TCP].flags) & 0x3F
+        elif UDP in packet:
+            record.src_port = packet[UDP].sport
+            record.dst_port = packet[UDP].dport
+        return record
+
+    def to_dict(self):
+        """Convert to the dict form served by the packet API"""
+        packet = {
+            "timestamp": ns_to_timestamp(self.ts_ns),
+            "protocol": PROTOCOL_NAMES.get(self.protocol, str(self.protocol)),
+            "src_ip": int_to_ip(self.src_ip),
+            "dst_ip": int_to_ip(self.dst_ip),
+            "size": self.size,
+            "ttl": self.ttl
+        }
+
+        # Add protocol-specific fields
+        if self.protocol in (6, 17):  # TCP or UDP
+            packet["src_port"] = self.src_port
+            packet["dst_port"] = self.dst_port
+
+        if self.protocol == 6:  # TCP
+            packet["flags"] = mask_to_flags(self.flags)
+
+        return packet
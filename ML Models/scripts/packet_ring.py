@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+import os
+import mmap
+import struct
+import threading
+import numpy as np
+from packet_record import PacketRecord, PROTOCOL_NUMBERS, ip_to_int, flags_to_mask
+
+# Path to the ML Models directory
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Memory-mapped file holding the packet history
+PACKET_RING_FILE = os.environ.get(
+    'PACKET_RING_FILE', os.path.join(ML_DIR, 'scripts', '.packet_ring.bin')
+)
+
+# Number of packets kept in the history (40 bytes each on disk)
+PACKET_RING_CAPACITY = int(os.environ.get('PACKET_RING_CAPACITY', '1000000'))
+
+# File header: magic, layout version, record size, capacity, next sequence number
+HEADER_FORMAT = '<8sIIQQ'
+HEADER_SIZE = 64
+NEXT_SEQ_OFFSET = struct.calcsize('<8sIIQ')
+MAGIC = b'PKTRING1'
+LAYOUT_VERSION = 1
+
+# Fixed-width packet record
+RECORD_DTYPE = np.dtype([
+    ('seq', '<u8'),
+    ('ts_ns', '<i8'),
+    ('src_ip', '<u4'),
+    ('dst_ip', '<u4'),
+    ('src_port', '<u2'),
+    ('dst_port', '<u2'),
+    ('size', '<u2'),
+    ('ttl', 'u1'),
+    ('protocol', 'u1'),
+    ('flags', 'u1'),
+    ('_pad', 'V7'),
+])
+
+# Records are scanned in chunks of this many when filtering
+SCAN_CHUNK = 65536
+
+def record_to_packet(row):
+    """Convert a ring record to the packet dict served by the API"""
+    record = PacketRecord(
+        int(row['ts_ns']), int(row['src_ip']), int(row['dst_ip']), int(row['protocol']),
+        int(row['size']), int(row['ttl']), int(row['src_port']), int(row['dst_port']), int(row['flags'])
+    )
+    return {"seq": int(row['seq']), **record.to_dict()}
+
+class PacketRing:
+    """Memory-mapped ring of fixed-width packet records
+
+    The ring holds the last `capacity` packets, each tagged with a
+    monotonic sequence number that survives restarts. Memory use is fixed
+    by the file size no matter how fast packets arrive.
+    """
+
+    def __init__(self, path=PACKET_RING_FILE, capacity=PACKET_RING_CAPACITY):
+        self.path = path
+        self.lock = threading.Lock()
+        size = HEADER_SIZE + capacity * RECORD_DTYPE.itemsize
+
+        # Reuse the existing file when its layout matches, otherwise start over
+        next_seq = 0
+        if os.path.exists(path) and os.path.getsize(path) == size:
+            with open(path, 'rb') as f:
+                magic, version, record_size, file_capacity, file_next_seq = struct.unpack(
+                    HEADER_FORMAT, f.read(struct.calcsize(HEADER_FORMAT))
+                )
+            if (magic, version, record_size, file_capacity) == (MAGIC, LAYOUT_VERSION, RECORD_DTYPE.itemsize, capacity):
+                next_seq = file_next_seq
+
+        with open(path, 'a+b') as f:
+            if next_seq == 0:
+                f.truncate(0)
+            f.truncate(size)
+            self.mm = mmap.mmap(f.fileno(), size)
+
+        self.capacity = capacity
+        self.next_seq = next_seq
+        self.records = np.frombuffer(self.mm, dtype=RECORD_DTYPE, count=capacity, offset=HEADER_SIZE)
+        self._write_header()
+
+    def _write_header(self):
+        struct.pack_into(
+            HEADER_FORMAT, self.mm, 0,
+            MAGIC, LAYOUT_VERSION, RECORD_DTYPE.itemsize, self.capacity, self.next_seq
+        )
+
+    def append(self, record):
+        """Store a PacketRecord and return its sequence number"""
+        with self.lock:
+            seq = self.next_seq
+            self.records[seq % self.capacity] = (
+                seq,
+                record.ts_ns,
+                record.src_ip,
+                record.dst_ip,
+                record.src_port,
+                record.dst_port,
+                min(record.size, 0xFFFF),
+                record.ttl,
+                record.protocol,
+                record.flags,
+                b''
+            )
+            self.next_seq = seq + 1
+            struct.pack_into('<Q', self.mm, NEXT_SEQ_OFFSET, self.next_seq)
+        return seq
+
+    def oldest_seq(self):
+        return max(0, self.next_seq - self.capacity)
+
+    def _segments(self, start, end):
+        """Yield (slot_start, slot_end) ranges covering sequence numbers [start, end)"""
+        while start < end:
+            slot = start % self.capacity
+            count = min(end - start, self.capacity - slot, SCAN_CHUNK)
+            yield slot, slot + count
+            start += count
+
+    def query(self, cursor=None, limit=100, protocol=None, src_ip=None, dst_port=None, flags=None):
+        """Return a page of packets after cursor matching the filters
+
+        Returns (packets, next_cursor); pass next_cursor back to get the
+        following page. Without a cursor the page starts at the oldest
+        packet still in the ring.
+        """
+        end = self.next_seq
+        start = self.oldest_seq() if cursor is None else max(self.oldest_seq(), cursor + 1)
+
+        conditions = []
+        if protocol is not None:
+            conditions.append(('protocol', PROTOCOL_NUMBERS.get(protocol.upper(), -1)))
+        if src_ip is not None:
+            conditions.append(('src_ip', ip_to_int(src_ip)))
+        if dst_port is not None:
+            conditions.append(('dst_port', int(dst_port)))
+        flag_mask = flags_to_mask(flags) if flags else 0
+
+        matches = []
+        remaining = limit
+        next_cursor = end - 1
+        for slot_start, slot_end in self._segments(start, end):
+            if remaining <= 0:
+                break
+            chunk = self.records[slot_start:slot_end]
+
+            # Skip slots the writer has already overwritten with newer packets
+            seq = chunk['seq']
+            mask = (seq >= start) & (seq < end)
+            for field, value in conditions:
+                mask &= chunk[field] == value
+            if flag_mask:
+                mask &= (chunk['flags'] & flag_mask) == flag_mask
+
+            # Copy the matches out before the writer can overwrite them
+            found = chunk[mask][:remaining].copy()
+            matches.append(found)
+            remaining -= len(found)
+            if remaining <= 0:
+                next_cursor = int(found['seq'][-1])
+
+        packets = [record_to_packet(record) for found in matches for record in found]
+        return packets, next_cursor
+
+    def close(self):
+        # Drop the array view first; mmap refuses to close while it exists
+        self.records = None
+        self.mm.flush()
+        self.mm.close()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+import sys
+import json
+import time
+import numpy as np
+from ddos_analyze import DDOS_FEATURES, load_artifact_or_fallback, prepare_features, describe_prediction
+
+# Rows scored per predict_proba call; bounds memory on very large grids
+SCORE_BATCH_ROWS = 65536
+
+# Seed for random refinement, so repeated runs rank the same rows
+RANDOM_SEED = 42
+
+# First row of the SDN training data, the starting point for probes
+BASE_FEATURES = {
+    "dt": 11425,
+    "pktcount": 45304,
+    "bytecount": 48294064,
+    "dur": 100,
+    "flows": 3,
+    "packetins": 1943,
+    "pktperflow": 13535,
+    "byteperflow": 14428310,
+    "pktrate": 451,
+    "Protocol": "UDP",
+    "port_no": 3,
+    "tx_bytes": 143928631,
+    "rx_bytes": 3917,
+    "syn_flag": 0,
+    "ack_flag": 0,
+    "psh_flag": 0,
+    "rst_flag": 0,
+    "fin_flag": 0,
+    "window_size": 65535,
+    "urgent_ptr": 0,
+    "header_len": 20
+}
+
+# Grid swept when probe_engine.py runs on its own (100,000 combinations)
+DEFAULT_AXES = {
+    "pktcount": np.geomspace(10, 10000000, 10).round().tolist(),
+    "pktrate": np.geomspace(0.1, 100000, 10).round(1).tolist(),
+    "bytecount": np.geomspace(1000, 10000000000, 10).round().tolist(),
+    "flows": [1, 2, 3, 10, 100],
+    "port_no": [3, 4, 22, 80, 443],
+    "Protocol": ["UDP", "TCP"],
+    "syn_flag": [0, 1]
+}
+
+# Features whose values are labels, not magnitudes; refine() only picks from the listed values
+CATEGORICAL_FEATURES = {"Protocol", "port_no"}
+
+# Counts, which refine() keeps at one or more
+COUNT_FEATURES = {"pktcount", "bytecount", "flows", "packetins"}
+
+def encode_value(name, value):
+    """Encode a feature value the way prepare_features does"""
+    if name == "Protocol":
+        return 1.0 if value == "TCP" else 0.0
+    return float(value)
+
+class ProbeEngine:
+    """Scores feature combinations against the DDoS model in-process
+
+    Every probe is a row of one feature matrix, scored with batched
+    predict_proba calls, instead of one ddos_analyze.py process per probe.
+    live is as for ModelArtifact.predictor(): pass live=False, to the
+    engine or to a single call, for rows already at the training data's
+    scale, so the scaler's live gain isn't applied to them a second time.
+    """
+
+    def __init__(self, artifact=None, live=True):
+        self.artifact = artifact or load_artifact_or_fallback()
+        self.live = live
+        self.models = {live: self.artifact.predictor(live)}
+        self.probes = 0
+        self.seconds = 0.0
+
+    def predictor(self, live=None):
+        live = self.live if live is None else live
+        if live not in self.models:
+            self.models[live] = self.artifact.predictor(live)
+        return self.models[live]
+
+    def score(self, X, live=None):
+        """Attack probability of every row of X"""
+        X = np.asarray(X, dtype=np.float64)
+        model = self.predictor(live)
+        start = time.perf_counter()
+        scores = np.empty(len(X))
+        for lo in range(0, len(X), SCORE_BATCH_ROWS):
+            scores[lo:lo + SCORE_BATCH_ROWS] = model.predict_proba(X[lo:lo + SCORE_BATCH_ROWS])[:, 1]
+        self.seconds += time.perf_counter() - start
+        self.probes += len(X)
+        return scores
+
+    def probe(self, data, live=None):
+        """Score one feature dict; returns ddos_analyze.py's result"""
+        row = prepare_features(data)[0]
+        return describe_prediction(row, self.score(row[np.newaxis], live)[0])
+
+    def grid(self, base, axes):
+        """Every combination of axes values on top of base, as one matrix"""
+        base_row = prepare_features(base)[0]
+        names = list(axes)
+        columns = [DDOS_FEATURES.index(name) for name in names]
+        values = [np.array([encode_value(name, v) for v in axes[name]]) for name in names]
+        mesh = np.meshgrid(*values, indexing='ij')
+
+        X = np.tile(base_row, (mesh[0].size, 1))
+        for column, axis in zip(columns, mesh):
+            X[:, column] = axis.ravel()
+        return X
+
+    def sweep(self, base, axes):
+        X = self.grid(base, axes)
+        return X, self.score(X)
+
+    def refine(self, X, scores, axes, rounds=5, samples=2000, keep=20, spread=0.5):
+        """Random local search around the best rows
+
+        Each round perturbs the current top rows: categorical axes (such as
+        port_no) and axes with at most two values are set to a random one
+        of their values, and numeric axes are scaled by a random log-normal
+        factor (spread shrinks every round), rounded if their values are
+        whole numbers and, for counts, kept at one or more.
+        Returns all rows and scores, the new probes appended.
+        """
+        rng = np.random.default_rng(RANDOM_SEED)
+        columns = {DDOS_FEATURES.index(name): values for name, values in axes.items()}
+        for _ in range(rounds):
+            top = X[np.argsort(scores)[-keep:]]
+            candidates = top[rng.integers(0, len(top), samples)].copy()
+            for column, values in columns.items():
+                name = DDOS_FEATURES[column]
+                if name in CATEGORICAL_FEATURES or len(values) <= 2:
+                    choices = np.array([encode_value(name, v) for v in values])
+                    candidates[:, column] = rng.choice(choices, samples)
+                else:
+                    candidates[:, column] *= rng.lognormal(0, spread, samples)
+                    if all(float(v).is_integer() for v in values):
+                        candidates[:, column] = np.round(candidates[:, column])
+                    if name in COUNT_FEATURES:
+                        candidates[:, column] = np.maximum(candidates[:, column], 1)
+            new_scores = self.score(candidates)
+            X = np.concatenate([X, candidates])
+            scores = np.concatenate([scores, new_scores])
+            spread /= 2
+        return X, scores
+
+def decode_value(name, value):
+    if name == "Protocol":
+        return "TCP" if value == 1 else "UDP"
+    return value.item()
+
+def ranked(X, scores, names, top=10):
+    """The highest-scoring rows as dicts of the named features and their confidence"""
+    columns = [DDOS_FEATURES.index(name) for name in names]
+    table = []
+    for i in np.argsort(-scores, kind='stable')[:top]:
+        row = {name: decode_value(name, X[i, column]) for name, column in zip(names, columns)}
+        row["confidence"] = round(float(scores[i]), 4)
+        table.append(row)
+    return table
+
+def format_table(rows):
+    """Render ranked rows as an aligned text table"""
+    if not rows:
+        return "(no rows)"
+    names = list(rows[0])
+    cells = [[f"{row[name]:g}" if isinstance(row[name], float) else str(row[name]) for name in names] for row in rows]
+    widths = [max(len(name), *(len(cell[i]) for cell in cells)) for i, name in enumerate(names)]
+    lines = ["  ".join(name.rjust(width) for name, width in zip(names, widths))]
+    lines += ["  ".join(cell.rjust(width) for cell, width in zip(row, widths)) for row in cells]
+    return "\n".join(lines)
+
+def summary(engine, scores):
+    return {
+        "probes": engine.probes,
+        "attacks": int((scores > 0.5).sum()),
+        "max_confidence": round(float(scores.max()), 4),
+        "seconds": round(engine.seconds, 3),
+        "probes_per_second": round(engine.probes / engine.seconds) if engine.seconds else None
+    }
+
+if __name__ == "__main__":
+    # Usage: python probe_engine.py [--refine ROUNDS] [--top N] [--json]
+    args = sys.argv[1:]
+    rounds = int(args[args.index("--refine") + 1]) if "--refine" in args else 0
+    top = int(args[args.index("--top") + 1]) if "--top" in args else 10
+
+    engine = ProbeEngine()
+    X, scores = engine.sweep(BASE_FEATURES, DEFAULT_AXES)
+    if rounds:
+        X, scores = engine.refine(X, scores, DEFAULT_AXES, rounds=rounds)
+    table = ranked(X, scores, list(DEFAULT_AXES), top)
+
+    if "--json" in args:
+        print(json.dumps({"summary": summary(engine, scores), "top": table}, indent=2))
+    else:
+        print(format_table(table))
+        print(json.dumps(summary(engine, scores)))
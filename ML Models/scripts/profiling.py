@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import signal
+import datetime
+import threading
+from collections import Counter
+from log_config import get_logger
+
+log = get_logger("profiling")
+
+# Path to the ML Models directory
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Where profiles are written
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(ML_DIR, 'scripts', '.profiles'))
+
+# Seconds between stack samples
+SAMPLE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', '0.005'))
+
+# A profile stops and is written after this many seconds, so a forgotten one can't run forever
+MAX_PROFILE_SECONDS = float(os.environ.get('PROFILE_MAX_SECONDS', '120'))
+
+# Distinct stacks kept per profile; further stacks are counted under TRUNCATED
+MAX_STACKS = 20000
+TRUNCATED = "[truncated]"
+
+# Signals that start and stop profiling of a running process
+START_SIGNAL = getattr(signal, 'SIGUSR1', None)
+STOP_SIGNAL = getattr(signal, 'SIGUSR2', None)
+
+# File the DDoS monitor writes its process ID to
+MONITOR_PID_FILE = os.path.join(ML_DIR, 'scripts', '.ddos_monitor.pid')
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def fold_stack(frame, root):
+    """A frame and its callers as one folded-stack line, outermost first"""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    labels.append(root)
+    return ";".join(reversed(labels))
+
+class NullSpan:
+    """What span() returns while not profiling; entering it costs one call"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_SPAN = NullSpan()
+
+class Span:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        stack = self.profiler.span_stack()
+        # [name, start, seconds spent in child spans]
+        stack.append([self.name, time.perf_counter(), 0.0])
+        return self
+
+    def __exit__(self, *exc):
+        stack = self.profiler.span_stack()
+        name, start, children = stack[-1]
+        elapsed = time.perf_counter() - start
+        path = ";".join(entry[0] for entry in stack)
+        stack.pop()
+        if stack:
+            stack[-1][2] += elapsed
+        self.profiler.record_span(path, elapsed, elapsed - children)
+        return False
+
+class Profiler:
+    """Opt-in sampling profiler and stage timer for one process
+
+    While active, a background thread samples the Python stack of every
+    other thread each SAMPLE_INTERVAL, and span() blocks record their
+    time. Stopping writes both as folded stacks (flamegraph.pl,
+    speedscope and inferno all read them) plus a JSON summary of the
+    spans. Inactive, span() returns a shared no-op and nothing samples,
+    so the hooks can stay in production code.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.active = False
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.reset()
+
+    def reset(self):
+        self.samples = Counter()
+        self.span_self = Counter()
+        self.span_stats = {}
+        self.started = None
+        self.sampler = None
+
+    def span(self, name):
+        """Time a stage; nested spans make a path such as tick;detect"""
+        if not self.active:
+            return NULL_SPAN
+        return Span(self, name)
+
+    def span_stack(self):
+        try:
+            return self.local.stack
+        except AttributeError:
+            self.local.stack = []
+            return self.local.stack
+
+    def record_span(self, path, elapsed, self_time):
+        with self.lock:
+            if not self.active:
+                return
+            if path not in self.span_stats and len(self.span_stats) >= MAX_STACKS:
+                path = TRUNCATED
+            stats = self.span_stats.setdefault(path, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] = max(stats[2], elapsed)
+            self.span_self[path] += self_time
+
+    def start(self, sample=True):
+        with self.lock:
+            if self.active:
+                return False
+            self.reset()
+            self.active = True
+            self.started = time.monotonic()
+            if sample:
+                self.sampler = threading.Thread(target=self.sample_loop, name="profiler", daemon=True)
+                self.sampler.start()
+        log.info("Profiling %s (sampling every %ss, stops after %ss)", self.name, SAMPLE_INTERVAL, MAX_PROFILE_SECONDS)
+        return True
+
+    def sample_loop(self):
+        own = threading.get_ident()
+        while self.active:
+            if time.monotonic() - self.started > MAX_PROFILE_SECONDS:
+                log.warning("Profile reached %ss, stopping", MAX_PROFILE_SECONDS)
+                self.stop()
+                return
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = fold_stack(frame, names.get(ident, str(ident)))
+                if stack not in self.samples and len(self.samples) >= MAX_STACKS:
+                    stack = TRUNCATED
+                self.samples[stack] += 1
+            time.sleep(SAMPLE_INTERVAL)
+
+    def stop(self):
+        """Stop profiling and write the results; returns the files written"""
+        with self.lock:
+            if not self.active:
+                return []
+            self.active = False
+            seconds = time.monotonic() - self.started
+            samples, span_self, span_stats = self.samples, self.span_self, self.span_stats
+            sampler = self.sampler
+        # Let the sampler finish its last pass before the samples are read
+        if sampler is not None and sampler is not threading.current_thread():
+            sampler.join()
+        return self.write(seconds, samples, span_self, span_stats)
+
+    def write(self, seconds, samples, span_self, span_stats):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stem = os.path.join(PROFILE_DIR, f"{self.name}-{os.getpid()}-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}")
+        written = []
+        if samples:
+            # One line per stack: frames separated by ';', then the sample count
+            with open(stem + ".samples.folded", 'w') as f:
+                f.writelines(f"{stack} {count}\n" for stack, count in samples.most_common())
+            written.append(stem + ".samples.folded")
+        if span_stats:
+            # Self time in microseconds, so a span's children aren't counted twice
+            with open(stem + ".spans.folded", 'w') as f:
+                f.writelines(f"{path} {max(0, round(self_seconds * 1e6))}\n" for path, self_seconds in span_self.most_common())
+            summary = {
+                "process": self.name,
+                "seconds": round(seconds, 3),
+                "sample_interval": SAMPLE_INTERVAL,
+                "samples": sum(samples.values()),
+                "spans": {
+                    path: {
+                        "count": count,
+                        "total_ms": round(total * 1e3, 3),
+                        "mean_us": round(total / count * 1e6, 1),
+                        "max_us": round(longest * 1e6, 1)
+                    }
+                    for path, (count, total, longest) in sorted(span_stats.items(), key=lambda item: -item[1][1])
+                }
+            }
+            with open(stem + ".spans.json", 'w') as f:
+                json.dump(summary, f, indent=2)
+            written += [stem + ".spans.folded", stem + ".spans.json"]
+        log.info("Wrote profile of %s: %s", self.name, ", ".join(written) or "no samples")
+        return written
+
+# Profiler of this process; name set by install()
+profiler = Profiler(os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0])
+
+def span(name):
+    return profiler.span(name)
+
+def install(name):
+    """Make this process profilable
+
+    Long-running processes start and stop profiling on START_SIGNAL and
+    STOP_SIGNAL (see the CLI below). Setting PROFILE=1 profiles from
+    startup instead, and the profile is written at exit: that is the way
+    to profile the analyzers, which run once per request.
+    """
+    import atexit
+    profiler.name = name
+    if START_SIGNAL is not None and threading.current_thread() is threading.main_thread():
+        signal.signal(START_SIGNAL, lambda sig, frame: profiler.start())
+        signal.signal(STOP_SIGNAL, lambda sig, frame: threading.Thread(target=profiler.stop).start())
+    if os.environ.get('PROFILE') == '1':
+        profiler.start()
+        atexit.register(profiler.stop)
+
+def read_pid(target):
+    if target == "monitor":
+        with open(MONITOR_PID_FILE, 'r') as f:
+            return int(f.read().strip())
+    return int(target)
+
+if __name__ == "__main__":
+    # Usage: python profiling.py start|stop <pid|monitor>
+    if len(sys.argv) < 3 or sys.argv[1] not in ("start", "stop") or START_SIGNAL is None:
+        sys.stderr.write("Usage: python profiling.py start|stop <pid|monitor>\n")
+        sys.exit(1)
+    pid = read_pid(sys.argv[2])
+    os.kill(pid, START_SIGNAL if sys.argv[1] == "start" else STOP_SIGNAL)
+    print(json.dumps({"pid": pid, "profiling": sys.argv[1] == "start"}))
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import random
+import threading
+import numpy as np
+from model_artifacts import ARTIFACTS_DIR, manifest_path
+from model_watcher import ModelHandle, predict_scores
+from log_config import get_logger
+
+log = get_logger("shadow_scoring")
+
+# Path to the ML Models directory
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# A candidate for model <name> is the artifact <name>_candidate
+CANDIDATE_SUFFIX = "_candidate"
+
+# Fraction of scored requests also sent to the candidate
+SAMPLE_RATE = float(os.environ.get('SHADOW_SAMPLE_RATE', '0.1'))
+
+# CPU seconds per second the candidate may use (0.05 = 5% of one core)
+CPU_BUDGET = float(os.environ.get('SHADOW_CPU_BUDGET', '0.05'))
+
+# Seconds between checks for a new candidate version
+CANDIDATE_POLL_INTERVAL = 5
+
+# Shadow logs are rotated to <log>.1 beyond this size
+MAX_LOG_BYTES = 16 * 1024 * 1024
+
+# Fixed-width record for each shadow-scored row (32 bytes)
+SHADOW_DTYPE = np.dtype([
+    ('ts', '<f8'),
+    ('primary_version', '<u2'),
+    ('candidate_version', '<u2'),
+    ('primary_score', '<f4'),
+    ('candidate_score', '<f4'),
+    ('primary_us', '<f4'),
+    ('candidate_us', '<f4'),
+    ('disagree', 'u1'),
+    ('_pad', 'V3'),
+])
+
+# Header of each logged input row (16 bytes); the float32 features follow
+INPUT_HEADER_DTYPE = [
+    ('ts', '<f8'),
+    ('primary_version', '<u2'),
+    ('_pad', 'V2'),
+    ('primary_score', '<f4'),
+    ('primary_us', '<f4'),
+]
+
+def shadow_log_path(name):
+    return os.path.join(ML_DIR, 'scripts', f".shadow_{name}.log")
+
+def input_log_path(name):
+    return os.path.join(ML_DIR, 'scripts', f".shadow_{name}.inputs")
+
+def input_dtype(feature_count):
+    return np.dtype(INPUT_HEADER_DTYPE + [('features', '<f4', (feature_count,))])
+
+def append_records(path, records):
+    """Append records in one write; O_APPEND keeps writes from several processes whole"""
+    try:
+        if os.path.getsize(path) > MAX_LOG_BYTES:
+            os.replace(path, path + '.1')
+    except OSError:
+        pass
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, records.tobytes())
+    finally:
+        os.close(fd)
+
+def read_records(path, dtype=SHADOW_DTYPE):
+    """Read a shadow log, including its rotated predecessor"""
+    parts = [
+        np.fromfile(p, dtype=dtype)
+        for p in (path + '.1', path)
+        if os.path.exists(p)
+    ]
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=dtype)
+
+def log_inputs(name, X, primary_scores, primary_seconds, primary_version=0, sample_rate=SAMPLE_RATE, log_path=None):
+    """Log a sample of scored rows for score_logged_inputs() to shadow-score later
+
+    For one-shot processes such as the analyzers, which shouldn't spend
+    their own time loading and running a candidate.
+    """
+    if sample_rate <= 0 or random.random() >= sample_rate:
+        return
+    X = np.asarray(X, dtype=np.float32)
+    records = np.zeros(len(X), dtype=input_dtype(X.shape[1]))
+    records['ts'] = time.time()
+    records['primary_version'] = primary_version
+    records['primary_score'] = np.asarray(primary_scores, dtype=np.float32).reshape(-1)
+    records['primary_us'] = primary_seconds * 1e6 / len(X)
+    records['features'] = X
+    try:
+        append_records(log_path or input_log_path(name), records)
+    except OSError as e:
+        log.error("Error writing shadow input log: %s", e)
+
+class ShadowScorer:
+    """Scores a sample of requests with a candidate model next to the primary
+
+    The candidate's result is only logged, never returned as the verdict.
+    Sampling caps how often it runs and a CPU token bucket caps how much
+    time it may take, so a slow candidate can't starve the primary.
+    """
+
+    def __init__(self, name, feature_schema=None, sample_rate=SAMPLE_RATE, cpu_budget=CPU_BUDGET,
+                 log_path=None, artifacts_dir=ARTIFACTS_DIR):
+        self.name = name
+        self.candidate_name = name + CANDIDATE_SUFFIX
+        self.feature_schema = feature_schema
+        self.sample_rate = sample_rate
+        self.cpu_budget = cpu_budget
+        self.log_path = log_path or shadow_log_path(name)
+        self.artifacts_dir = artifacts_dir
+        self.handle = None
+        self.checked = 0.0
+        # Start with a full second of budget
+        self.tokens = cpu_budget
+        self.updated = time.monotonic()
+        self.skipped = 0
+        self.lock = threading.Lock()
+
+    def candidate(self):
+        """Return the current candidate artifact, or None if there is none"""
+        now = time.monotonic()
+        if self.handle is None:
+            if not os.path.exists(manifest_path(self.candidate_name, self.artifacts_dir)):
+                return None
+            self.handle = ModelHandle(self.candidate_name, self.feature_schema, artifacts_dir=self.artifacts_dir)
+            self.checked = now
+        elif now - self.checked > CANDIDATE_POLL_INTERVAL:
+            self.checked = now
+            self.handle.reload()
+        return self.handle.get()
+
+    def take_budget(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.cpu_budget, self.tokens + (now - self.updated) * self.cpu_budget)
+            self.updated = now
+            if self.tokens <= 0:
+                self.skipped += 1
+                return False
+            return True
+
+    def charge(self, cpu_seconds):
+        with self.lock:
+            self.tokens -= cpu_seconds
+
+    def score(self, X, primary_scores, primary_seconds, primary_version=0):
+        """Shadow-score rows X the primary scored as primary_scores in primary_seconds
+
+        Returns the candidate scores, or None when the request wasn't sampled.
+        """
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        if not self.take_budget():
+            return None
+        # Loading or reloading the candidate is charged to the budget too
+        cpu_start = time.thread_time()
+        try:
+            artifact = self.candidate()
+            if artifact is None:
+                return None
+
+            X = np.asarray(X, dtype=np.float64)
+            start = time.perf_counter()
+            scores = predict_scores(artifact, X)
+            elapsed = time.perf_counter() - start
+        except Exception as e:
+            log.error("Shadow scoring with %s failed: %s", self.candidate_name, e)
+            return None
+        finally:
+            self.charge(time.thread_time() - cpu_start)
+
+        self.record(artifact, scores, primary_scores, primary_version,
+                    primary_seconds * 1e6 / len(scores), elapsed * 1e6 / len(scores))
+        return scores
+
+    def record(self, artifact, scores, primary_scores, primary_version, primary_us, candidate_us, ts=None):
+        """Append shadow records; latencies are per row, as one value or one per row"""
+        primary_scores = np.asarray(primary_scores, dtype=np.float64).reshape(-1)
+        records = np.zeros(len(scores), dtype=SHADOW_DTYPE)
+        records['ts'] = time.time() if ts is None else ts
+        records['primary_version'] = primary_version
+        records['candidate_version'] = artifact.version
+        records['primary_score'] = primary_scores
+        records['candidate_score'] = scores
+        records['primary_us'] = primary_us
+        records['candidate_us'] = candidate_us
+        records['disagree'] = (primary_scores > 0.5) != (scores > 0.5)
+        try:
+            append_records(self.log_path, records)
+        except OSError as e:
+            log.error("Error writing shadow log: %s", e)
+
+    def score_logged_inputs(self, input_path=None):
+        """Shadow-score the rows log_inputs() logged, then clear them; returns how many
+
+        Rows are scored in one batch, so candidate_us is the batch time per
+        row rather than a single-request latency.
+        """
+        input_path = input_path or input_log_path(self.name)
+        artifact = self.candidate()
+        if artifact is None:
+            return 0
+        schema = self.feature_schema or artifact.feature_schema
+        if not schema:
+            raise ValueError(f"{self.candidate_name} has no feature schema to read logged inputs with")
+
+        # Move the logs aside first, so rows logged meanwhile go to a fresh file
+        parts = []
+        for path in (input_path + '.1', input_path):
+            if os.path.exists(path):
+                os.replace(path, path + '.scoring')
+                parts.append(np.fromfile(path + '.scoring', dtype=input_dtype(len(schema))))
+                os.remove(path + '.scoring')
+        rows = np.concatenate(parts) if parts else np.zeros(0, dtype=input_dtype(len(schema)))
+        if not len(rows):
+            return 0
+
+        start = time.perf_counter()
+        scores = predict_scores(artifact, rows['features'].astype(np.float64))
+        candidate_us = (time.perf_counter() - start) * 1e6 / len(rows)
+        for version in np.unique(rows['primary_version']):
+            mask = rows['primary_version'] == version
+            self.record(artifact, scores[mask], rows['primary_score'][mask], int(version),
+                        rows['primary_us'][mask], candidate_us, rows['ts'][mask])
+        return len(rows)
+
+def percentiles(values):
+    if len(values) == 0:
+        return None
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": round(float(p50), 1), "p95": round(float(p95), 1), "p99": round(float(p99), 1)}
+
+def shadow_report(name, log_path=None):
+    """Summarize agreement and latency between a model and its candidate"""
+    records = read_records(log_path or shadow_log_path(name))
+    if len(records) == 0:
+        return {"name": name, "rows": 0}
+
+    primary_attack = records['primary_score'] > 0.5
+    candidate_attack = records['candidate_score'] > 0.5
+    versions = {}
+    pairs = records['primary_version'].astype(np.uint32) << 16 | records['candidate_version']
+    for pair in np.unique(pairs):
+        mask = pairs == pair
+        versions[f"v{pair >> 16} vs v{pair & 0xFFFF}"] = {
+            "rows": int(mask.sum()),
+            "disagreement_rate": round(float(records['disagree'][mask].mean()), 4)
+        }
+
+    return {
+        "name": name,
+        "rows": int(len(records)),
+        "from": float(records['ts'].min()),
+        "to": float(records['ts'].max()),
+        "disagreements": int(records['disagree'].sum()),
+        "disagreement_rate": round(float(records['disagree'].mean()), 4),
+        "only_primary_attack": int((primary_attack & ~candidate_attack).sum()),
+        "only_candidate_attack": int((candidate_attack & ~primary_attack).sum()),
+        "mean_abs_score_delta": round(float(np.abs(records['candidate_score'] - records['primary_score']).mean()), 4),
+        "latency_us": {
+            "primary": percentiles(records['primary_us']),
+            "candidate": percentiles(records['candidate_us']),
+            "delta": percentiles(records['candidate_us'] - records['primary_us'])
+        },
+        "versions": versions
+    }
+
+if __name__ == "__main__":
+    # Usage: python shadow_scoring.py report|score <model name>
+    if len(sys.argv) < 3 or sys.argv[1] not in ("report", "score"):
+        sys.stderr.write("Usage: python shadow_scoring.py report|score <ddos_model|xss_model>\n")
+        sys.exit(1)
+    if sys.argv[1] == "score":
+        # Shadow-score the inputs the analyzers logged
+        scored = ShadowScorer(sys.argv[2]).score_logged_inputs()
+        print(json.dumps({"name": sys.argv[2], "scored": scored}))
+    else:
+        print(json.dumps(shadow_report(sys.argv[2]), indent=2))
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import signal
+import struct
+import threading
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+from ddos_analyze import DDOS_FEATURES, CANARY_FEATURES, load_artifact_or_fallback, prepare_features, describe_prediction
+from model_watcher import ModelHandle
+from shadow_scoring import ShadowScorer
+from event_stream import publish_event
+from metrics import ANALYSES, INFERENCE_SECONDS
+from log_config import get_logger
+
+log = get_logger("shm_exchange")
+
+# Name of the shared memory segment; on Linux it is the file /dev/shm/<name>
+SHM_NAME = os.environ.get('SHM_EXCHANGE_NAME', 'zkphealth_ddos')
+
+# Requests that can be in flight at once
+SHM_SLOTS = int(os.environ.get('SHM_EXCHANGE_SLOTS', '64'))
+
+# Segment header: magic, layout version, slot count, feature count, slot size,
+# server process ID, requests scored
+HEADER_FORMAT = '<8sIIIIIQ'
+HEADER_SIZE = 64
+SCORED_OFFSET = struct.calcsize('<8sIIIII')
+MAGIC = b'SHMFEAT1'
+LAYOUT_VERSION = 1
+
+# Fixed-width slot, two cache lines so neighbouring slots never share one.
+# state comes first: writers fill the rest of the slot before setting it, and
+# readers check it before reading the rest
+SLOT_DTYPE = np.dtype([
+    ('state', '<u4'),
+    ('seq', '<u4'),
+    ('features', '<f4', (len(DDOS_FEATURES),)),
+    ('probability', '<f4'),
+    ('prediction', '<u4'),
+    ('attack_type', '<u4'),
+    ('_pad', 'V28'),
+])
+
+# Slot states. The client owns FREE and DONE slots, the server REQUEST slots
+FREE = 0
+REQUEST = 1
+DONE = 2
+FAILED = 3
+
+# describe_prediction's attack types, by the code stored in a slot
+ATTACK_TYPES = ["Unknown", "UDP Flood", "HTTP Flood", "TCP Flood"]
+
+# Empty polls the server spins through before it starts sleeping between polls
+SPIN_POLLS = 2000
+
+# Seconds between polls once idle
+IDLE_POLL_INTERVAL = 0.0002
+
+# Seconds a client waits for a verdict
+SCORE_TIMEOUT = 1.0
+
+def attach(name):
+    """Open an existing segment without making this process its owner
+
+    Before Python 3.13 every process that opens a segment registers it with
+    the resource tracker, which unlinks it when that process exits; only the
+    server, which created it, should.
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    return shm
+
+def read_header(shm):
+    magic, version, slots, features, slot_size, server_pid, scored = struct.unpack_from(HEADER_FORMAT, shm.buf, 0)
+    if (magic, version, features, slot_size) != (MAGIC, LAYOUT_VERSION, len(DDOS_FEATURES), SLOT_DTYPE.itemsize):
+        raise ValueError(f"Shared memory {shm.name} has an unknown layout")
+    return slots, server_pid, scored
+
+class ShmExchange:
+    """Server side of the shared-memory feature exchange
+
+    The segment is a header and a ring of SHM_SLOTS fixed-width slots.
+    A client writes a feature row (float32, in DDOS_FEATURES order) into
+    a slot and then sets its state to REQUEST; the server scores every
+    REQUEST slot it finds in one predict_proba call, writes each result
+    and then sets the state to DONE (or FAILED). The client reads the
+    result and the slot is free again. Nothing is serialized and no
+    process is spawned per request.
+
+    Slot layout (little-endian, 128 bytes):
+
+        0   u32  state (FREE 0, REQUEST 1, DONE 2, FAILED 3)
+        4   u32  seq, chosen by the client and left untouched
+        8   f32  features[20]
+        88  f32  probability
+        92  u32  prediction (0 or 1)
+        96  u32  attack_type, an index into ATTACK_TYPES
+        100      padding
+
+    Slots start at HEADER_SIZE. Each segment has one client, which uses
+    the slots in order and keeps at most SHM_SLOTS requests in flight;
+    give each client its own segment name.
+    """
+
+    def __init__(self, name=SHM_NAME, slots=SHM_SLOTS):
+        size = HEADER_SIZE + slots * SLOT_DTYPE.itemsize
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a server that was killed; nobody else creates it
+            stale = attach(name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.name = name
+        self.slots = np.ndarray(slots, dtype=SLOT_DTYPE, buffer=self.shm.buf, offset=HEADER_SIZE)
+        self.slots[:] = np.zeros(1, dtype=SLOT_DTYPE)
+        self.scored = 0
+        struct.pack_into(
+            HEADER_FORMAT, self.shm.buf, 0,
+            MAGIC, LAYOUT_VERSION, slots, len(DDOS_FEATURES), SLOT_DTYPE.itemsize, os.getpid(), 0
+        )
+        self.stopped = threading.Event()
+        # Shadow scoring against ddos_model_candidate, when one is deployed
+        self.shadow = ShadowScorer('ddos_model', DDOS_FEATURES)
+
+    def poll(self, model):
+        """Score every slot waiting for a verdict; returns how many"""
+        ready = np.flatnonzero(self.slots['state'] == REQUEST)
+        if not ready.size:
+            return 0
+        artifact = model.get()
+        features = self.slots['features'][ready].astype(np.float64)
+        try:
+            start = time.perf_counter()
+            probabilities = artifact.predictor().predict_proba(features)[:, 1]
+            elapsed = time.perf_counter() - start
+            INFERENCE_SECONDS.labels("ddos_model").observe(elapsed)
+        except Exception as e:
+            log.error("Error scoring %s shared memory requests: %s", ready.size, e)
+            self.slots['state'][ready] = FAILED
+            return ready.size
+
+        results = [describe_prediction(row, probability) for row, probability in zip(features, probabilities)]
+        self.slots['probability'][ready] = probabilities
+        self.slots['prediction'][ready] = [result["prediction"] for result in results]
+        self.slots['attack_type'][ready] = [ATTACK_TYPES.index(result["attack_type"]) for result in results]
+        # Results are in place before any state says so
+        self.slots['state'][ready] = DONE
+
+        self.scored += ready.size
+        struct.pack_into('<Q', self.shm.buf, SCORED_OFFSET, self.scored)
+        for result in results:
+            ANALYSES.labels("ddos", "shm_exchange", "attack" if result["is_attack"] else "normal").inc()
+            publish_event("ddos_analysis", result)
+
+        # Compare with the candidate model, if any, once the verdicts are out
+        self.shadow.score(features, probabilities, elapsed, artifact.version)
+        return ready.size
+
+    def serve(self, model):
+        """Poll until stop(), spinning while busy and sleeping once idle"""
+        empty = 0
+        while not self.stopped.is_set():
+            if self.poll(model):
+                empty = 0
+            elif empty < SPIN_POLLS:
+                empty += 1
+                time.sleep(0)
+            else:
+                time.sleep(IDLE_POLL_INTERVAL)
+
+    def stop(self):
+        self.stopped.set()
+
+    def close(self):
+        # The slot view must go before the buffer it points into
+        del self.slots
+        self.shm.close()
+        self.shm.unlink()
+
+class ShmClient:
+    """Reference client for the exchange; the Node client does the same with pwrite/pread"""
+
+    def __init__(self, name=SHM_NAME):
+        self.shm = attach(name)
+        slot_count, self.server_pid, _ = read_header(self.shm)
+        self.slots = np.ndarray(slot_count, dtype=SLOT_DTYPE, buffer=self.shm.buf, offset=HEADER_SIZE)
+        self.next_seq = 0
+
+    def submit(self, row):
+        """Queue one feature row; returns the slot to collect the verdict from"""
+        slot = self.next_seq % len(self.slots)
+        if self.slots['state'][slot] == REQUEST:
+            raise RuntimeError(f"All {len(self.slots)} shared memory slots are in flight")
+        self.slots['seq'][slot] = self.next_seq & 0xFFFFFFFF
+        self.slots['features'][slot] = row
+        self.slots['state'][slot] = REQUEST
+        self.next_seq += 1
+        return slot
+
+    def result(self, slot, timeout=SCORE_TIMEOUT):
+        """Wait for a slot's verdict, in describe_prediction's format, or None on timeout"""
+        deadline = time.perf_counter() + timeout
+        polls = 0
+        while self.slots['state'][slot] == REQUEST:
+            if time.perf_counter() > deadline:
+                return None
+            polls += 1
+            time.sleep(0 if polls < SPIN_POLLS else IDLE_POLL_INTERVAL)
+        entry = self.slots[slot]
+        state = int(entry['state'])
+        self.slots['state'][slot] = FREE
+        if state != DONE:
+            return {"error": "Scoring failed", "is_attack": False, "confidence": 0, "prediction": 0}
+        return {
+            "is_attack": bool(entry['prediction']),
+            "prediction": int(entry['prediction']),
+            # Stored as float32; rounded so 0.41 doesn't read back as 0.4099999964
+            "confidence": round(float(entry['probability']), 6),
+            "attack_type": ATTACK_TYPES[int(entry['attack_type'])]
+        }
+
+    def score(self, data, timeout=SCORE_TIMEOUT):
+        """Score a features object as ddos_analyze.py takes it on the command line"""
+        return self.result(self.submit(prepare_features(data)[0]), timeout)
+
+    def close(self):
+        del self.slots
+        self.shm.close()
+
+def run_server(name=SHM_NAME, slots=SHM_SLOTS):
+    """Serve the DDoS model over shared memory until SIGTERM or Ctrl+C"""
+    # Make sure there is a model to serve before the handle looks for one
+    load_artifact_or_fallback()
+    model = ModelHandle('ddos_model', DDOS_FEATURES, CANARY_FEATURES).start()
+    exchange = ShmExchange(name, slots)
+    log.info("Scoring DDoS features in shared memory %s (%s slots)", name, slots)
+    try:
+        exchange.serve(model)
+    except KeyboardInterrupt:
+        log.info("Shutting down shared memory exchange")
+    finally:
+        model.stop()
+        exchange.close()
+
+if __name__ == "__main__":
+    # Usage: python shm_exchange.py [serve] | score '<features JSON>'
+    if len(sys.argv) > 2 and sys.argv[1] == "score":
+        client = ShmClient()
+        print(json.dumps(client.score(json.loads(sys.argv[2]))))
+        client.close()
+        sys.exit(0)
+    # Exit through run_server's cleanup on SIGTERM as well as Ctrl+C
+    signal.signal(signal.SIGTERM, lambda sig, frame: sys.exit(0))
+    run_server()
@@ -1,37 +1,23 @@
 #!/usr/bin/env python3
-import os
-import sys
 import json
-import subprocess
 import time
+from probe_engine import ProbeEngine
 
-# Path to the ML Models directory
-ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-SCRIPTS_DIR = os.path.join(ML_DIR, 'scripts')
-DDOS_SCRIPT = os.path.join(SCRIPTS_DIR, 'ddos_analyze.py')
+# Scores every test in this process, loading the model once
+engine = None
 
-def run_ml_model(features):
-    """Send features to the ML model and return the response"""
+def run_ml_model(features, live=True):
+    """Score features with the ML model and return ddos_analyze.py's response
+
+    live=False for rows taken from the training data, which are already at its scale.
+    """
+    global engine
     try:
-        # Convert features to JSON string
-        features_json = json.dumps(features)
-        
-        # Path to Python interpreter (assuming it's in a virtual environment)
-        python_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(ML_DIR))), 'venv/bin/python')
-        if not os.path.exists(python_path):
-            python_path = 'python'  # Fall back to system Python
-        
-        # Call the ML model script with the features
-        cmd = [python_path, DDOS_SCRIPT, features_json]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        
-        # Parse the JSON response
-        response = json.loads(result.stdout.strip())
-        return response
+        if engine is None:
+            engine = ProbeEngine()
+        return engine.probe(features, live)
     except Exception as e:
         print(f"Error running ML model: {e}")
-        print(f"Stdout: {result.stdout if 'result' in locals() else 'N/A'}")
-        print(f"Stderr: {result.stderr if 'result' in locals() else 'N/A'}")
         return {"error": str(e), "is_attack": False, "confidence": 0}
 
 def print_header(title):
@@ -158,7 +144,7 @@ if __name__ == "__main__":
     print("Sending features at the scale the model was trained on:")
     print(json.dumps(training_scale_features, indent=2))
     
-    response = run_ml_model(training_scale_features)
+    response = run_ml_model(training_scale_features, live=False)
     print("\nML Model Response:")
     print(json.dumps(response, indent=2))
     print(f"\nDetected as attack: {'YES' if response.get('is_attack') else 'NO'}")
@@ -169,7 +155,7 @@ if __name__ == "__main__":
     print("Sending a known attack pattern from the training data:")
     print(json.dumps(known_attack_features, indent=2))
     
-    response = run_ml_model(known_attack_features)
+    response = run_ml_model(known_attack_features, live=False)
     print("\nML Model Response:")
     print(json.dumps(response, indent=2))
     print(f"\nDetected as attack: {'YES' if response.get('is_attack') else 'NO'}")
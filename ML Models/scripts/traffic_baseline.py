@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+import os
+import json
+import math
+import datetime
+from collections import OrderedDict
+from log_config import get_logger
+
+log = get_logger("traffic_baseline")
+
+# Path to the ML Models directory
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# File the learned baselines persist to between restarts
+BASELINE_FILE = os.path.join(ML_DIR, 'scripts', '.ddos_baseline.json')
+
+# Metrics tracked for every target service
+METRICS = ["packets_per_second", "syn_ratio", "unique_sources", "bytes_per_flow"]
+
+# Smoothing factor for the EWMA mean and variance (about a 5 minute memory at one sample per second)
+ALPHA = 0.0033
+
+# Samples needed before a baseline produces scores
+MIN_SAMPLES = 60
+
+# Absolute z-score reported as an anomaly
+Z_THRESHOLD = 4.0
+
+# Anomalous samples in a row a key skips learning from (5 minutes at one a
+# second); past that the change is taken as the key's new normal
+MAX_SKIPPED_SAMPLES = 300
+
+# Most target keys tracked at once; the least recently seen is dropped
+MAX_KEYS = 1024
+
+class EwmaStat:
+    """Exponentially weighted mean and variance of one metric"""
+
+    __slots__ = ('mean', 'var', 'count')
+
+    def __init__(self, mean=0.0, var=0.0, count=0):
+        self.mean = mean
+        self.var = var
+        self.count = count
+
+    def score(self, value):
+        """Return the z-score of value, or None while the baseline is warming up"""
+        if self.count < MIN_SAMPLES:
+            return None
+        # The floor keeps near-constant metrics from producing huge scores
+        std = math.sqrt(self.var) + max(1e-3, abs(self.mean) * 0.01)
+        return (value - self.mean) / std
+
+    def update(self, value, alpha=ALPHA):
+        # Learn quickly until warmed up, then settle to alpha
+        alpha = max(alpha, 1.0 / (self.count + 1))
+        diff = value - self.mean
+        increment = alpha * diff
+        self.mean += increment
+        self.var = (1 - alpha) * (self.var + diff * increment)
+        self.count += 1
+
+class KeyBaseline:
+    """Overall and hour-of-day baselines for one target key
+
+    The hourly baselines capture the daily traffic pattern; until an hour
+    has warmed up, scores come from the overall baseline instead.
+    """
+
+    __slots__ = ('overall', 'hourly', 'skipped')
+
+    def __init__(self):
+        self.overall = [EwmaStat() for _ in METRICS]
+        self.hourly = [[EwmaStat() for _ in METRICS] for _ in range(24)]
+        # Anomalous samples skipped in a row
+        self.skipped = 0
+
+    def observe(self, values, hour):
+        """Score values against the baseline, then learn from them
+
+        A sample with any metric past Z_THRESHOLD isn't learned from, so an
+        ongoing attack can't drag the baseline up until it looks normal;
+        after MAX_SKIPPED_SAMPLES of them in a row learning resumes, so a
+        lasting change in the key's traffic becomes its baseline.
+        """
+        scores = {}
+        observed = []
+        for i, value in enumerate(values):
+            if value is None or not math.isfinite(value):
+                continue
+            seasonal = self.hourly[hour][i]
+            score = seasonal.score(value)
+            if score is None:
+                score = self.overall[i].score(value)
+            if score is not None:
+                scores[METRICS[i]] = score
+            observed.append((i, value))
+
+        if any(abs(score) >= Z_THRESHOLD for score in scores.values()):
+            if self.skipped < MAX_SKIPPED_SAMPLES:
+                self.skipped += 1
+                return scores
+        else:
+            self.skipped = 0
+        for i, value in observed:
+            self.hourly[hour][i].update(value)
+            self.overall[i].update(value)
+        return scores
+
+    def to_json(self):
+        return {
+            "overall": [[s.mean, s.var, s.count] for s in self.overall],
+            "hourly": [[[s.mean, s.var, s.count] for s in stats] for stats in self.hourly]
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        baseline = cls()
+        baseline.overall = [EwmaStat(*s) for s in data["overall"]]
+        baseline.hourly = [[EwmaStat(*s) for s in stats] for stats in data["hourly"]]
+        return baseline
+
+class TrafficBaseline:
+    """Streaming per-target baselines producing z-score anomaly scores"""
+
+    def __init__(self, path=BASELINE_FILE):
+        self.path = path
+        self.keys = OrderedDict()
+
+    def observe(self, key, metrics, now=None):
+        """Score and learn one sample of metrics for key; return the z-scores"""
+        baseline = self.keys.get(key)
+        if baseline is None:
+            baseline = self.keys[key] = KeyBaseline()
+            if len(self.keys) > MAX_KEYS:
+                self.keys.popitem(last=False)
+        else:
+            self.keys.move_to_end(key)
+
+        hour = (now or datetime.datetime.now()).hour
+        return baseline.observe([metrics.get(name) for name in METRICS], hour)
+
+    def anomalies(self, key, scores):
+        """Return the scores of key that cross Z_THRESHOLD"""
+        return [
+            {"key": key, "metric": metric, "z_score": round(score, 2)}
+            for metric, score in scores.items()
+            if abs(score) >= Z_THRESHOLD
+        ]
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            if data.get("metrics") != METRICS:
+                log.warning("Baseline metrics changed, starting new baselines")
+                return
+            self.keys = OrderedDict(
+                (key, KeyBaseline.from_json(value)) for key, value in data["keys"].items()
+            )
+            log.info("Loaded traffic baselines for %s targets", len(self.keys))
+        except Exception as e:
+            log.error("Error loading traffic baselines: %s", e)
+
+    def save(self):
+        data = {
+            "metrics": METRICS,
+            "keys": {key: baseline.to_json() for key, baseline in self.keys.items()}
+        }
+        # Write to a temporary file first so a crash can't leave half a file
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(temp_path, self.path)
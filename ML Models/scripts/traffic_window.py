@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+import time
+import threading
+from collections import deque
+import numpy as np
+from packet_record import FLAG_SYN, FLAG_ACK, FLAG_PSH, PROTOCOL_NAMES
+
+# Packet batch layout used by the window engine
+PACKET_DTYPE = np.dtype([
+    ('ts_ns', '<i8'),
+    ('src_ip', '<u4'),
+    ('dst_ip', '<u4'),
+    ('src_port', '<u2'),
+    ('dst_port', '<u2'),
+    ('size', '<u2'),
+    ('ttl', 'u1'),
+    ('protocol', 'u1'),
+    ('flags', 'u1'),
+])
+
+# Ports whose TCP traffic counts as HTTP requests
+HTTP_PORTS = np.array([80, 443, 3001, 8080], dtype=np.uint16)
+
+# Default sliding window length
+WINDOW_SECONDS = 10
+
+# Shortest span rates are computed over, so the first packets don't give huge rates
+MIN_COVERED_SECONDS = 1.0
+
+def records_to_array(records):
+    """Pack a list of PacketRecords into a packet batch, clamping sizes to the u16 field as packet_ring does"""
+    return np.array([
+        (r.ts_ns, r.src_ip, r.dst_ip, r.src_port, r.dst_port, min(r.size, 0xFFFF), r.ttl, r.protocol, r.flags)
+        for r in records
+    ], dtype=PACKET_DTYPE)
+
+def group_counts(keys, mask=None, weights=None):
+    """Return (unique keys, per-key totals) for the selected rows"""
+    if mask is not None:
+        keys = keys[mask]
+        weights = weights[mask] if weights is not None else None
+    if keys.size == 0:
+        return keys, np.zeros(0, dtype=np.int64)
+    unique, inverse = np.unique(keys, return_inverse=True)
+    totals = np.bincount(inverse, weights=weights, minlength=unique.size)
+    return unique, totals
+
+def top_key(keys, counts):
+    """Return (key, count) for the largest group, or (None, 0)"""
+    if counts.size == 0:
+        return None, 0
+    index = int(np.argmax(counts))
+    return int(keys[index]), int(counts[index])
+
+def flow_keys(batch):
+    """Return a dense flow index for each packet, grouping by 5-tuple"""
+    endpoints = (batch['src_ip'].astype(np.uint64) << np.uint64(32)) | batch['dst_ip']
+    ports = (
+        (batch['src_port'].astype(np.uint64) << np.uint64(24))
+        | (batch['dst_port'].astype(np.uint64) << np.uint64(8))
+        | batch['protocol']
+    )
+
+    # Sort by both halves of the key and number each run of equal keys;
+    # much faster than np.unique(axis=0) on the stacked pairs
+    order = np.lexsort((ports, endpoints))
+    endpoints = endpoints[order]
+    ports = ports[order]
+    new_flow = np.ones(len(order), dtype=bool)
+    new_flow[1:] = (endpoints[1:] != endpoints[:-1]) | (ports[1:] != ports[:-1])
+    inverse = np.empty(len(order), dtype=np.int64)
+    inverse[order] = np.cumsum(new_flow) - 1
+    return inverse
+
+def window_stats(batch, duration):
+    """Compute group-by aggregates over one window of packets"""
+    count = len(batch)
+    flags = batch['flags']
+    protocol = batch['protocol']
+    src_ip = batch['src_ip']
+    size = batch['size'].astype(np.int64)
+
+    syn_only = ((flags & FLAG_SYN) != 0) & ((flags & FLAG_ACK) == 0)
+    udp = protocol == 17
+    http = (protocol == 6) & np.isin(batch['dst_port'], HTTP_PORTS) & ((flags & FLAG_PSH) != 0)
+
+    syn_sources, syn_counts = group_counts(src_ip, syn_only)
+    udp_sources, udp_counts = group_counts(src_ip, udp)
+    http_sources, http_counts = group_counts(src_ip, http)
+    ports, port_counts = group_counts(batch['dst_port'])
+    protocols, protocol_counts = group_counts(protocol)
+
+    if count:
+        flows = flow_keys(batch)
+        flow_count = int(flows.max()) + 1
+        flow_bytes = np.bincount(flows, weights=size, minlength=flow_count)
+    else:
+        flow_count = 0
+        flow_bytes = np.zeros(0)
+
+    # Count of packets carrying each TCP flag, one column per bit
+    flag_counts = np.unpackbits(flags[:, None], axis=1, bitorder='little').sum(axis=0)
+
+    return {
+        "packets": count,
+        "bytes": int(size.sum()),
+        "duration": duration,
+        "packets_per_second": count / duration if duration else 0.0,
+        "unique_sources": int(np.unique(src_ip).size),
+        "flows": flow_count,
+        "bytes_per_flow": float(flow_bytes.mean()) if flow_count else 0.0,
+        "syn_per_source": dict(zip(syn_sources.tolist(), syn_counts.tolist())),
+        "udp_per_source": dict(zip(udp_sources.tolist(), udp_counts.tolist())),
+        "http_per_source": dict(zip(http_sources.tolist(), http_counts.tolist())),
+        "top_syn_source": top_key(syn_sources, syn_counts),
+        "top_udp_source": top_key(udp_sources, udp_counts),
+        "top_http_source": top_key(http_sources, http_counts),
+        "top_port": top_key(ports, port_counts),
+        "top_protocol": top_key(protocols, protocol_counts),
+        "flag_counts": {
+            "syn": int(flag_counts[1]),
+            "ack": int(flag_counts[4]),
+            "psh": int(flag_counts[3]),
+            "rst": int(flag_counts[2]),
+            "fin": int(flag_counts[0])
+        }
+    }
+
+def target_stats(batch, duration):
+    """Compute per-destination-port metrics for the traffic baselines"""
+    if len(batch) == 0:
+        return {}
+    ports, inverse = np.unique(batch['dst_port'], return_inverse=True)
+    flags = batch['flags']
+    syn_only = ((flags & FLAG_SYN) != 0) & ((flags & FLAG_ACK) == 0)
+
+    packets = np.bincount(inverse, minlength=ports.size)
+    syn = np.bincount(inverse, weights=syn_only, minlength=ports.size)
+    size = np.bincount(inverse, weights=batch['size'], minlength=ports.size)
+
+    # Distinct (port, source) pairs, counted per port
+    pairs = np.unique((batch['dst_port'].astype(np.uint64) << np.uint64(32)) | batch['src_ip'])
+    sources = np.bincount(np.searchsorted(ports, pairs >> np.uint64(32)), minlength=ports.size)
+
+    # Each flow belongs to the port of its first packet
+    _, first_packet = np.unique(flow_keys(batch), return_index=True)
+    flows = np.bincount(inverse[first_packet], minlength=ports.size)
+
+    return {
+        int(port): {
+            "packets_per_second": float(packets[i] / duration),
+            "syn_ratio": float(syn[i] / packets[i]),
+            "unique_sources": int(sources[i]),
+            "bytes_per_flow": float(size[i] / max(1, flows[i]))
+        }
+        for i, port in enumerate(ports)
+    }
+
+def model_features(stats):
+    """Build the feature dict expected by ddos_analyze.prepare_features"""
+    packets = stats["packets"]
+    divisor = max(1, packets)
+    flows = max(1, stats["flows"])
+    protocol, _ = stats["top_protocol"]
+    port, _ = stats["top_port"]
+    return {
+        "Protocol": PROTOCOL_NAMES.get(protocol, "TCP"),
+        "pktcount": packets,
+        "bytecount": stats["bytes"],
+        "dur": stats["duration"],
+        "flows": stats["flows"],
+        "packetins": packets,
+        "port_no": port if port is not None else 80,
+        "pktrate": stats["packets_per_second"],
+        "pktperflow": packets / flows,
+        "byteperflow": stats["bytes_per_flow"],
+        "tx_bytes": stats["bytes"],
+        "rx_bytes": 0,
+        "syn_flag": stats["flag_counts"]["syn"] / divisor,
+        "ack_flag": stats["flag_counts"]["ack"] / divisor,
+        "psh_flag": stats["flag_counts"]["psh"] / divisor,
+        "rst_flag": stats["flag_counts"]["rst"] / divisor,
+        "fin_flag": stats["flag_counts"]["fin"] / divisor
+    }
+
+class TrafficWindow:
+    """Sliding window over batches of captured packets"""
+
+    def __init__(self, window_seconds=WINDOW_SECONDS):
+        self.window_ns = int(window_seconds * 1e9)
+        self.batches = deque()
+        self.pending = deque()
+        # Timestamp of the first packet ever added; until the window is full it covers less than window_ns
+        self.first_ns = None
+        self.lock = threading.Lock()
+
+    def add_record(self, record):
+        """Queue a PacketRecord from the capture thread"""
+        self.pending.append(record)
+
+    def add_batch(self, batch):
+        if len(batch):
+            with self.lock:
+                if self.first_ns is None:
+                    self.first_ns = int(batch['ts_ns'].min())
+                self.batches.append(batch)
+
+    def flush(self):
+        """Move queued records into the window as one batch, and return it"""
+        # Drain only what is queued now; the capture thread keeps appending
+        pending = [self.pending.popleft() for _ in range(len(self.pending))]
+        if not pending:
+            return None
+        batch = records_to_array(pending)
+        self.add_batch(batch)
+        return batch
+
+    def expire(self, now_ns=None):
+        """Drop packets older than the window"""
+        cutoff = (now_ns if now_ns is not None else time.time_ns()) - self.window_ns
+        with self.lock:
+            while self.batches and self.batches[0]['ts_ns'][-1] < cutoff:
+                self.batches.popleft()
+            if self.batches and self.batches[0]['ts_ns'][0] < cutoff:
+                first = self.batches[0]
+                self.batches[0] = first[first['ts_ns'] >= cutoff]
+
+    def packets(self):
+        with self.lock:
+            batches = list(self.batches)
+        if not batches:
+            return np.zeros(0, dtype=PACKET_DTYPE)
+        return np.concatenate(batches)
+
+    def covered_seconds(self, batch):
+        """Seconds the window's packets actually span: the full window once it has
+        filled, less right after startup, never under MIN_COVERED_SECONDS"""
+        if len(batch) == 0 or self.first_ns is None:
+            return self.window_ns / 1e9
+        covered = min(self.window_ns, int(batch['ts_ns'].max()) - self.first_ns) / 1e9
+        return max(MIN_COVERED_SECONDS, covered)
+
+    def target_stats(self):
+        """Per-port metrics over the window as of the last stats() call"""
+        packets = self.packets()
+        return target_stats(packets, self.covered_seconds(packets))
+
+    def stats(self, now_ns=None, flush=True):
+        """Flush, expire and aggregate the current window
+
+        Pass flush=False when the caller has just flushed and fed the batch
+        elsewhere, so records queued since then wait for its next flush.
+        """
+        if flush:
+            self.flush()
+        self.expire(now_ns)
+        packets = self.packets()
+        return window_stats(packets, self.covered_seconds(packets))
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import resource
+import warnings
+import numpy as np
+from model_artifacts import ARTIFACTS_DIR, save_artifact
+from shadow_scoring import CANDIDATE_SUFFIX
+
+warnings.filterwarnings("ignore")
+
+# Path to the ML Models directory
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DDOS_DATA_PATH = os.path.join(ML_DIR, 'data', 'dataset_sdn.csv')
+
+# Same seed and split as the notebooks, so runs are reproducible
+RANDOM_STATE = 42
+TEST_SIZE = 0.2
+
+# Rows parsed per pandas chunk when reading the DDoS CSV
+CSV_CHUNK_ROWS = 100000
+
+# Cores used to grow trees (-1 = all)
+N_JOBS = int(os.environ.get('TRAIN_N_JOBS', '-1'))
+
+# Forest settings of the bundled models
+DDOS_FOREST = {"n_estimators": 100}
+XSS_FOREST = {"n_estimators": 20, "max_depth": 12}
+
+class Stopwatch:
+    """Wall time and peak resident memory of each training stage"""
+
+    def __init__(self):
+        self.stages = {}
+
+    def stage(self, name, start):
+        self.stages[name] = {
+            "seconds": round(time.perf_counter() - start, 2),
+            # ru_maxrss is in kilobytes on Linux
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        }
+        sys.stderr.write(f"{name}: {self.stages[name]['seconds']}s\n")
+        return time.perf_counter()
+
+def load_ddos_csv(path, features, label="label"):
+    """Read only the feature and label columns, chunk by chunk, as float32
+
+    Feature columns the CSV doesn't have are zero-filled, so the model keeps
+    the serving schema, and returned in the list of missing columns.
+    """
+    import pandas as pd
+    from ddos_analyze import encode_protocol
+    header = pd.read_csv(path, nrows=0).columns
+    present = [name for name in features if name in header]
+    missing = [name for name in features if name not in header]
+    dtypes = {name: np.float32 for name in present}
+    dtypes["Protocol"] = "category"
+    dtypes[label] = np.float32
+
+    X_parts, y_parts = [], []
+    for chunk in pd.read_csv(path, usecols=present + [label], dtype=dtypes, chunksize=CSV_CHUNK_ROWS):
+        if "Protocol" in present:
+            # Encoded exactly as prepare_features encodes it at serving time
+            chunk["Protocol"] = chunk["Protocol"].map(encode_protocol).astype(np.float32)
+        chunk = chunk.dropna()
+        part = np.zeros((len(chunk), len(features)), dtype=np.float32)
+        for name in present:
+            part[:, features.index(name)] = chunk[name].to_numpy()
+        X_parts.append(part)
+        y_parts.append(chunk[label].to_numpy().astype(np.int8))
+    return np.concatenate(X_parts), np.concatenate(y_parts), missing
+
+def load_live_sample(path):
+    """Feature rows from a JSON-lines file of live ddos_analyze.py inputs"""
+    from ddos_analyze import prepare_features
+    with open(path, 'r') as f:
+        rows = [prepare_features(json.loads(line))[0] for line in f if line.strip()]
+    return np.array(rows) if rows else None
+
+def fit_forest(X, y, params, scaler_schema=None, live=None):
+    """Fit a forest on a deterministic split, through a FeatureScaler if given a schema
+
+    Returns (model, scaler, scaled test rows, test labels).
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import train_test_split
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=TEST_SIZE, random_state=RANDOM_STATE, stratify=y
+    )
+    scaler = None
+    if scaler_schema is not None:
+        from feature_scaler import FeatureScaler
+        # Fitted on the training rows only, so the test rows stay unseen
+        scaler = FeatureScaler.fit(X_train, scaler_schema, live)
+        X_train, X_test = scaler.transform(X_train), scaler.transform(X_test)
+    model = RandomForestClassifier(n_jobs=N_JOBS, random_state=RANDOM_STATE, **params)
+    model.fit(X_train, y_train)
+    # Serving scores a row at a time, where a thread pool per call only adds overhead
+    model.n_jobs = None
+    return model, scaler, X_test, y_test
+
+def evaluate(model, X_test, y_test):
+    from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
+    predicted = model.predict(X_test)
+    return {
+        "test_rows": int(len(y_test)),
+        "accuracy": round(float(accuracy_score(y_test, predicted)), 4),
+        "precision": round(float(precision_score(y_test, predicted, zero_division=0)), 4),
+        "recall": round(float(recall_score(y_test, predicted, zero_division=0)), 4),
+        "f1": round(float(f1_score(y_test, predicted, zero_division=0)), 4)
+    }
+
+def train(name, load, params, feature_schema, candidate=False, artifacts_dir=ARTIFACTS_DIR, scaled=False,
+          live=None):
+    """Load data, fit and evaluate a forest, and save it as a served artifact"""
+    stopwatch = Stopwatch()
+    start = time.perf_counter()
+    X, y, notes = load()
+    start = stopwatch.stage("load", start)
+
+    model, scaler, X_test, y_test = fit_forest(X, y, params, feature_schema if scaled else None, live)
+    start = stopwatch.stage("fit", start)
+    metrics = evaluate(model, X_test, y_test)
+    start = stopwatch.stage("evaluate", start)
+
+    report = {
+        "rows": int(len(X)),
+        "features": int(X.shape[1]),
+        "dataset_mb": round(X.nbytes / 1e6, 1),
+        "params": params,
+        "n_jobs": N_JOBS,
+        "random_state": RANDOM_STATE,
+        "metrics": metrics
+    }
+    report.update(notes)
+    if scaler is not None:
+        report["scaler"] = {
+            "version": scaler.version,
+            "log_features": [n for n, log in zip(feature_schema, scaler.log_mask) if log],
+            "live_rows": int(len(live)) if live is not None else 0
+        }
+    # Shared with the stopwatch, so the printed report also gets the save stage
+    report["stages"] = stopwatch.stages
+
+    artifact_name = name + CANDIDATE_SUFFIX if candidate else name
+    manifest = save_artifact(model, artifact_name, feature_schema, metadata={"training": report},
+                             artifacts_dir=artifacts_dir, scaler=scaler)
+    stopwatch.stage("save", start)
+    report["artifact"] = artifact_name
+    report["version"] = manifest["version"]
+    return report
+
+def train_ddos(data_path=DDOS_DATA_PATH, candidate=False, artifacts_dir=ARTIFACTS_DIR, live_path=None):
+    """Train the DDoS forest behind a FeatureScaler
+
+    live_path is an optional JSON-lines sample of live feature dicts; the
+    scaler's live gain maps that traffic onto the training rows' scale.
+    """
+    from ddos_analyze import DDOS_FEATURES
+    live = load_live_sample(live_path) if live_path else None
+
+    def load():
+        X, y, missing = load_ddos_csv(data_path, DDOS_FEATURES)
+        if missing:
+            sys.stderr.write(f"{data_path} has no {', '.join(missing)}; training with them as 0\n")
+        return X, y, {"source": os.path.basename(data_path), "missing_features": missing}
+
+    return train("ddos_model", load, DDOS_FOREST, DDOS_FEATURES, candidate, artifacts_dir, scaled=True, live=live)
+
+def train_xss(data_path=None, candidate=False, artifacts_dir=ARTIFACTS_DIR):
+    from xss_dataset import DATA_PATH, XSS_FEATURES, build_dataset, load_dataset
+
+    def load():
+        # Reuses finished embeddings; only missing chunks are embedded
+        embedding = build_dataset(data_path or DATA_PATH, artifacts_dir=artifacts_dir)
+        X, y = load_dataset(artifacts_dir)
+        return X, y, {"source": os.path.basename(data_path or DATA_PATH), "embedding": embedding}
+
+    return train("xss_model", load, XSS_FOREST, XSS_FEATURES, candidate, artifacts_dir)
+
+if __name__ == "__main__":
+    # Usage: python train_models.py ddos|xss [data.csv] [--candidate] [--live live.jsonl]
+    args = sys.argv[1:]
+    live_path = None
+    if "--live" in args:
+        live_path = args[args.index("--live") + 1]
+        args.remove("--live")
+        args.remove(live_path)
+    args = [arg for arg in args if arg != "--candidate"]
+    if not args or args[0] not in ("ddos", "xss"):
+        sys.stderr.write("Usage: python train_models.py ddos|xss [data.csv] [--candidate] [--live live.jsonl]\n")
+        sys.exit(1)
+
+    trainer = train_ddos if args[0] == "ddos" else train_xss
+    kwargs = {"candidate": "--candidate" in sys.argv}
+    if live_path:
+        if trainer is not train_ddos:
+            sys.stderr.write("--live only applies to the DDoS model\n")
+            sys.exit(1)
+        kwargs["live_path"] = live_path
+    if len(args) > 1:
+        kwargs["data_path"] = args[1]
+    print(json.dumps(trainer(**kwargs), indent=2))
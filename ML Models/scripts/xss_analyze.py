@@ -2,11 +2,21 @@
 import json
 import sys
 import re
+import atexit
 import os
+import time
 import random
-import pickle
 import numpy as np
 import warnings
+from event_stream import publish_event
+from model_artifacts import load_artifact, ArtifactError
+from shadow_scoring import log_inputs
+from xss_dataset import EMBEDDING_MODEL_NAME, XSS_FEATURES
+from metrics import push_metrics, ANALYSES, INFERENCE_SECONDS
+from profiling import install, span
+from log_config import get_logger
+
+log = get_logger("xss_analyze")
 
 # Redirect warnings to stderr to avoid interfering with JSON output
 warnings.filterwarnings("ignore")
@@ -21,7 +31,7 @@ try:
     from llama_index.embeddings.huggingface import HuggingFaceEmbedding
     EMBEDDING_AVAILABLE = True
 except ImportError:
-    sys.stderr.write("Warning: HuggingFaceEmbedding not available. Falling back to pattern matching.\n")
+    log.warning("HuggingFaceEmbedding not available, falling back to pattern matching")
     EMBEDDING_AVAILABLE = False
 
 # Common XSS patterns to detect (fallback if ML model is not available)
@@ -43,19 +53,16 @@ XSS_PATTERNS = [
     r'<style.*?expression',
 ]
 
-# Load the trained model
+# Load the trained model artifact
 def load_model():
-    model_path = os.path.join(ARTIFACTS_DIR, 'xss_model.pickle')
-    if os.path.exists(model_path):
-        try:
-            with open(model_path, 'rb') as f:
-                model = pickle.load(f)
-            sys.stderr.write(f"Loaded ML model from {model_path}\n")
-            return model
-        except Exception as e:
-            sys.stderr.write(f"Error loading model: {e}\n")
-    else:
-        sys.stderr.write(f"Model file not found at {model_path}\n")
+    try:
+        artifact = load_artifact('xss_model')
+        artifact.check_schema(XSS_FEATURES)
+        return artifact
+    except ArtifactError as e:
+        log.warning("%s", e)
+    except Exception as e:
+        log.error("Error loading model: %s", e)
     return None
 
 # Initialize embedding model
@@ -63,21 +70,26 @@ def initialize_embedding():
     try:
         import torch
         embed_model = HuggingFaceEmbedding(
-            model_name="BAAI/bge-small-en-v1.5",
+            model_name=EMBEDDING_MODEL_NAME,
             device="cuda:0" if torch.cuda.is_available() else "cpu"
         )
-        sys.stderr.write("Initialized embedding model\n")
+        log.info("Initialized embedding model")
         return embed_model
     except Exception as e:
-        sys.stderr.write(f"Error initializing embedding model: {e}\n")
+        log.error("Error initializing embedding model: %s", e)
         return None
 
 # Global variables for model and embedding
-MODEL = load_model() if EMBEDDING_AVAILABLE else None
+ARTIFACT = load_model() if EMBEDDING_AVAILABLE else None
+MODEL = ARTIFACT.predictor() if ARTIFACT else None
 EMBED_MODEL = initialize_embedding() if EMBEDDING_AVAILABLE and MODEL else None
 
+# Inputs of the last ML prediction, logged for offline shadow scoring after the verdict is out
+shadow_inputs = None
+
 # Function to analyze a payload for XSS vulnerabilities
 def analyze_xss(payload):
+    global shadow_inputs
     if not payload:
         return {
             "is_attack": False,
@@ -90,11 +102,17 @@ def analyze_xss(payload):
     if MODEL is not None and EMBED_MODEL is not None:
         try:
             # Get embedding for the payload
-            embedding = EMBED_MODEL.get_text_embedding(payload)
-            embedding = np.array([embedding])
+            with span("embedding"):
+                embedding = EMBED_MODEL.get_text_embedding(payload)
+                embedding = np.array([embedding])
             
             # Get prediction probabilities
-            prediction = MODEL.predict_proba(embedding)
+            start = time.perf_counter()
+            with span("predict"):
+                prediction = MODEL.predict_proba(embedding)
+            elapsed = time.perf_counter() - start
+            INFERENCE_SECONDS.labels("xss_model").observe(elapsed)
+            shadow_inputs = (embedding, prediction[:, 1], elapsed, ARTIFACT.version)
             is_attack = prediction[0][1] > 0.5
             confidence = prediction[0][1]
             
@@ -119,7 +137,8 @@ def analyze_xss(payload):
             endpoints = ["/login", "/register", "/profile", "/dashboard", "/admin", "/search", "/patients", "/records"]
             target_endpoint = random.choice(endpoints)
             
-            sys.stderr.write(f"ML model prediction: {'Attack' if is_attack else 'Normal'} with confidence {confidence:.2f}\n")
+            log.debug("ML model prediction: %s with confidence %.2f", 'Attack' if is_attack else 'Normal', confidence)
+            ANALYSES.labels("xss", "ml_model", "attack" if is_attack else "normal").inc()
             
             return {
                 "is_attack": is_attack,
@@ -131,14 +150,15 @@ def analyze_xss(payload):
                 "method": "ml_model"
             }
         except Exception as e:
-            sys.stderr.write(f"Error using ML model: {e}\n")
-            sys.stderr.write("Falling back to pattern matching\n")
+            log.error("Error using ML model: %s", e)
+            log.warning("Falling back to pattern matching")
     
     # Fallback to pattern matching if ML model is not available or fails
     matched_patterns = []
-    for pattern in XSS_PATTERNS:
-        if re.search(pattern, payload, re.IGNORECASE):
-            matched_patterns.append(pattern)
+    with span("regex"):
+        for pattern in XSS_PATTERNS:
+            if re.search(pattern, payload, re.IGNORECASE):
+                matched_patterns.append(pattern)
     
     # Determine if it's an attack based on matched patterns
     is_attack = len(matched_patterns) > 0
@@ -171,7 +191,8 @@ def analyze_xss(payload):
     endpoints = ["/login", "/register", "/profile", "/dashboard", "/admin", "/search", "/patients", "/records"]
     target_endpoint = random.choice(endpoints)
     
-    sys.stderr.write(f"Pattern matching result: {'Attack' if is_attack else 'Normal'} with confidence {confidence:.2f}\n")
+    log.debug("Pattern matching result: %s with confidence %.2f", 'Attack' if is_attack else 'Normal', confidence)
+    ANALYSES.labels("xss", "pattern_matching", "attack" if is_attack else "normal").inc()
     
     return {
         "is_attack": is_attack,
@@ -184,11 +205,22 @@ def analyze_xss(payload):
     }
 
 if __name__ == "__main__":
+    # This process is one request; hand its metrics to the broker on the way out
+    atexit.register(push_metrics)
+    install("xss_analyze")
+    
     # Get payload from command line argument
     payload = sys.argv[1] if len(sys.argv) > 1 else ""
     
     # Analyze the payload
-    result = analyze_xss(payload)
+    with span("analyze_xss"):
+        result = analyze_xss(payload)
     
     # Output the result as JSON (only to stdout)
-    print(json.dumps(result)) 
\ No newline at end of file
+    print(json.dumps(result))
+    sys.stdout.flush()
+    publish_event("xss_analysis", result)
+    
+    # Log a sample of inputs for shadow scoring against a candidate, offline
+    if shadow_inputs is not None:
+        log_inputs('xss_model', *shadow_inputs) 
\ No newline at end of file
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+import os
+import sys
+import csv
+import json
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from model_artifacts import ARTIFACTS_DIR, file_sha256, write_json_atomic
+
+# Path to the ML Models directory
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_PATH = os.path.join(ML_DIR, 'data', 'XSS_dataset.csv')
+
+# Sentence embedding the model is trained and served on, and its feature layout
+EMBEDDING_MODEL_NAME = "BAAI/bge-small-en-v1.5"
+EMBEDDING_DIM = 384
+XSS_FEATURES = [f"embedding_{i}" for i in range(EMBEDDING_DIM)]
+
+# Sentences per call to the embedding model
+BATCH_SIZE = int(os.environ.get('EMBED_BATCH_SIZE', '64'))
+
+# Batches embedded concurrently; torch releases the GIL while it computes
+WORKERS = int(os.environ.get('EMBED_WORKERS', '1'))
+
+# Sentences per checkpoint; a crash loses at most one chunk of work
+CHUNK_ROWS = 1024
+
+def dataset_paths(artifacts_dir=ARTIFACTS_DIR):
+    """Embeddings (.npy), row index and labels (.npz) and progress (.json)"""
+    return (
+        os.path.join(artifacts_dir, 'xss_embeddings.npy'),
+        os.path.join(artifacts_dir, 'xss_dataset.npz'),
+        os.path.join(artifacts_dir, 'xss_dataset.json')
+    )
+
+def read_dataset(path=DATA_PATH):
+    """Read (sentence, label) rows, skipping incomplete ones"""
+    sentences, labels = [], []
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            if not row.get('Sentence') or not row.get('Label'):
+                continue
+            sentences.append(row['Sentence'])
+            labels.append(int(row['Label']))
+    return sentences, np.array(labels, dtype=np.int8)
+
+def dedupe(sentences, labels):
+    """Drop repeated rows and map each remaining row to a unique sentence
+
+    Returns (unique sentences, row index into them, row labels). Unique
+    sentences are ordered by length so each batch pads to a similar size;
+    a sentence seen with two labels is embedded once and kept as two rows.
+    """
+    seen_rows = set()
+    first_seen = {}
+    row_sentences, row_labels = [], []
+    for sentence, label in zip(sentences, labels):
+        if (sentence, label) in seen_rows:
+            continue
+        seen_rows.add((sentence, label))
+        first_seen.setdefault(sentence, len(first_seen))
+        row_sentences.append(sentence)
+        row_labels.append(label)
+
+    # Stable sort, so the order (and therefore resuming) is deterministic
+    unique = sorted(first_seen, key=lambda s: (len(s), first_seen[s]))
+    position = {sentence: i for i, sentence in enumerate(unique)}
+    index = np.array([position[s] for s in row_sentences], dtype=np.int64)
+    # Rows follow the embeddings' order, so usually row i is embedding i
+    order = np.argsort(index, kind='stable')
+    return unique, index[order], np.array(row_labels, dtype=np.int8)[order]
+
+def initialize_embedding():
+    import torch
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+    return HuggingFaceEmbedding(
+        model_name=EMBEDDING_MODEL_NAME,
+        device="cuda:0" if torch.cuda.is_available() else "cpu"
+    )
+
+def embed_chunk(embed_model, sentences, batch_size, executor):
+    batches = [sentences[i:i + batch_size] for i in range(0, len(sentences), batch_size)]
+    embed = embed_model.get_text_embedding_batch
+    results = executor.map(embed, batches) if executor else map(embed, batches)
+    return np.concatenate([np.asarray(batch, dtype=np.float32) for batch in results])
+
+def load_progress(path, source_sha256):
+    """Return saved progress if it belongs to this source file and model"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        progress = json.load(f)
+    if (progress.get("source_sha256") != source_sha256
+            or progress.get("model") != EMBEDDING_MODEL_NAME
+            or progress.get("chunk_rows") != CHUNK_ROWS):
+        sys.stderr.write("Dataset or embedding model changed; embedding from scratch\n")
+        return None
+    return progress
+
+def build_dataset(data_path=DATA_PATH, embed_model=None, batch_size=BATCH_SIZE, workers=WORKERS,
+                  artifacts_dir=ARTIFACTS_DIR):
+    """Embed the XSS dataset into a memory-mappable .npy, resuming if interrupted"""
+    start = time.perf_counter()
+    embeddings_path, rows_path, progress_path = dataset_paths(artifacts_dir)
+    os.makedirs(artifacts_dir, exist_ok=True)
+
+    source_sha256 = file_sha256(data_path)
+    sentences, labels = read_dataset(data_path)
+    unique, index, row_labels = dedupe(sentences, labels)
+    total_chunks = (len(unique) + CHUNK_ROWS - 1) // CHUNK_ROWS
+
+    progress = load_progress(progress_path, source_sha256)
+    if progress is None or not os.path.exists(embeddings_path):
+        np.savez(rows_path + '.tmp.npz', index=index, y=row_labels)
+        os.replace(rows_path + '.tmp.npz', rows_path)
+        X = np.lib.format.open_memmap(embeddings_path, mode='w+', dtype=np.float32,
+                                      shape=(len(unique), EMBEDDING_DIM))
+        progress = {
+            "source": os.path.basename(data_path),
+            "source_sha256": source_sha256,
+            "model": EMBEDDING_MODEL_NAME,
+            "rows": len(index),
+            "unique_sentences": len(unique),
+            "dim": EMBEDDING_DIM,
+            "chunk_rows": CHUNK_ROWS,
+            "completed_chunks": 0
+        }
+        write_json_atomic(progress_path, progress)
+    else:
+        X = np.load(embeddings_path, mmap_mode='r+')
+
+    resumed_from = progress["completed_chunks"]
+    if 0 < resumed_from < total_chunks:
+        sys.stderr.write(f"Resuming at chunk {resumed_from + 1} of {total_chunks}\n")
+
+    embedded = 0
+    embed_time = 0.0
+    if resumed_from < total_chunks:
+        if embed_model is None:
+            embed_model = initialize_embedding()
+        executor = ThreadPoolExecutor(workers) if workers > 1 else None
+        try:
+            for chunk in range(resumed_from, total_chunks):
+                lo, hi = chunk * CHUNK_ROWS, min((chunk + 1) * CHUNK_ROWS, len(unique))
+                chunk_start = time.perf_counter()
+                vectors = embed_chunk(embed_model, unique[lo:hi], batch_size, executor)
+                if vectors.shape != (hi - lo, EMBEDDING_DIM):
+                    raise ValueError(f"Embedding model returned shape {vectors.shape}, expected {(hi - lo, EMBEDDING_DIM)}")
+                X[lo:hi] = vectors
+                # Data reaches the file before the checkpoint that says it's there
+                X.flush()
+                progress["completed_chunks"] = chunk + 1
+                write_json_atomic(progress_path, progress)
+
+                elapsed = time.perf_counter() - chunk_start
+                embed_time += elapsed
+                embedded += hi - lo
+                sys.stderr.write(f"Chunk {chunk + 1}/{total_chunks}: {hi - lo} sentences in {elapsed:.1f}s\n")
+        finally:
+            if executor:
+                executor.shutdown()
+    del X
+
+    return {
+        "rows": int(len(sentences)),
+        "duplicates_dropped": int(len(sentences) - len(index)),
+        "unique_sentences": len(unique),
+        "resumed_from_chunk": resumed_from,
+        "embedded": embedded,
+        "embed_seconds": round(embed_time, 2),
+        "sentences_per_second": round(embedded / embed_time, 1) if embed_time else None,
+        "wall_seconds": round(time.perf_counter() - start, 2),
+        "embeddings": embeddings_path
+    }
+
+def load_dataset(artifacts_dir=ARTIFACTS_DIR):
+    """Return (X, y) for training; X is read from the memory-mapped embeddings"""
+    embeddings_path, rows_path, progress_path = dataset_paths(artifacts_dir)
+    with open(progress_path, 'r') as f:
+        progress = json.load(f)
+    total_chunks = (progress["unique_sentences"] + progress["chunk_rows"] - 1) // progress["chunk_rows"]
+    if progress["completed_chunks"] < total_chunks:
+        raise ValueError("Embeddings are incomplete; run 'python xss_dataset.py' to finish them")
+
+    unique = np.load(embeddings_path, mmap_mode='r')
+    with np.load(rows_path) as rows:
+        index, y = rows["index"], rows["y"]
+    # Without repeated sentences the rows are the unique embeddings themselves
+    if len(index) == len(unique) and (index == np.arange(len(unique))).all():
+        return unique, y
+    return unique[index], y
+
+if __name__ == "__main__":
+    # Usage: python xss_dataset.py [path to XSS_dataset.csv]
+    data_path = sys.argv[1] if len(sys.argv) > 1 else DATA_PATH
+    print(json.dumps(build_dataset(data_path), indent=2))
@@ -3,10 +3,15 @@ import json
 import os
 import random
 import datetime
+import time
 import pickle
 import numpy as np
-import sys
 from collections import Counter
+from event_stream import publish_event
+from metrics import DETECTIONS, SAVE_SECONDS
+from log_config import get_logger
+
+log = get_logger("xss_stats")
 
 # Path to the ML Models directory
 ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -23,14 +28,14 @@ def generate_xss_stats():
         try:
             with open(XSS_RESULTS_FILE, 'r') as f:
                 results = json.load(f)
-                sys.stderr.write("Loaded real XSS detection results\n")
+                log.debug("Loaded real XSS detection results")
                 return results
         except Exception as e:
-            sys.stderr.write(f"Error loading XSS detection results: {e}\n")
-            sys.stderr.write("Falling back to simulated data\n")
+            log.error("Error loading XSS detection results: %s", e)
+            log.warning("Falling back to simulated data")
     
     # If no real data is available, generate simulated data
-    sys.stderr.write("Generating simulated XSS statistics\n")
+    log.warning("Generating simulated XSS statistics")
     
     # Total detections (random number between 50-150)
     total_detections = random.randint(50, 150)
@@ -109,6 +114,7 @@ def generate_xss_stats():
 # Function to save XSS detection results
 def save_xss_detection(detection):
     """Save a new XSS detection to the results file"""
+    start = time.perf_counter()
     results = {
         "totalDetections": 0,
         "byType": {
@@ -199,6 +205,12 @@ def save_xss_detection(detection):
     # Save updated results
     with open(XSS_RESULTS_FILE, 'w') as f:
         json.dump(results, f)
+    DETECTIONS.labels("xss", detection.get("attack_type")).inc()
+    SAVE_SECONDS.labels("xss").observe(time.perf_counter() - start)
+    
+    # Push the detection to dashboard subscribers; mitigation only acts on
+    # it when the caller marked source_ip as the real client's address
+    publish_event("detection", {"kind": "xss", **detection, "observed": detection.get("observed") is True})
     
     return results
 
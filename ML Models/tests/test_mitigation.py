@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""Detections reaching the mitigation table
+
+Run with: python -m pytest "ML Models/tests"
+"""
+import os
+import sys
+
+# Make the scripts importable
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ML_DIR, 'scripts'))
+
+import xss_stats
+from mitigation import MitigationTable, apply_detection, BLOCK, LIMIT
+
+def published_xss_detection(monkeypatch, tmp_path, detection):
+    """Save an XSS detection as xss_save_detection.py does and return the event it publishes"""
+    events = []
+    monkeypatch.setattr(xss_stats, "XSS_RESULTS_FILE", str(tmp_path / "xss_results.json"))
+    monkeypatch.setattr(xss_stats, "publish_event", lambda kind, data: events.append((kind, data)))
+    xss_stats.save_xss_detection(detection)
+    assert [kind for kind, _ in events] == ["detection"]
+    return events[0][1]
+
+def test_xss_detection_from_client_address_is_mitigated(monkeypatch, tmp_path):
+    event = published_xss_detection(monkeypatch, tmp_path, {
+        "is_attack": True, "attack_type": "reflected", "source_ip": "198.51.100.20", "observed": True
+    })
+    table = MitigationTable()
+    entry = apply_detection(event, table)
+    assert entry is not None and entry.action in (BLOCK, LIMIT)
+    assert table.check("198.51.100.20")[0] in (BLOCK, LIMIT)
+
+def test_xss_detection_without_observed_source_is_ignored(monkeypatch, tmp_path):
+    event = published_xss_detection(monkeypatch, tmp_path, {
+        "is_attack": True, "attack_type": "reflected", "source_ip": "198.51.100.20"
+    })
+    table = MitigationTable()
+    assert apply_detection(event, table) is None
+    assert table.check("198.51.100.20")[0] == "allow"
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""Streaming traffic baselines
+
+Run with: python -m pytest "ML Models/tests"
+"""
+import os
+import sys
+import random
+
+# Make the scripts importable
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ML_DIR, 'scripts'))
+
+from traffic_baseline import KeyBaseline, MIN_SAMPLES, MAX_SKIPPED_SAMPLES, Z_THRESHOLD
+
+HOUR = 3
+
+def warmed_up(level=100.0):
+    baseline = KeyBaseline()
+    rng = random.Random(42)
+    for _ in range(MIN_SAMPLES * 2):
+        baseline.observe([level + rng.uniform(-5, 5), 0.1, 10, 500], HOUR)
+    return baseline
+
+def rate_score(baseline, value):
+    return baseline.observe([value, 0.1, 10, 500], HOUR)["packets_per_second"]
+
+def test_short_spike_is_not_learned():
+    baseline = warmed_up()
+    mean = baseline.overall[0].mean
+    for _ in range(10):
+        assert rate_score(baseline, 10000) >= Z_THRESHOLD
+    assert baseline.overall[0].mean == mean
+
+def test_sustained_level_shift_becomes_the_baseline():
+    baseline = warmed_up()
+    assert rate_score(baseline, 1000) >= Z_THRESHOLD
+    for _ in range(MAX_SKIPPED_SAMPLES + 100):
+        score = rate_score(baseline, 1000)
+    assert abs(score) < Z_THRESHOLD
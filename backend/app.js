@@ -2,12 +2,14 @@ const express = require("express");
 const app = express();
 const insuranceRoutes = require("./routes/insurance");
 const trafficMonitor = require("./middleware/trafficMonitor");
+const mitigation = require("./middleware/mitigation");
 
 // Middleware
 app.use(express.json());
 app.use(express.urlencoded({ extended: true }));
 
-// Apply traffic monitoring to all routes
+// Reject blocked and rate-limited sources, then monitor the rest
+app.use(mitigation);
 app.use(trafficMonitor);
 
 // Basic endpoints for DDOS testing
@@ -0,0 +1,113 @@
+const net = require("net");
+const path = require("path");
+
+// Unix socket served by ML Models/scripts/mitigation.py
+const MITIGATION_SOCKET =
+  process.env.MITIGATION_SOCKET ||
+  path.join(__dirname, "../../ML Models/scripts/.mitigation.sock");
+
+// Fail open if the mitigation server doesn't answer within this many ms
+const CHECK_TIMEOUT_MS = 50;
+
+// Delay before reconnecting after the mitigation server goes away
+const RECONNECT_DELAY_MS = 5000;
+
+let socket = null;
+let connected = false;
+let buffer = "";
+// Replies come back in request order, so callbacks are queued FIFO
+const pending = [];
+
+const connect = () => {
+  socket = net.createConnection(MITIGATION_SOCKET);
+  socket.setEncoding("utf8");
+
+  socket.on("connect", () => {
+    connected = true;
+    console.log(`Mitigation: connected to ${MITIGATION_SOCKET}`);
+  });
+
+  socket.on("data", (chunk) => {
+    buffer += chunk;
+    let newline;
+    while ((newline = buffer.indexOf("\n")) !== -1) {
+      const line = buffer.slice(0, newline);
+      buffer = buffer.slice(newline + 1);
+      const callback = pending.shift();
+      if (callback) callback(line);
+    }
+  });
+
+  socket.on("error", () => {
+    // Handled by "close"; the server is optional
+  });
+
+  socket.on("close", () => {
+    connected = false;
+    buffer = "";
+    // Let waiting requests through rather than hang them
+    pending.splice(0).forEach((callback) => callback("allow 0"));
+    setTimeout(connect, RECONNECT_DELAY_MS).unref();
+  });
+};
+
+/**
+ * Ask the mitigation table for a verdict on a source address
+ * @returns {Promise<{verdict: string, seconds: number}>}
+ */
+const checkSource = (ip) => {
+  return new Promise((resolve) => {
+    if (!connected || !ip) {
+      return resolve({ verdict: "allow", seconds: 0 });
+    }
+
+    let done = false;
+    const timer = setTimeout(() => {
+      done = true;
+      resolve({ verdict: "allow", seconds: 0 });
+    }, CHECK_TIMEOUT_MS);
+
+    // The callback stays queued after a timeout to keep replies in order
+    pending.push((line) => {
+      if (done) return;
+      clearTimeout(timer);
+      const [verdict, seconds] = line.split(" ");
+      resolve({ verdict, seconds: parseFloat(seconds) || 0 });
+    });
+    socket.write(`CHECK ${ip}\n`);
+  });
+};
+
+/**
+ * Normalize the client address to dotted-quad IPv4, or null for IPv6
+ */
+const clientAddress = (req) => {
+  let ip = req.ip || (req.connection && req.connection.remoteAddress) || "";
+  if (ip.startsWith("::ffff:")) ip = ip.slice(7);
+  if (ip === "::1") ip = "127.0.0.1";
+  return /^\d+\.\d+\.\d+\.\d+$/.test(ip) ? ip : null;
+};
+
+/**
+ * Middleware that rejects blocked and rate-limited sources before any
+ * further (and more expensive) processing of the request
+ */
+const mitigation = async (req, res, next) => {
+  const { verdict, seconds } = await checkSource(clientAddress(req));
+
+  if (verdict === "block") {
+    res.set("Retry-After", String(Math.ceil(seconds)));
+    return res.status(403).json({ error: "Source blocked" });
+  }
+  if (verdict === "limit") {
+    res.set("Retry-After", String(Math.max(1, Math.ceil(seconds))));
+    return res.status(429).json({ error: "Too many requests" });
+  }
+  next();
+};
+
+connect();
+
+module.exports = mitigation;
+module.exports.checkSource = checkSource;
+module.exports.clientAddress = clientAddress;
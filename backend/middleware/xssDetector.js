@@ -1,4 +1,5 @@
 const { runPythonScript } = require("../utils/pythonRunner");
+const { clientAddress } = require("./mitigation");
 
 /**
  * Middleware to detect XSS attacks in requests
@@ -113,6 +114,9 @@ const xssDetector = async (req, res, next) => {
               JSON.stringify({
                 ...result,
                 timestamp: new Date().toISOString(),
+                source_ip: clientAddress(req),
+                // The address is the requesting client's, so mitigation may act on it
+                observed: true,
                 request_path: req.path,
                 request_method: req.method,
                 vector_type: vector.type,
@@ -21,6 +21,7 @@ const xssDetectionMiddleware = require("./middleware/xssDetection");
 
 // Import security middleware
 const trafficMonitor = require("./middleware/trafficMonitor");
+const mitigation = require("./middleware/mitigation");
 const xssDetector = require("./middleware/xssDetector");
 
 dotenv.config();
@@ -58,6 +59,9 @@ app.use((req, res, next) => {
   next();
 });
 
+// Reject blocked and rate-limited sources before running detection
+app.use(mitigation);
+
 // XSS detection middleware
 app.use(xssDetectionMiddleware);
 
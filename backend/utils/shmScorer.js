@@ -0,0 +1,155 @@
+const fs = require("fs");
+
+// Shared memory segment served by ML Models/scripts/shm_exchange.py
+const SHM_NAME = process.env.SHM_EXCHANGE_NAME || "zkphealth_ddos";
+const SHM_PATH = `/dev/shm/${SHM_NAME}`;
+
+// Layout; must match shm_exchange.py
+const MAGIC = "SHMFEAT1";
+const LAYOUT_VERSION = 1;
+const HEADER_SIZE = 64;
+const SLOT_SIZE = 128;
+const FEATURES_OFFSET = 8;
+const RESULT_OFFSET = 88;
+const REQUEST = 1;
+const DONE = 2;
+const ATTACK_TYPES = ["Unknown", "UDP Flood", "HTTP Flood", "TCP Flood"];
+
+// Features in DDOS_FEATURES order, with prepare_features' defaults
+const FEATURES = [
+  ["pktcount", 0], ["bytecount", 0], ["dur", 0], ["flows", 0], ["packetins", 0],
+  ["port_no", 80], ["pktrate", 0], ["pktperflow", 0], ["byteperflow", 0],
+  ["tx_bytes", 0], ["rx_bytes", 0], ["syn_flag", 0], ["ack_flag", 0],
+  ["psh_flag", 0], ["rst_flag", 0], ["fin_flag", 0], ["window_size", 65535],
+  ["urgent_ptr", 0], ["header_len", 20],
+];
+
+// Give up on a verdict after this many ms
+const SCORE_TIMEOUT_MS = 1000;
+
+// Longest wait between polls for a verdict; waits double from 1 ms up to this
+const MAX_POLL_DELAY_MS = 16;
+
+let fd = null;
+// Bumped on every close, so polls of a closed segment stop
+let generation = 0;
+let inode = null;
+let serverPid = 0;
+let slotCount = 0;
+let nextSeq = 0;
+
+const close = () => {
+  if (fd !== null) fs.closeSync(fd);
+  fd = null;
+  generation += 1;
+};
+
+/**
+ * Open the segment, or return false if the exchange isn't running
+ */
+const open = () => {
+  if (fd !== null) return true;
+  try {
+    fd = fs.openSync(SHM_PATH, "r+");
+    const header = Buffer.alloc(28);
+    fs.readSync(fd, header, 0, header.length, 0);
+    if (
+      header.toString("latin1", 0, 8) !== MAGIC ||
+      header.readUInt32LE(8) !== LAYOUT_VERSION ||
+      header.readUInt32LE(16) !== FEATURES.length + 1 ||
+      header.readUInt32LE(20) !== SLOT_SIZE
+    ) {
+      throw new Error(`${SHM_PATH} has an unknown layout`);
+    }
+    slotCount = header.readUInt32LE(12);
+    serverPid = header.readUInt32LE(24);
+    inode = fs.fstatSync(fd).ino;
+    return true;
+  } catch (error) {
+    close();
+    return false;
+  }
+};
+
+/**
+ * Drop the open segment if a restarted server replaced it (a new file,
+ * or the same file now owned by another process), so the next call reopens
+ */
+const closeIfReplaced = () => {
+  if (fd === null) return;
+  try {
+    const pid = Buffer.alloc(4);
+    fs.readSync(fd, pid, 0, 4, 24);
+    if (fs.statSync(SHM_PATH).ino === inode && pid.readUInt32LE(0) === serverPid) return;
+  } catch (error) {
+    // The segment is gone
+  }
+  close();
+};
+
+/**
+ * Score a features object (the same one ddos_analyze.py takes) through
+ * shared memory. Writes go to the segment's tmpfs file with pwrite, so
+ * they land in the pages the Python server has mapped: the slot body
+ * first, then its state, as the protocol requires.
+ * @returns {Promise<Object|null>} ddos_analyze's result, or null if the
+ *   exchange isn't running or didn't answer in time
+ */
+const scoreFeatures = (mlFeatures) => {
+  if (!open()) return Promise.resolve(null);
+
+  const slot = nextSeq % slotCount;
+  const position = HEADER_SIZE + slot * SLOT_SIZE;
+  const state = Buffer.alloc(4);
+  fs.readSync(fd, state, 0, 4, position);
+  if (state.readUInt32LE(0) === REQUEST) return Promise.resolve(null);
+
+  const body = Buffer.alloc(RESULT_OFFSET - 4);
+  body.writeUInt32LE(nextSeq >>> 0, 0);
+  body.writeFloatLE(mlFeatures.Protocol === "TCP" ? 1 : 0, FEATURES_OFFSET - 4);
+  FEATURES.forEach(([name, fallback], i) => {
+    const value = mlFeatures[name] === undefined ? fallback : Number(mlFeatures[name]);
+    body.writeFloatLE(value, FEATURES_OFFSET + (i + 1) * 4 - 4);
+  });
+  fs.writeSync(fd, body, 0, body.length, position + 4);
+  state.writeUInt32LE(REQUEST, 0);
+  fs.writeSync(fd, state, 0, 4, position);
+  nextSeq += 1;
+
+  const deadline = Date.now() + SCORE_TIMEOUT_MS;
+  const slotBuffer = Buffer.alloc(SLOT_SIZE);
+  const slotGeneration = generation;
+  let delay = 0;
+  return new Promise((resolve) => {
+    const poll = () => {
+      if (generation !== slotGeneration) return resolve(null);
+      fs.readSync(fd, slotBuffer, 0, SLOT_SIZE, position);
+      const current = slotBuffer.readUInt32LE(0);
+      if (current === REQUEST) {
+        if (Date.now() > deadline) {
+          closeIfReplaced();
+          return resolve(null);
+        }
+        // Back off instead of spinning the event loop on reads
+        delay = Math.min(MAX_POLL_DELAY_MS, delay * 2 || 1);
+        return setTimeout(poll, delay);
+      }
+      // Hand the slot back before resolving
+      state.writeUInt32LE(0, 0);
+      fs.writeSync(fd, state, 0, 4, position);
+      if (current !== DONE) {
+        return resolve({ error: "Scoring failed", is_attack: false, confidence: 0, prediction: 0 });
+      }
+      const prediction = slotBuffer.readUInt32LE(RESULT_OFFSET + 4);
+      resolve({
+        is_attack: prediction === 1,
+        prediction,
+        confidence: Math.round(slotBuffer.readFloatLE(RESULT_OFFSET) * 1e6) / 1e6,
+        attack_type: ATTACK_TYPES[slotBuffer.readUInt32LE(RESULT_OFFSET + 8)] || "Unknown",
+      });
+    };
+    poll();
+  });
+};
+
+module.exports = { scoreFeatures, SHM_PATH };